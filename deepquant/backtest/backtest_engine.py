@@ -1,20 +1,33 @@
+import numpy as np
 import pandas as pd
 import logging
-import copy
 import yaml
 import sys
 import time
-import multiprocessing
 
 import os
-from distutils.dir_util import copy_tree, mkpath
 
 import importlib.util
 from importlib import import_module
 
-import deepquant.common.state_machine as state_machine
+import deepquant.backtest.bar_kernel as bar_kernel
+import deepquant.backtest.checkpoint as checkpoint
+import deepquant.backtest.detail_recorder as detail_recorder
+import deepquant.backtest.intrabar as intrabar
+import deepquant.backtest.monte_carlo as monte_carlo
+import deepquant.backtest.optimizer as optimizer
+import deepquant.backtest.portfolio as portfolio
+import deepquant.backtest.shared_dataset as shared_dataset
+import deepquant.backtest.signal_cache as signal_cache
+import deepquant.backtest.signal_pool as signal_pool
+import deepquant.backtest.trade_stats as trade_stats
+import deepquant.backtest.trade_store as trade_store
+import deepquant.backtest.walk_forward as walk_forward
 import deepquant.common.datetime_util as datetime_util
+import deepquant.data.price_store as price_store
+import deepquant.market_set.cost_model as cost_model
 import deepquant.robotemplate_fx.robot_context as robot_ctx
+from deepquant.common.error import TradeModelError
 
 # create logger
 logging.basicConfig(format='%(message)s')
@@ -41,12 +54,12 @@ net_profit_pct, hold_bars, scale_in_num, scale_out_num
 ส่วนโหมดละเอียดจะบันทึก position ในทุก bar เพื่อเอาไว้วิเคราะห์เทรดแบบละเอียดยิบ
 3. แอททริบิวต์ที่โหมดเร็วไม่บันทึก แต่จะบันทึกในโหมดละเอียดได้แก่ stop_loss_price, take_profit_price, comment, gross_profit
 
-### Using Message Broker in Detailed Mode
-ในโหมดละเอียด จะทำการบันทึกค่ารายละเอียด trade position ของแต่ละ bar ทุก bar ดังนั้นในประมวลจะมีรูปแบบดังนี้
-1. thread หลักจากคำนวณรายละเอียด trade position ก่อน
-2. ส่งรายละเอียดเป็นรูปแบบ message ส่งไปที่ message broker ในการทำงานแบบ asynchronous
-โดย thread หลักก็ประมวลผลขั้นตอนถัดไปได้ทันทีโดยไม่ต้องรอ
-3. message broker รับ message ที่มีรายละเอียด trade position ของ bar นั้น แล้วส่งต่อให้กับ message consumer นำไปจัดเก็บ
+### Detailed Mode Recorder
+ในโหมดละเอียด (backtest mode=3) จะบันทึกรายละเอียด trade position ของทุก bar ด้วย detail_recorder.DetailRecorder
+1. หลังจาก bar kernel ประมวลผล trade list ของ robot แต่ละตัวเสร็จ recorder จะเขียนสถานะของแต่ละ bar
+ลง column buffer ของ numpy ที่จองไว้ล่วงหน้า (ไม่สร้าง dictionary ต่อ bar และไม่ส่ง message ผ่าน message broker)
+2. เมื่อ buffer เต็ม (config detail_chunk_size) จะ flush ต่อท้ายไฟล์ columnar ใน detailed_trades/<robot name>
+3. โหมดเร็วไม่สร้าง recorder จึงไม่มีค่าใช้จ่ายเพิ่ม
 
 ### Trading Position Rules
 * ระบบจะสร้าง position เมื่อมี order action คือ open buy หรือ open sell
@@ -71,76 +84,6 @@ class MockRobotContext(robot_ctx.BaseRobotContext):
         super().__init__(config)
 
 
-class ScaleList():
-
-    def __init__(self):
-        self.SCALE_TYPE_IN = 1
-        self.SCALE_TYPE_OUT = 2
-        self.scale_list = []
-        self.total_scale_outs = 0
-        self.total_scale_ins = 0
-
-    def append(self, bar_index, date, scale_type, scale_size \
-               , pos_size_before, pos_size_after \
-               , avg_cost_before, avg_cost_after):
-        scale_no = 0
-        if scale_type == self.SCALE_TYPE_IN:
-            scale_no = self.total_scale_ins + 1
-        elif scale_type == self.SCALE_TYPE_OUT:
-            scale_no = self.total_scale_outs + 1
-
-        track = {'scale_no': scale_no
-            , 'bar_index': bar_index
-            , 'date': date
-            , 'scale_type': scale_type
-            , 'scale_size': scale_size
-            , 'pos_size_before': pos_size_before
-            , 'pos_size_after': pos_size_after
-            , 'avg_cost_before': avg_cost_before
-            , 'avg_cost_after': avg_cost_after}
-        self.scale_list.append(track)
-
-    def get_list(self):
-        return self.scale_list
-
-
-class Trade():
-
-    def __init__(self, trade_id, symbol, trade_type, entry_date, entry_price
-                 , pos_size, stop_loss=0.0, take_profit=0.0
-                 , stop_loss_price=0.0, take_profit_price=0.0):
-        self.trade_id = trade_id
-        self.symbol = symbol
-        self.trade_type = trade_type
-        self.entry_date = entry_date
-        self.entry_price = entry_price
-        self.pos_size = pos_size
-        self.stop_loss = stop_loss
-        self.take_profit = take_profit
-        self.stop_loss_price = stop_loss_price
-        self.take_profit_price = take_profit_price
-
-        self.scale_list = ScaleList()
-
-        self.avg_cost = 0.0
-        self.exit_date = None
-        self.exit_price = 0.0
-        self.exit_reason = 0
-
-        self.price_change = 0.0
-        self.price_change_pct = 0.0
-        self.pos_value = 0.0
-
-        self.profit_points = 0.0
-        self.unrealized_profit = 0.0
-        self.unrealized_profit_pct = 0.0
-        self.net_profit = 0.0
-        self.net_profit_pct = 0.0
-        self.hold_bars = 0.0
-        # self.scale_in_num = 0
-        # self.scale_out_num = 0
-
-
 class BacktestEngine():
 
     def __init__(self, config):
@@ -169,26 +112,52 @@ class BacktestEngine():
         self.idx_scale_size = 14
         self.idx_stop_type = 15
 
-        # Load price dataframe
-        self.price_datasets = []
-        for price_file in self.config['price_files']:
-            df = pd.read_csv('{}/{}'.format(self.config['root_price_path'], price_file))
-            self.price_datasets.append(df)
+        # Backtest results of each models, key is trading robot name
+        # trades is DataFrame of trade list, equity_curves is numpy array of equity on every bar
+        # trade_stores is columnar trade store (trade_store.TradeStore) that trades DataFrame is built from
+        self.trades = {}
+        self.trade_stores = {}
+        self.equity_curves = {}
+
+        # Statistics of each models and total (DataFrame, index is trading robot name), see trade_stats
+        self.trade_stats = None
+
+        # Result of portfolio backtest (config 'portfolio_backtest'), see portfolio.PortfolioEngine.run
+        self.portfolio_result = None
+
+        # Ranked optimization results (DataFrame) of each models, key is trading robot name
+        self.optimize_results = {}
+
+        # Walk-forward results (DataFrame, one row per window) of each models, key is trading robot name
+        self.walk_forward_results = {}
+
+        # Monte Carlo percentile tables (DataFrame) of each models and 'total', see monte_carlo
+        self.monte_carlo_results = {}
+
+        # Date range of price datasets, None = all bars
+        self.start_date = self.config.get('start_date')
+        self.end_date = self.config.get('end_date')
+
+        # Lower timeframe data of each models used to resolve SL/TP inside bar, key is model index
+        self.intrabar_data = {}
+
+        # Load price dataframe once into shared memory, trade models get read-only views of it
+        self.price_datasets = self.__load_price_datasets()
 
         # self.config['trade_model_path']
         robot_config_file_path = '{}{}'.format(self.config['robot_config_root_path'], self.config['robot_config_file'])
         self.robot_config = yaml.safe_load(open(robot_config_file_path))
-        self.robot_config_mod_time = self.__get_last_mod_time(robot_config_file_path)
-        # True = if config has been modified before running, False = if config has not been modified
-        self.robot_config_has_modified = self.__check_modified(robot_config_file_path)
+
+        # Source file path of trade model of each trading robot, used to build signal cache key
+        self.trade_model_files = []
 
         # Load and create object of trading models
         self.trade_models = self.__build_trade_models()
 
         # Reset flag
         # True = จะรัน signal processing ใหม่
-        # False = จะเช็กไฟล์ signal result ก่อน หากไม่มีการเปลี่ยนแปลง จะโหลดผล signal ของเก่าที่เคยรันก่อนหน้า
-        # แต่ถ้ามีการเปลี่ยนแปลง จะรัน signal processing ใหม่อีกครั้ง
+        # False = จะเช็ก signal cache ก่อน หากไฟล์ราคา, config ของ trading robot และ trade model ไม่มีการเปลี่ยนแปลง
+        # จะโหลดผล signal ของเก่าที่เคยรันก่อนหน้า แต่ถ้ามีการเปลี่ยนแปลง จะรัน signal processing ใหม่อีกครั้ง
         self.reset_flag = False
 
     # =======================================================================================
@@ -200,14 +169,32 @@ class BacktestEngine():
     def backtest(self, mode=2, start_date=None, end_date=None):
         """
         Run backtest. If you want to run some range of all bars, must define both start_date and end_date.
+        Next call without start_date and end_date runs on date range of config again (all bars if not defined).
 
         param: mode,  1 = run signal processing only, 2 = run both signal processing and full backtest
+                      3 = same as 2 and record position of every bar (detailed mode) into detailed_trades/<robot name>
         param: start_date, start date time to run signal processing and/or full backtest
         param: end_date, end date time to run signal processing and/or full backtest
+
+        When config 'checkpoint_file' is defined, mode 2 and 3 on all bars save state of backtest to the file
+        and next run on price files that have only new bars appended computes signals of new bars (plus warm-up bars)
+        and continues simulation from the checkpoint, see checkpoint
         """
         logger.info('%s [%s]: %s', datetime_util.bangkok_now(), 'INFO'
                     , "Started...")
 
+        # Reload only bars in date range from converted price files and rebuild trade models,
+        # no date range clears window of previous call (back to date range of config)
+        date_range = (start_date, end_date) if (start_date, end_date) != (None, None) \
+            else (self.config.get('start_date'), self.config.get('end_date'))
+        if date_range != (self.start_date, self.end_date):
+            self.start_date, self.end_date = date_range
+            self.price_datasets = self.__load_price_datasets()
+            self.trade_model_files = []
+            self.trade_models = self.__build_trade_models()
+            self.model_bars = []
+            self.intrabar_data = {}
+
         # If mode is run signal processing only
         if mode == 1:
             # Run signal processing
@@ -216,37 +203,199 @@ class BacktestEngine():
 
         # If mode is run both signal processing and full backtest
         elif mode == 2:
-            # Run signal processing
-            self.process_signal()
+            # Run signal processing, only new bars if resumed from checkpoint
+            resume = self.__load_checkpoint()
+            if resume is None:
+                self.process_signal()
+            else:
+                resume = self.__process_signal_resume(resume)
 
             # Run backtest
-            self.__process_backtest()
+            self.__process_backtest(resume=resume)
+
+        # If mode is run signal processing and full backtest in detailed mode
+        elif mode == 3:
+            # Run signal processing, only new bars if resumed from checkpoint
+            resume = self.__load_checkpoint()
+            if resume is None:
+                self.process_signal()
+            else:
+                resume = self.__process_signal_resume(resume)
+
+            # Run backtest and record position of every bar
+            self.__process_backtest(detailed=True, resume=resume)
 
         logger.info('%s [%s]: %s', datetime_util.bangkok_now(), 'INFO'
                     , "Finished...")
 
-    def optimize(self):
-        print('Wait a minute please ^^')
+    def optimize(self, method='grid', n_trials=None, metric='net_profit', processes=None, seed=None):
+        """
+        Optimize parameters of every trading robot that has 'optimize' field in robot config.
+        Ranked results are kept in self.optimize_results (key is trading robot name) and written to
+        optimize_results/<robot name>.csv
+
+        param: method, 'grid', 'random' or 'halving' (successive halving)
+        param: n_trials, number of trials for 'random' and 'halving', None = all grid points
+        param: metric, metric used to rank trials: net_profit, total_trades, win_rate, max_drawdown
+        param: processes, number of worker processes, None = number of CPUs
+        param: seed, random seed for 'random' and 'halving'
+        """
+        logger.info('%s [%s]: %s', datetime_util.bangkok_now(), 'INFO'
+                    , "Optimization started...")
+
+        # Signal bars with default parameters are loaded from signal cache
+        if len(self.model_bars) == 0:
+            self.process_signal()
+        model_bars_dict = {mbd['name']: mbd['bars'] for mbd in self.model_bars if mbd is not None}
+
+        results_path = '{}/{}'.format(os.path.abspath(os.getcwd()), 'optimize_results')
+        os.makedirs(results_path, exist_ok=True)
+
+        tr_robot_configs = self.robot_config['trading_robots']
+        for j in range(0, len(tr_robot_configs)):
+            tr_robot_config = tr_robot_configs[j]
+            if tr_robot_config.get('optimize') is None:
+                continue
+            robot_name = tr_robot_config['name']
+
+            signal_func = self.__make_signal_func(j, tr_robot_config, model_bars_dict[robot_name])
+            def on_result(result, robot_name=robot_name):
+                logger.info('%s [%s]: %s', datetime_util.bangkok_now(), 'INFO'
+                            , "{} trial {}: {}={}, elapsed={:.3f}s".format(robot_name, result['trial'], metric
+                                                                           , result[metric], result['elapsed']))
+
+            opt = optimizer.Optimizer(signal_func
+                                      , self.__get_kernel_kwargs(j, tr_robot_config, self.config['balance'])
+                                      , optimizer.parse_param_space(tr_robot_config['optimize'])
+                                      , metric=metric
+                                      , ascending=(metric == 'max_drawdown')
+                                      , processes=processes
+                                      , on_result=on_result)
+            if method == 'random':
+                result_df = opt.random_search(n_trials, seed=seed)
+            elif method == 'halving':
+                result_df = opt.successive_halving(n_trials=n_trials, seed=seed)
+            else:
+                result_df = opt.grid_search()
+
+            self.optimize_results[robot_name] = result_df
+            result_df.to_csv('{}/{}.csv'.format(results_path, robot_name), index=False)
+            print(result_df.head(10).to_string())
 
-    def process_signal(self):
         logger.info('%s [%s]: %s', datetime_util.bangkok_now(), 'INFO'
-                    , "Signal processing started...")
+                    , "Optimization finished...")
 
-        queue = multiprocessing.SimpleQueue()  # Use queue to store returned results
-        processes = []
-        model_index = 0
-        for robot in list(self.robot_config['trading_robots']):
-            robot_name = robot['name']
-            process = multiprocessing.Process(target=self.__handle_process_signal, args=(model_index, robot_name, queue,))
-            processes.append(process)
-            model_index = model_index + 1
+    def walk_forward(self, train_bars, test_bars, step_bars=None, metric='net_profit', processes=None):
+        """
+        Run walk-forward analysis of every trading robot, parameters are optimized on each train window
+        (parameter space from 'optimize' field, robot without it uses its own parameters) and run on next test window.
+        Results are kept in self.walk_forward_results (key is trading robot name) and written to
+        walk_forward_results/<robot name>.csv
+
+        param: train_bars, number of bars of train window
+        param: test_bars, number of bars of test window
+        param: step_bars, number of bars to roll windows, None = test_bars
+        param: metric, metric used to select parameters: net_profit, total_trades, win_rate, max_drawdown
+        param: processes, number of worker processes (windows run in parallel), None = number of CPUs
+        """
+        logger.info('%s [%s]: %s', datetime_util.bangkok_now(), 'INFO'
+                    , "Walk-forward started...")
+
+        if len(self.model_bars) == 0:
+            self.process_signal()
+        model_bars_dict = {mbd['name']: mbd['bars'] for mbd in self.model_bars if mbd is not None}
 
-        for p in processes:
-            p.start()
+        results_path = '{}/{}'.format(os.path.abspath(os.getcwd()), 'walk_forward_results')
+        os.makedirs(results_path, exist_ok=True)
 
-        for _ in processes:
-            model_bars_dict = queue.get()  # Get returned results from queue
-            self.model_bars.append(model_bars_dict)
+        tr_robot_configs = self.robot_config['trading_robots']
+        for j in range(0, len(tr_robot_configs)):
+            tr_robot_config = tr_robot_configs[j]
+            robot_name = tr_robot_config['name']
+            # Signal bars exclude warm-up bars of windowed load, first train window starts at start_date
+            wf = walk_forward.WalkForward(self.__make_signal_func(j, tr_robot_config, model_bars_dict[robot_name])
+                                          , self.__get_kernel_kwargs(j, tr_robot_config, self.config['balance'])
+                                          , optimizer.parse_param_space(tr_robot_config.get('optimize') or {})
+                                          , train_bars, test_bars, step_bars=step_bars
+                                          , metric=metric
+                                          , ascending=(metric == 'max_drawdown')
+                                          , processes=processes)
+            result_df = wf.run()
+
+            self.walk_forward_results[robot_name] = result_df
+            result_df.to_csv('{}/{}.csv'.format(results_path, robot_name), index=False)
+            print(result_df.to_string())
+
+        logger.info('%s [%s]: %s', datetime_util.bangkok_now(), 'INFO'
+                    , "Walk-forward finished...")
+
+    def monte_carlo(self, sim_num=10000, method='shuffle', skip_prob=0.0, slippage_cost=0.0, processes=None
+                    , seed=None, percentiles=None):
+        """
+        Run Monte Carlo robustness test on trade list of last backtest of every trading robot and all robots (total).
+        Percentile tables are kept in self.monte_carlo_results (key is trading robot name or 'total') and written to
+        monte_carlo_results/<name>.csv
+
+        param: sim_num, number of simulated paths
+        param: method, 'shuffle' (reorder trades) or 'bootstrap' (resample trades with replacement)
+        param: skip_prob, probability that each trade is skipped
+        param: slippage_cost, maximum random slippage cost (money) of each trade
+        param: processes, number of worker processes, None = number of CPUs
+        param: seed, random seed
+        param: percentiles, list of percentiles of result tables, None = monte_carlo.DEFAULT_PERCENTILES
+        """
+        if len(self.trades) == 0:
+            raise TradeModelError('Monte Carlo requires trades of backtest, call backtest() first')
+
+        logger.info('%s [%s]: %s', datetime_util.bangkok_now(), 'INFO'
+                    , "Monte Carlo started...")
+
+        results_path = '{}/{}'.format(os.path.abspath(os.getcwd()), 'monte_carlo_results')
+        os.makedirs(results_path, exist_ok=True)
+
+        net_profits = {name: trades['net_profit'].to_numpy() for name, trades in self.trades.items()}
+        if len(net_profits) > 1:
+            net_profits['total'] = np.concatenate(list(net_profits.values()))
+        for name, profits in net_profits.items():
+            mc = monte_carlo.MonteCarlo(profits, self.config['balance'], sim_num=sim_num, method=method
+                                        , skip_prob=skip_prob, slippage_cost=slippage_cost
+                                        , chunk_size=self.config.get('monte_carlo_chunk_size', 1000)
+                                        , processes=processes, seed=seed)
+            result_df = monte_carlo.percentile_table(mc.run(), percentiles)
+
+            self.monte_carlo_results[name] = result_df
+            result_df.to_csv('{}/{}.csv'.format(results_path, name))
+            print(name)
+            print(result_df.to_string())
+
+        logger.info('%s [%s]: %s', datetime_util.bangkok_now(), 'INFO'
+                    , "Monte Carlo finished...")
+
+    def process_signal(self):
+        logger.info('%s [%s]: %s', datetime_util.bangkok_now(), 'INFO'
+                    , "Signal processing started...")
+
+        # Process signals in bounded worker pool, each worker writes signals to signal cache file
+        # and returns only cache key, then signals are loaded from the files here
+        robot_names = [robot['name'] for robot in list(self.robot_config['trading_robots'])]
+        tasks = [(model_index, robot_name) for model_index, robot_name in enumerate(robot_names)]
+        cache_keys = signal_pool.run_tasks(self.__handle_process_signal, tasks
+                                           , max_workers=self.config.get('signal_max_workers')
+                                           , chunk_size=self.config.get('signal_chunk_size', 1)
+                                           , timeout=self.config.get('signal_timeout')
+                                           , names=robot_names)
+
+        sig_cache = self.__get_signal_cache()
+        for robot_name, cache_key in zip(robot_names, cache_keys):
+            if cache_key is None:
+                continue
+            sig_df = sig_cache.load(*cache_key)
+            if sig_df is None:
+                raise TradeModelError('Signal results of robot {} not found in signal cache'.format(robot_name))
+            self.model_bars.append({'name': robot_name, 'bars': sig_df.to_numpy()})
+
+        # Remove old signal results by size or age
+        sig_cache.evict()
 
         # for bar_dict in self.model_bars:
         #    print(bar_dict['bars'])
@@ -266,42 +415,47 @@ class BacktestEngine():
             trading_robot_config = self.robot_config['trading_robots'][i]
 
             trade_model_module_path = (trade_model_root_path + trading_robot_config['trade_model_module']).replace('.', '/')
+            self.trade_model_files.append(trade_model_module_path + '.py')
 
-            # Set datasets
-            # Note: trading model 1 ตัวสามารถมี dataset ได้มากกว่า 1 dataset
-            # เช่น dataset ตัวนึงเอาไว้สำหรับ predict open buy/sell dataset อีกตัวเอาไว้สำหรับ predict SL/TP/Pos.size
-            price_datasets_index = 0 if len(self.config['price_files']) == 1 else i
-            datasets = {}
-            for model_name in trading_robot_config['model_names']:
-                # Will check deepcopy in future in case of performance optimization
-                datasets[model_name] = copy.deepcopy(self.price_datasets[price_datasets_index])
-
-            # Initialize mock robot context
-            robot_context = MockRobotContext(self.robot_config)
-            robot_context.datasets = datasets
-
-            tr_model_id = trading_robot_config['trade_model_id']
-            tr_model_class = trading_robot_config['trade_model_class']
-
-            # Get symbol name
-            symbol_name = self.__get_symbol_name(self.robot_config, trading_robot_config['symbol'])
-
-            # Create trade model object using dynamic import
-            spec = importlib.util.spec_from_file_location(trading_robot_config['trade_model_module'], trade_model_module_path + '.py')
-            model_module = importlib.util.module_from_spec(spec)
-            sys.modules[trading_robot_config['trade_model_module']] = model_module
-            spec.loader.exec_module(model_module)
-            model_module_class = getattr(model_module, trading_robot_config['trade_model_class'])
-            trade_model = model_module_class(symbol_name \
-                                             , robot_context \
-                                             , self.robot_config \
-                                             , trading_robot_config['trade_model_id'])
+            trade_model = self.__build_trade_model(i, trading_robot_config)
             trade_models.append(trade_model)
             # print(trade_models[0].trade_model_name)
             # print(trade_models[0].datasets[trading_robot_config['name']])
         return trade_models
 
-    def __handle_process_signal(self, model_index, robot_name, queue):
+    def __build_trade_model(self, model_index, trading_robot_config, price_df=None):
+        # Set datasets
+        # Note: trading model 1 ตัวสามารถมี dataset ได้มากกว่า 1 dataset
+        # เช่น dataset ตัวนึงเอาไว้สำหรับ predict open buy/sell dataset อีกตัวเอาไว้สำหรับ predict SL/TP/Pos.size
+        # price_df คือราคาที่ใช้แทน price dataset ของ engine (เช่น ราคาช่วงท้ายตอน resume จาก checkpoint)
+        price_datasets_index = 0 if len(self.config['price_files']) == 1 else model_index
+        datasets = {}
+        for model_name in trading_robot_config['model_names']:
+            # Columns modified by trade model are copied on write, others are shared
+            datasets[model_name] = self.price_datasets[price_datasets_index].view() if price_df is None \
+                else price_df.copy()
+
+        # Initialize mock robot context
+        robot_context = MockRobotContext(self.robot_config)
+        robot_context.datasets = datasets
+
+        # Get symbol name
+        symbol_name = self.__get_symbol_name(self.robot_config, trading_robot_config['symbol'])
+
+        # Create trade model object using dynamic import
+        spec = importlib.util.spec_from_file_location(trading_robot_config['trade_model_module']
+                                                      , self.trade_model_files[model_index])
+        model_module = importlib.util.module_from_spec(spec)
+        sys.modules[trading_robot_config['trade_model_module']] = model_module
+        spec.loader.exec_module(model_module)
+        model_module_class = getattr(model_module, trading_robot_config['trade_model_class'])
+        trade_model = model_module_class(symbol_name \
+                                         , robot_context \
+                                         , trading_robot_config \
+                                         , trading_robot_config['trade_model_id'])
+        return trade_model
+
+    def __handle_process_signal(self, model_index, robot_name):
         """
         robot_name คือ trading robot name ซึ่งเป็นชื่อเดียวกันกับ trading model name
         *ใน config ของ trading robot แต่ละตัวมีฟีลด์ชื่อ model_names ตรงนี้หมายถึง predictive model
@@ -315,327 +469,340 @@ class BacktestEngine():
         queue.put(model_bars_dict)
         """
 
-        # Prepare path
+        # Prepare signal cache key
         price_datasets_index = 0 if len(self.config['price_files']) == 1 else model_index
-        price_file = self.config['price_files'][price_datasets_index].replace('.csv', '').replace('.txt', '')
-        output_file = '{}_{}.csv'.format(robot_name, price_file)
-        cur_path = os.path.abspath(os.getcwd())
-        sig_results_path = '{}/{}'.format(cur_path, 'signal_results')
-        mkpath(sig_results_path)
-
-        sig_result_file_path = '{}/{}'.format(sig_results_path, output_file)
-        sig_file_has_modified = False
-        sig_file_not_found = False
-        try:
-            sig_file_has_modified = self.__check_modified(sig_result_file_path)
-        except FileNotFoundError:
-            sig_file_not_found = True
-
-        # Predict new one or load from existing file
+        price_file = self.config['price_files'][price_datasets_index]
+        price_file_path = '{}/{}'.format(self.config['root_price_path'], price_file)
+        trading_robot_config = self.robot_config['trading_robots'][model_index]
+        sig_cache = self.__get_signal_cache()
+        sig_cache_name = '{}_{}'.format(robot_name, price_file.replace('.csv', '').replace('.txt', ''))
+        sig_cache_key = signal_cache.make_key(price_file_path
+                                              , self.trade_model_files[model_index]
+                                              , {k: v for k, v in trading_robot_config.items() if k != 'optimize'}
+                                              , self.__get_symbol_info(self.robot_config, trading_robot_config['symbol'])
+                                              , [model_conf for model_conf in self.robot_config.get('models') or []
+                                                 if model_conf['name'] in trading_robot_config['model_names']]
+                                              , self.robot_config.get('root_module_path')
+                                              , [str(self.start_date), str(self.end_date), self.warmup_offsets])
+
+        # Predict new one or load from cache
         sig_df = None
-        if (sig_file_has_modified == False and sig_file_not_found == False and self.robot_config_has_modified == False) \
-                and self.reset_flag == False:
-            sig_df = pd.read_csv('{}/{}'.format(sig_results_path, output_file))
+        if self.reset_flag == False:
+            sig_df = sig_cache.load(sig_cache_name, sig_cache_key)
 
-        elif not (sig_file_has_modified == False and sig_file_not_found == False and self.robot_config_has_modified == False) \
-                or self.reset_flag == True:
+        if sig_df is None:
             # Get trading model and call prediction
             trade_model = self.trade_models[model_index]
             output_type = 1  # MUST BE 1
             sig_df = trade_model.predict(output_type=output_type)
 
-            # Write signals (with prices) to file
-            sig_df.to_csv(sig_result_file_path, index=False)
-            mod_time_since_epoc = os.path.getmtime(sig_result_file_path)
-
-            # Update running timestamp
-            track_file_path = '{}/{}_{}_{}.txt'.format(sig_results_path, robot_name, price_file, 'ts')
-            track_file = open(track_file_path, 'w')
-            track_file.write(str(mod_time_since_epoc))
-            track_file.close()
-
-        # Get numpy array from dataframe and put into queue for returning to backtest engine object
-        model_bars_dict = None
-        if sig_df is not None:
-            bars = sig_df.to_numpy()
-            model_bars_dict = {'name': robot_name, 'bars': bars}
-        queue.put(model_bars_dict)
+            # Write signals (with prices) to cache
+            sig_cache.save(sig_cache_name, sig_cache_key, sig_df)
 
-    def __get_last_mod_time(self, file_path):
-        # Get epoc time of last modified time of specified file
-        mod_time_since_epoc = os.path.getmtime(file_path)
-        return mod_time_since_epoc
+        # Returns only cache name and key, signals are loaded from cache file by backtest engine object
+        if sig_df is None:
+            return None
+        return sig_cache_name, sig_cache_key
 
-    def __check_modified(self, file_path):
-        has_modified = False
-
-        track_file_path = ''
-        fs = file_path.split('.')
-        for i in range(0, len(fs) - 1):
-            track_file_path = track_file_path + fs[i]
-        track_file_path = '{}_ts.txt'.format(track_file_path)
-
-        # Check last modified time
-        track_file = None
-        track_file_found = False
-        try:
-            track_file = open(track_file_path, 'r')
-            track_file_found = True
-        except FileNotFoundError:
-            track_file = open(track_file_path, 'w')
-            track_file.write('')
-            track_file.close()
-            track_file = open(track_file_path, 'r')
-
-        prev_mod_time_since_epoc = 0.0
-        track_data = track_file.read()
-        if track_data != '':
-            prev_mod_time_since_epoc = float(track_data)
-        track_file.close()
-
-        mod_time_since_epoc = 0.0
-        try:
-            mod_time_since_epoc = self.__get_last_mod_time(file_path)
-            if track_file_found == False or mod_time_since_epoc != prev_mod_time_since_epoc:
-                track_file = open(track_file_path, 'w')
-                track_file.write(str(mod_time_since_epoc))
-                track_file.close()
-        except FileNotFoundError:
-            raise
+    def __load_price_datasets(self):
+        """
+        Load price files (converted to columnar files once, see price_store) into shared datasets.
+        When start_date or end_date is defined, only bars in date range plus warm-up bars before start_date
+        (config 'warmup_bars') are loaded, number of warm-up bars of each dataset is kept in self.warmup_offsets
+        """
+        warmup_bars = self.config.get('warmup_bars', 500) if self.start_date is not None else 0
+        price_datasets = []
+        self.warmup_offsets = []
+        for price_file in self.config['price_files']:
+            store = price_store.open_store('{}/{}'.format(self.config['root_price_path'], price_file))
+            start, _ = store.get_range(self.start_date, self.end_date)
+            df = store.load(start_date=self.start_date, end_date=self.end_date, warmup_bars=warmup_bars)
+            price_datasets.append(shared_dataset.SharedDataset(df))
+            self.warmup_offsets.append(start - max(start - warmup_bars, 0))
+        return price_datasets
+
+    def __get_checkpoint_key(self):
+        return checkpoint.make_key(self.trade_model_files
+                                   , {k: v for k, v in self.config.items() if k not in ['start_date', 'end_date']}
+                                   , self.robot_config)
+
+    def __load_checkpoint(self):
+        """
+        Returns checkpoint of previous backtest if it can be resumed: config 'checkpoint_file' is defined,
+        backtest runs on all bars, configs and trade models are not changed and price files have only new bars appended.
+        Otherwise returns None.
+        """
+        checkpoint_file = self.config.get('checkpoint_file')
+        if not checkpoint_file or self.reset_flag or (self.start_date, self.end_date) != (None, None):
+            return None
+        resume = checkpoint.load_checkpoint(checkpoint_file, self.__get_checkpoint_key())
+        if resume is None:
+            return None
+        for price_file, price_mark in zip(self.config['price_files'], resume['price_marks']):
+            store = price_store.open_store('{}/{}'.format(self.config['root_price_path'], price_file))
+            if not checkpoint.is_appended(store, price_mark):
+                return None
+        logger.info('%s [%s]: %s', datetime_util.bangkok_now(), 'INFO'
+                    , "Resume from checkpoint {}".format(checkpoint_file))
+        return resume
+
+    def __save_checkpoint(self, robots):
+        checkpoint_file = self.config.get('checkpoint_file')
+        if not checkpoint_file or (self.start_date, self.end_date) != (None, None):
+            return
+        price_marks = [checkpoint.get_price_mark(price_store.open_store('{}/{}'.format(self.config['root_price_path']
+                                                                                       , price_file)))
+                       for price_file in self.config['price_files']]
+        checkpoint.save_checkpoint(checkpoint_file, self.__get_checkpoint_key(), price_marks, robots)
+
+    def __process_signal_resume(self, resume):
+        """
+        Signal bars are signal bars of checkpoint plus signals of new bars, computed from last warm-up bars
+        (config 'warmup_bars') and new bars only.
+        Signals of warm-up bars (except first half, which is warm-up of indicators of trade model) must be the same
+        as signals of checkpoint, otherwise signals of new bars may differ from full run (e.g. indicators that depend
+        on all previous bars such as EMA), then signals of all bars are processed again and backtest is not resumed.
+        Returns resume if resumed, None if not.
+        """
+        logger.info('%s [%s]: %s', datetime_util.bangkok_now(), 'INFO'
+                    , "Signal processing of new bars started...")
+
+        warmup_bars = self.config.get('warmup_bars', 500)
+        model_bars = []
+        for j, tr_robot_config in enumerate(self.robot_config['trading_robots']):
+            robot_name = tr_robot_config['name']
+            price_datasets_index = 0 if len(self.config['price_files']) == 1 else j
+            old_bars = resume['robots'][robot_name]['bars']
+            old_row_num = resume['price_marks'][price_datasets_index][0]
+
+            store = price_store.open_store('{}/{}'.format(self.config['root_price_path']
+                                                          , self.config['price_files'][price_datasets_index]))
+            bars = old_bars
+            if store.row_num > old_row_num:
+                start = max(old_row_num - warmup_bars, 0)
+                trade_model = self.__build_trade_model(j, tr_robot_config, price_df=store.load_rows(start))
+                tail_bars = trade_model.predict(output_type=1).to_numpy().astype(old_bars.dtype)
+
+                # Compare signals of overlapped bars with checkpoint, all bars when tail starts from first bar
+                check_start = start if start == 0 else start + (old_row_num - start) // 2
+                if not pd.DataFrame(tail_bars[check_start - start:old_row_num - start]) \
+                        .equals(pd.DataFrame(old_bars[check_start:old_row_num])):
+                    logger.info('%s [%s]: %s', datetime_util.bangkok_now(), 'INFO'
+                                , "Signals of robot {} differ from checkpoint, process signals of all bars"
+                                .format(robot_name))
+                    self.model_bars = []
+                    self.process_signal()
+                    return None
+
+                bars = np.concatenate([old_bars, tail_bars[old_row_num - start:]])
+            model_bars.append({'name': robot_name, 'bars': bars})
+        self.model_bars = model_bars
 
-        # Determine
-        if mod_time_since_epoc != prev_mod_time_since_epoc:
-            has_modified = True
+        logger.info('%s [%s]: %s', datetime_util.bangkok_now(), 'INFO'
+                    , "Signal processing of new bars finished...")
+        return resume
 
-        return has_modified
+    def __get_signal_cache(self):
+        cur_path = os.path.abspath(os.getcwd())
+        sig_results_path = '{}/{}'.format(cur_path, 'signal_results')
+        return signal_cache.SignalCache(sig_results_path
+                                        , max_bytes=self.config.get('signal_cache_max_bytes')
+                                        , max_age=self.config.get('signal_cache_max_age'))
 
-    def __process_backtest(self):
+    def __process_backtest(self, detailed=False, resume=None):
         logger.info('%s [%s]: %s', datetime_util.bangkok_now(), 'INFO'
                     , "Backtest started...")
 
-        sm = state_machine.StateMachine()
         tr_robot_configs = self.robot_config['trading_robots']
 
+        # Map robot name to its signal bars once, instead of searching the list on every bar
+        model_bars_dict = {}
+        for mbd in self.model_bars:
+            if mbd is not None:
+                model_bars_dict[mbd['name']] = mbd['bars']
+
         total_bar = 0
         try:
-            total_bar = self.model_bars[0]['bars'].shape[0]
+            total_bar = model_bars_dict[tr_robot_configs[0]['name']].shape[0] - self.__get_warmup_offset(0)
             print('total_bar = {}'.format(total_bar))
         except:
             raise Exception('Could not get total bar')
 
         # Initialize shared balance and equity between models
         balance = self.config['balance']
-        equity = balance
 
-        # Initialization of each models
-        model_cur_trades = []
-        model_cur_trade_ids = []
-        model_ids = []
-        for i in range(0, len(tr_robot_configs)):
-            model_cur_trades.append(None)
-            model_cur_trade_ids.append(0)
-            model_ids.append(i + 1)
+        # 'numpy' = vectorized bar kernel, 'loop' = reference bar by bar loop
+        if self.config.get('bar_kernel', 'numpy') == 'loop':
+            process_bars = bar_kernel.process_bars_loop
+        else:
+            process_bars = bar_kernel.process_bars
 
         # ===================================================================================
-        # Loop through all bars
-        for i in range(0, total_bar):
-            for j in range(0, len(tr_robot_configs)):
-                model_bar_dict = self.__get_model_bar_dict(tr_robot_configs[j]['name'])
-                model_name = model_bar_dict['name']
-                bar = model_bar_dict['bars'][i]
-                if i > 0:
-                    prev_bar = self.model_bars[j]['bars'][i - 1]
-                else:
-                    prev_bar = None
-
-                action = self.__handle_process_bar(balance
-                                                   , equity
-                                                   , model_ids[j]
-                                                   , model_cur_trade_ids[j]
-                                                   , model_cur_trades[j]
-                                                   , bar, prev_bar)
-                if action == 1:
-                    print('datetime:{}, action:{}'.format(bar[self.idx_datetime]
-                                                          , sm.get_action_name(action)))
+        # Process all bars of each models, one pass per model
+        robot_states = {}
+        for j in range(0, len(tr_robot_configs)):
+            tr_robot_config = tr_robot_configs[j]
+            model_name = tr_robot_config['name']
+
+            # Skip warm-up bars, run only bars in date range
+            bars = model_bars_dict[model_name][self.__get_warmup_offset(j):]
+            if resume is not None and model_name in resume['robots']:
+                # Continue from trades of checkpoint, only bars from last active trade are simulated
+                robot_state = resume['robots'][model_name]
+                trades, equity = bar_kernel.resume_bars(bars, robot_state['trades'], robot_state['bars'].shape[0]
+                                                        , **self.__get_kernel_kwargs(j, tr_robot_config, balance))
+            else:
+                trades, equity = process_bars(bars, **self.__get_kernel_kwargs(j, tr_robot_config, balance))
+            robot_states[model_name] = {'bars': bars, 'trades': trades, 'equity': equity}
+
+            self.trade_stores[model_name] = trade_store.TradeStore.from_arrays(trades
+                                                                               , symbol=tr_robot_config['symbol'])
+            self.trades[model_name] = self.trade_stores[model_name].to_frame(bar_kernel.TRADE_COLUMNS)
+            self.equity_curves[model_name] = equity
+
+            # Detailed mode only, fast mode does not create recorder
+            if detailed:
+                self.__record_detail(j, tr_robot_config, trades, bars)
         # ===================================================================================
+
+        # Save state for next run on appended price files
+        self.__save_checkpoint(robot_states)
+
+        # Portfolio backtest, all robots share balance, equity and margin
+        if self.config.get('portfolio_backtest', False):
+            self.__process_portfolio(model_bars_dict, balance)
+
+        # Update trading statistics
+        self.__update_trade_stats(model_bars_dict, balance)
+
         logger.info('%s [%s]: %s', datetime_util.bangkok_now(), 'INFO'
                     , "Backtest finished...")
 
-    def __handle_process_bar(self, balance, equity, model_id, cur_trade_id
-                             , cur_trade, bar, prev_bar):
-        sm = state_machine.StateMachine()
+    def __make_signal_func(self, model_index, tr_robot_config, default_bars):
+        """
+        Returns function that returns signal bars (without warm-up bars) of trading robot with signal parameters
+        (used by optimizer and walk-forward), empty parameters returns signal bars of current config
+        """
+        # Skip warm-up bars same as backtest, trades in warm-up bars are not counted
+        warmup_offset = self.__get_warmup_offset(model_index)
 
-        # Get basic action code: open buy / open sell / close buy / close sell
-        action = self.__get_basic_action(bar, cur_trade, sm)
+        def signal_func(signal_params):
+            if len(signal_params) == 0:
+                return default_bars[warmup_offset:]
+            trade_model = self.__build_trade_model(model_index, dict(tr_robot_config, **signal_params))
+            return trade_model.predict(output_type=1).to_numpy()[warmup_offset:]
+        return signal_func
 
-        # 1=close price on signal bar, 2=open price of next bar
-        action_bar = self.config['action_bar_price']
-        action_date, action_price = self.__get_action_dateprice(action_bar, bar, prev_bar)
+    def __process_portfolio(self, model_bars_dict, balance):
+        """
+        Step all robots over merged timeline with shared balance, results are kept in self.portfolio_result
+        and trades of each robot are replaced by trades sized from shared balance
+        """
+        engine = portfolio.PortfolioEngine(balance, margin_rate=self.config.get('margin_rate'))
+        tr_robot_configs = self.robot_config['trading_robots']
+        for j in range(0, len(tr_robot_configs)):
+            tr_robot_config = tr_robot_configs[j]
+            model_name = tr_robot_config['name']
+            sizing = dict(tr_robot_config, pos_size_decimal_num=self.robot_config.get('quantity_digits', 2))
+            engine.add_robot(model_name, model_bars_dict[model_name][self.__get_warmup_offset(j):]
+                             , self.__get_kernel_kwargs(j, tr_robot_config, balance), sizing=sizing)
+
+        self.portfolio_result = engine.run()
+        for model_name, store in self.portfolio_result['trades'].items():
+            self.trade_stores[model_name] = store
+            self.trades[model_name] = store.to_frame(bar_kernel.TRADE_COLUMNS)
+
+    def __record_detail(self, model_index, tr_robot_config, trades, bars):
+        detail_path = '{}/{}/{}'.format(os.path.abspath(os.getcwd()), 'detailed_trades', tr_robot_config['name'])
+        recorder = detail_recorder.DetailRecorder(detail_path
+                                                  , chunk_size=self.config.get('detail_chunk_size', 65536))
+        try:
+            value_per_point = self.__get_kernel_kwargs(model_index, tr_robot_config, 0.0)['value_per_point']
+            recorder.record_trades(trades, bars[:, bar_kernel.IDX_PRICE_CLOSE].astype(float), value_per_point)
+        finally:
+            recorder.close()
 
-        # ===================================================================================
-        if action in [sm.ACTION_OPEN_BUY, sm.ACTION_OPEN_SELL]:
-            # Handle enter trade
-            self.__handle_enter_trade(model_id, cur_trade_id, cur_trade
-                                      , bar, prev_bar, action_date, action_price)
-        elif action in [sm.ACTION_CLOSE_BUY, sm.ACTION_CLOSE_SELL]:
-            # Handle exit trade
-            exit_reason = 0
-            self.__handle_exit_trade(cur_trade, action_date, action_price, exit_reason)
-        elif action in [sm.ACTION_HOLD_BUY, sm.ACTION_HOLD_SELL]:
-            # Handle stop loss and take profit
-            self.__handle_sltp(bar, prev_bar, cur_trade, action_date)
-
-            # If trade is still alive
-            # Handle action on hold position state
-            if cur_trade.exit == 0:
-                self.__handle_action_on_position()
+    def __get_warmup_offset(self, model_index):
+        price_datasets_index = 0 if len(self.config['price_files']) == 1 else model_index
+        return self.warmup_offsets[price_datasets_index]
 
-        # ===================================================================================
+    def __get_kernel_kwargs(self, model_index, tr_robot_config, balance):
+        """
+        Returns keyword arguments of bar kernel for specified trading robot
+        """
+        symbol_info = self.__get_symbol_info(self.robot_config, tr_robot_config['symbol'])
+        return {'model_id': model_index + 1
+                , 'action_bar': self.config['action_bar_price']
+                , 'balance': balance
+                , 'base_pos_size': tr_robot_config.get('limit_pos_size', 1.0)
+                , 'price_per_pip': symbol_info['tick_size'] * self.config.get('point_per_pip', 10)
+                , 'value_per_point': symbol_info['tick_value'] / symbol_info['tick_size']
+                , 'intrabar': self.__get_intrabar(model_index, tr_robot_config)
+                , 'cost_model': self.__get_cost_model(tr_robot_config)}
+
+    def __get_cost_model(self, tr_robot_config):
+        """
+        Returns cost_model.CostModel from config keys 'commission_tiers', 'spread', 'slippage',
+        'slippage_size_factor' and 'slippage_volatility_factor' (trading robot config overrides backtest config),
+        None if no cost is defined
+        """
+        return cost_model.CostModel.from_config(dict(self.config, **tr_robot_config))
 
-        # Update trading statistics
-        self.__update_trade_stats()
-
-        return action
-
-    def __update_trade_stats(self):
-        print('Hello')
-
-    def __handle_enter_trade(self, model_id, cur_trade_id, cur_trade
-                             , bar, prev_bar, action_date, action_price):
-        new_trade_id = self.__generate_trade_id(model_id, cur_trade_id)
-
-        cur_trade = Trade(new_trade_id, symbol, trade_type, entry_date, entry_price
-                          , pos_size, stop_loss=0.0, take_profit=0.0
-                          , stop_loss_price=0.0, take_profit_price=0.0)
-
-    def __generate_trade_id(self, model_id, cur_trade_id):
-        return int(str(model_id) + str(cur_trade_id + 1))
-
-    def __handle_exit_trade(self, cur_trade, action_date, action_price, exit_reason):
-        cur_trade.exit_date = action_date
-        cur_trade.exit_price = self.__simulate_exit_price(cur_trade.trade_type
-                                                          , cur_trade.pos_size
-                                                          , action_price)
-        cur_trade.exit_reason = exit_reason
-
-    def __handle_sltp(self, bar, prev_bar, cur_trade, action_date):
-        reached_sl = False
-        reached_tp = False
-        reached_price = 0.0
-
-        if cur_trade != None:
-            # Get current trading position's attributes
-            trade_type = cur_trade.trade_type
-            sl_price = cur_trade.stop_loss_price
-            tp_price = cur_trade.take_profit_price
-
-            # 1=close price on signal bar, 2=open price of next bar
-            action_bar = self.config['action_bar_price']
-            if action_bar == 1:
-                price_open = bar[self.idx_price_open]
-                price_high = bar[self.idx_price_high]
-                price_low = bar[self.idx_price_low]
-
-            elif action_bar == 2:
-                price_open = prev_bar[self.idx_price_open]
-                price_high = prev_bar[self.idx_price_high]
-                price_low = prev_bar[self.idx_price_low]
-
-            if trade_type == state_machine.STATE_BUY:
-                # Check stop loss
-                if price_open <= sl_price:
-                    reached_sl = True
-                    reached_price = price_open
-                elif price_low <= sl_price:
-                    reached_sl = True
-                    reached_price = sl_price
-
-                # Check take profit
-                if price_open >= tp_price:
-                    reached_tp = True
-                    reached_price = price_open
-                elif price_high >= tp_price:
-                    reached_tp = True
-                    reached_price = _price
-
-            elif trade_type == state_machine.STATE_SELL:
-                # Check stop loss
-                if price_open >= sl_price:
-                    reached_sl = True
-                    reached_price = price_open
-                elif price_high >= sl_price:
-                    reached_sl = True
-                    reached_price = sl_price
-
-                # Check take profit
-                if price_open <= tp_price:
-                    reached_tp = True
-                    reached_price = price_open
-                elif price_low <= tp_price:
-                    reached_tp = True
-                    reached_price = tp_price
-
-            # Determine exit trade
-            if reached_price > 0:
-                if action == sm.ACTION_HOLD_BUY:
-                    action = sm.ACTION_CLOSE_BUY
-                elif action == sm.ACTION_HOLD_SELL:
-                    action = sm.ACTION_CLOSE_SELL
-
-                exit_reason = 2 if reached_sl == True else 3
-                self.__handle_exit_trade(cur_trade, action_date, reached_price, exit_reason)
-
-    def __handle_action_on_position(self):
-        print('Hello')
-
-    def __get_basic_action(self, bar_state_row, cur_trade, st_machine):
-        action = st_machine.ACTION_WAIT
-
-        # Determine trade type
-        # NOTE: trade type and trade state has same meaning
-        cur_trade_type = state_machine.State.STATE_IDLE
-        if cur_trade is not None:
-            cur_trade_type = cur_trade.trade_type  # 1=Buy, 2=Sell, 3=IDLE
-
-        # Get signal and set action
-        if bar_state_row[self.idx_close_buy] == 1 and bar_state_row[self.idx_open_sell] == 0:
-            action = st_machine.ACTION_CLOSE_BUY
-        elif bar_state_row[self.idx_close_sell] == 1 and bar_state_row[self.idx_open_buy] == 0:
-            action = st_machine.ACTION_CLOSE_SELL
-        elif bar_state_row[self.idx_open_buy] == 1:
-            action = st_machine.get_trade_action(st_machine.SIGNAL_BUY, cur_trade_type)
-        elif bar_state_row[self.idx_open_sell] == 1:
-            action = st_machine.get_trade_action(st_machine.SIGNAL_SELL, cur_trade_type)
-
-        return action
-
-    def __simulate_exit_price(self, trade_type, pos_size, action_price):
-        exit_price = 0.0
-        slippage = self.__simulate_slippage(pos_size)
-
-        if trade_type == state_machine.STATE_BUY:
-            exit_price = action_price - slippage
-        elif trade_type == state_machine.STATE_SELL:
-            exit_price = action_price + slippage
-
-        return exit_price
-
-    def __get_action_dateprice(self, action_bar, bar, prev_bar):
-        if action_bar == 1:
-            action_date = bar[self.idx_datetime]
-            action_price = bar[self.idx_price_close]
-        elif action_bar == 2:
-            action_date = prev_bar[self.idx_datetime]
-            action_price = prev_bar[self.idx_price_open]
-
-        return action_date, action_price
-
-    def __simulate_slippage(self, pos_size):
-        slippage = 0.0
-
-        # Add code later
-
-        return slippage
+    def __get_intrabar(self, model_index, tr_robot_config):
+        """
+        Returns intrabar data (lower timeframe prices from config 'intrabar_price_files') used to resolve bars
+        that both SL and TP have been reached, None if not defined
+        """
+        intrabar_files = self.config.get('intrabar_price_files')
+        if not intrabar_files:
+            return None
+        if model_index not in self.intrabar_data:
+            model_bars_dict = {mbd['name']: mbd['bars'] for mbd in self.model_bars if mbd is not None}
+            intrabar_file = intrabar_files[0] if len(intrabar_files) == 1 else intrabar_files[model_index]
+            child_df = price_store.load_price('{}/{}'.format(self.config['root_price_path'], intrabar_file)
+                                              , start_date=self.start_date, end_date=self.end_date)
+            parent_dates = model_bars_dict[tr_robot_config['name']][:, bar_kernel.IDX_DATETIME]
+            self.intrabar_data[model_index] = intrabar.IntrabarData.from_frame(parent_dates, child_df)
+        return self.intrabar_data[model_index]
+
+    def __update_trade_stats(self, model_bars_dict, balance):
+        """
+        Compute statistics of each robot and total (portfolio) into self.trade_stats (DataFrame, index is robot name)
+        """
+        annual_factor = self.config.get('stats_annual_factor')
+        tr_robot_configs = self.robot_config['trading_robots']
+        robot_stats = {}
+        robot_mae = []
+        robot_mfe = []
+        for j in range(0, len(tr_robot_configs)):
+            tr_robot_config = tr_robot_configs[j]
+            model_name = tr_robot_config['name']
+            trades = {col: self.trades[model_name][col].to_numpy() for col in bar_kernel.TRADE_COLUMNS}
+            kernel_kwargs = self.__get_kernel_kwargs(j, tr_robot_config, balance)
+            mae, mfe = trade_stats.get_mae_mfe(trades, model_bars_dict[model_name][self.__get_warmup_offset(j):]
+                                               , value_per_point=kernel_kwargs['value_per_point']
+                                               , action_bar=kernel_kwargs['action_bar'])
+            # Portfolio trades are sized from shared balance, equity is built from the same trades
+            equity = self.equity_curves.get(model_name) if self.portfolio_result is None \
+                else self.portfolio_result['robot_equity'][model_name]
+            robot_stats[model_name] = trade_stats.compute_stats(trades['net_profit'], equity=equity
+                                                                , mae=mae, mfe=mfe, annual_factor=annual_factor)
+            robot_mae.append(mae)
+            robot_mfe.append(mfe)
+
+        # Total equity is portfolio equity, or sum of profit of robots when all robots have same bars
+        total_equity = None
+        if self.portfolio_result is not None:
+            total_equity = self.portfolio_result['equity']
+        elif len(set(len(self.equity_curves[name]) for name in robot_stats)) == 1:
+            total_equity = balance + sum(self.equity_curves[name] - balance for name in robot_stats)
+        net_profits = np.concatenate([self.trades[name]['net_profit'].to_numpy() for name in robot_stats])
+        total_stats = trade_stats.compute_stats(net_profits, equity=total_equity
+                                                , mae=np.concatenate(robot_mae), mfe=np.concatenate(robot_mfe)
+                                                , annual_factor=annual_factor)
+
+        self.trade_stats = trade_stats.stats_table(robot_stats, total_stats)
+        print(self.trade_stats.to_string())
 
     def __get_symbol_name(self, robot_config, symbol_id):
         symbol_name = None
@@ -645,11 +812,10 @@ class BacktestEngine():
                 break
         return symbol_name
 
-    def __get_model_bar_dict(self, model_name):
-        model_bar_dict = None
-        for mbd in self.model_bars:
-            if mbd['name'] == model_name:
-                model_bar_dict = mbd
+    def __get_symbol_info(self, robot_config, symbol_id):
+        symbol_info = None
+        for symbol in robot_config['symbols']:
+            if symbol['id'] == symbol_id:
+                symbol_info = symbol
                 break
-        return model_bar_dict
-
+        return symbol_info
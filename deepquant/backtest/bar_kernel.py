@@ -0,0 +1,430 @@
+import numpy as np
+
+import deepquant.common.state_machine as state_machine
+
+"""
+## Bar Kernel
+
+ฟังก์ชั่นในโมดูลนี้ใช้จำลองการเทรดจาก signal bars ของ trading robot 1 ตัว (1 pass ต่อ 1 robot)
+แล้ว return trade list (แบบ columnar dictionary of numpy arrays) และ equity curve
+
+มี 2 implementation ที่ให้ผลลัพธ์ตรงกันทุกประการ
+1. process_bars คือ kernel ที่ใช้ numpy โดยวนลูปตามจำนวน trade ไม่ใช่จำนวน bar
+การหา bar ที่มี exit signal ใช้ np.searchsorted และการหา bar ที่ชน SL/TP ใช้ vectorized scan บน slice ของราคา
+2. process_bars_loop คือ reference loop ที่ประมวลผลทีละ bar ใช้สำหรับตรวจสอบความถูกต้องของ kernel
+
+### Simulation Rules
+* action_bar = 1: signal ของ bar i จะถูก execute ที่ราคาปิดของ bar i
+* action_bar = 2: signal ของ bar i จะถูก execute ที่ราคาเปิดของ bar i + 1 (signal ของ bar สุดท้ายจะถูกข้ามไป)
+* SL/TP จะถูกตรวจสอบตั้งแต่ bar ถัดจาก signal bar ที่เปิด position ไปจนถึง signal bar ที่ปิด position
+* กรณีราคาเปิด gap ผ่าน SL/TP จะ exit ที่ราคาเปิด, กรณี SL และ TP ถูกชนภายใน bar เดียวกันจะถือว่าชน SL ก่อน
+* ค่า STOP_LOSS / TAKE_PROFIT ใน signal เป็นหน่วย pip และจะถูกแปลงเป็นราคาด้วย price_per_pip ตอนเปิด position
+ค่า 0 หมายถึงไม่ใช้ SL/TP
+* trade ที่ยังไม่ exit ตอนจบ จะมี exit_reason = 0 และคำนวณกำไรด้วยราคาปิดของ bar สุดท้าย
+* ถ้ากำหนด intrabar (intrabar.IntrabarData) bar ที่ชนทั้ง SL และ TP จะหาว่าชนอะไรก่อนจากข้อมูล timeframe ที่เล็กกว่า
+* ถ้ากำหนด cost_model (cost_model.CostModel) ราคา entry/exit จะถูกปรับด้วย spread/slippage
+(volatility คือ high - low ของ bar ที่ fill) และหักค่า commission ของ entry และ exit ออกจาก net_profit
+หลังจากจำลอง trade ทั้งหมดแล้วในครั้งเดียว (apply_costs) จุดที่ชน SL/TP ยังคำนวณจากราคาก่อนหักต้นทุน
+* ยังไม่รองรับการ scale in/out (SCALE_TYPE, SCALE_SIZE, STOP_TYPE)
+"""
+
+# Bar column indexes, same as signal columns returned from trade_model.predict(output_type=1)
+IDX_DATETIME = 0
+IDX_PRICE_OPEN = 1
+IDX_PRICE_HIGH = 2
+IDX_PRICE_LOW = 3
+IDX_PRICE_CLOSE = 4
+IDX_PRICE_VOLUME = 5
+IDX_OPEN_BUY = 6
+IDX_OPEN_SELL = 7
+IDX_CLOSE_BUY = 8
+IDX_CLOSE_SELL = 9
+IDX_STOP_LOSS = 10
+IDX_TAKE_PROFIT = 11
+IDX_POS_SIZE = 12
+IDX_SCALE_TYPE = 13
+IDX_SCALE_SIZE = 14
+IDX_STOP_TYPE = 15
+
+# Exit reasons: 0 = active trade, 1 = exited by close action, 2 = exited by SL, 3 = exited by TP
+EXIT_ACTIVE = 0
+EXIT_CLOSE = 1
+EXIT_STOP_LOSS = 2
+EXIT_TAKE_PROFIT = 3
+
+# Basic action codes of each bar
+BAR_ACTION_NONE = 0
+BAR_ACTION_CLOSE_BUY = 1
+BAR_ACTION_CLOSE_SELL = 2
+BAR_ACTION_BUY = 3
+BAR_ACTION_SELL = 4
+
+TRADE_COLUMNS = ['trade_id', 'trade_type', 'entry_bar', 'entry_date', 'entry_price'
+                 , 'exit_bar', 'exit_date', 'exit_price', 'exit_reason', 'pos_size'
+                 , 'stop_loss_price', 'take_profit_price', 'profit_points', 'net_profit', 'hold_bars', 'commission']
+
+
+def get_bar_actions(bars):
+    """
+    Returns basic action code of every bar (numpy int8 array) using same priority as BacktestEngine,
+    close buy -> close sell -> open buy -> open sell
+    """
+    open_buy = bars[:, IDX_OPEN_BUY].astype(float) == 1
+    open_sell = bars[:, IDX_OPEN_SELL].astype(float) == 1
+    close_buy = bars[:, IDX_CLOSE_BUY].astype(float) == 1
+    close_sell = bars[:, IDX_CLOSE_SELL].astype(float) == 1
+
+    actions = np.full(bars.shape[0], BAR_ACTION_NONE, dtype=np.int8)
+    actions[open_sell] = BAR_ACTION_SELL
+    actions[open_buy] = BAR_ACTION_BUY
+    actions[close_sell & ~open_buy] = BAR_ACTION_CLOSE_SELL
+    actions[close_buy & ~open_sell] = BAR_ACTION_CLOSE_BUY
+    return actions
+
+
+def generate_trade_id(model_id, cur_trade_id):
+    return int(str(model_id) + str(cur_trade_id + 1))
+
+
+def _get_price_columns(bars):
+    p_open = bars[:, IDX_PRICE_OPEN].astype(float)
+    p_high = bars[:, IDX_PRICE_HIGH].astype(float)
+    p_low = bars[:, IDX_PRICE_LOW].astype(float)
+    p_close = bars[:, IDX_PRICE_CLOSE].astype(float)
+    return p_open, p_high, p_low, p_close
+
+
+def _get_sltp_prices(trade_type, entry_price, sl_pips, tp_pips, price_per_pip):
+    # Unused SL/TP is represented by infinite price so that it never be reached
+    if trade_type == state_machine.State.STATE_BUY:
+        sl_price = entry_price - (sl_pips * price_per_pip) if sl_pips > 0 else -np.inf
+        tp_price = entry_price + (tp_pips * price_per_pip) if tp_pips > 0 else np.inf
+    else:
+        sl_price = entry_price + (sl_pips * price_per_pip) if sl_pips > 0 else np.inf
+        tp_price = entry_price - (tp_pips * price_per_pip) if tp_pips > 0 else -np.inf
+    return sl_price, tp_price
+
+
+def _get_sltp_exit(trade_type, sl_price, tp_price, price_open):
+    """
+    Returns exit price and exit reason of the bar that SL or TP has been reached
+    """
+    if trade_type == state_machine.State.STATE_BUY:
+        if price_open <= sl_price:
+            return price_open, EXIT_STOP_LOSS
+        elif price_open >= tp_price:
+            return price_open, EXIT_TAKE_PROFIT
+    else:
+        if price_open >= sl_price:
+            return price_open, EXIT_STOP_LOSS
+        elif price_open <= tp_price:
+            return price_open, EXIT_TAKE_PROFIT
+    return None, None
+
+
+def _new_trade_columns():
+    return {col: [] for col in TRADE_COLUMNS}
+
+
+def _append_trade(trades, trade, exit_bar, exit_date, exit_price, exit_reason, slippage, value_per_point):
+    trade_type = trade['trade_type']
+    if exit_reason != EXIT_ACTIVE:
+        exit_price = exit_price - slippage if trade_type == state_machine.State.STATE_BUY else exit_price + slippage
+
+    if trade_type == state_machine.State.STATE_BUY:
+        profit_points = exit_price - trade['entry_price']
+    else:
+        profit_points = trade['entry_price'] - exit_price
+
+    for col in ['trade_id', 'trade_type', 'entry_bar', 'entry_date', 'entry_price'
+                , 'pos_size', 'stop_loss_price', 'take_profit_price']:
+        trades[col].append(trade[col])
+    trades['exit_bar'].append(exit_bar)
+    trades['exit_date'].append(exit_date)
+    trades['exit_price'].append(exit_price)
+    trades['exit_reason'].append(exit_reason)
+    trades['profit_points'].append(profit_points)
+    trades['net_profit'].append(profit_points * trade['pos_size'] * value_per_point)
+    trades['hold_bars'].append(exit_bar - trade['entry_bar'])
+    trades['commission'].append(0.0)
+
+
+def _to_trade_arrays(trades):
+    dtypes = {'trade_id': np.int64, 'trade_type': np.int8, 'entry_bar': np.int64, 'entry_date': object
+              , 'exit_bar': np.int64, 'exit_date': object, 'exit_reason': np.int8, 'hold_bars': np.int64}
+    return {col: np.asarray(trades[col], dtype=dtypes.get(col, np.float64)) for col in TRADE_COLUMNS}
+
+
+def _build_equity(trades, p_close, balance, value_per_point):
+    """
+    Equity of every bar is initial balance + realized profit + unrealized profit at close price
+    """
+    total_bar = p_close.shape[0]
+    realized = np.zeros(total_bar)
+    unrealized = np.zeros(total_bar)
+
+    exited = trades['exit_reason'] != EXIT_ACTIVE
+    np.add.at(realized, trades['exit_bar'][exited], trades['net_profit'][exited])
+
+    for k in range(0, trades['trade_id'].shape[0]):
+        entry_bar = trades['entry_bar'][k]
+        end_bar = trades['exit_bar'][k] if exited[k] else total_bar
+        direction = 1.0 if trades['trade_type'][k] == state_machine.State.STATE_BUY else -1.0
+        unrealized[entry_bar:end_bar] = direction * (p_close[entry_bar:end_bar] - trades['entry_price'][k]) \
+                                        * trades['pos_size'][k] * value_per_point
+
+    return balance + np.cumsum(realized) + unrealized
+
+
+def apply_costs(trades, cost_model, p_high, p_low, value_per_point):
+    """
+    Returns trades with entry/exit prices, profit and commission after costs of cost_model, vectorized for all trades
+    param: cost_model, cost_model.CostModel
+    param: p_high, p_low, high and low prices of signal bars, volatility of each fill is high - low of fill bar
+    """
+    direction = np.where(trades['trade_type'] == state_machine.State.STATE_BUY, 1.0, -1.0)
+    exited = trades['exit_reason'] != EXIT_ACTIVE
+    volatility = p_high - p_low
+    entry_price, exit_price, commission = cost_model.get_trade_costs(direction, trades['entry_price']
+                                                                     , trades['exit_price'], trades['pos_size']
+                                                                     , exited
+                                                                     , volatility[trades['entry_bar']]
+                                                                     , volatility[trades['exit_bar']])
+    profit_points = direction * (exit_price - entry_price)
+    return dict(trades, entry_price=entry_price, exit_price=exit_price, profit_points=profit_points
+                , net_profit=profit_points * trades['pos_size'] * value_per_point - commission
+                , commission=commission)
+
+
+def process_bars(bars, model_id=1, action_bar=1, balance=0.0, base_pos_size=1.0
+                 , price_per_pip=1.0, value_per_point=1.0, slippage=0.0, intrabar=None, cost_model=None):
+    """
+    Simulate trades of one trading robot from its signal bars using numpy.
+
+    param: bars, numpy array of signal bars (columns are same as trade_model.signal_cols)
+    param: model_id, trading robot (model) id used to generate trade id
+    param: action_bar, 1 = close price on signal bar, 2 = open price of next bar
+    param: balance, initial balance of equity curve
+    param: base_pos_size, position size when POS_SIZE signal is 1.0 (100%)
+    param: price_per_pip, price change of 1 pip, used to convert STOP_LOSS / TAKE_PROFIT signals to price
+    param: value_per_point, money value of 1.0 price change for position size 1.0
+    param: slippage, slippage in price unit applied to exit price
+    param: intrabar, intrabar.IntrabarData used to resolve bars that both SL and TP have been reached,
+    None = SL has been reached first
+    param: cost_model, cost_model.CostModel of commission, spread and slippage, None = no cost
+    return: trades (dictionary of numpy arrays, keys are TRADE_COLUMNS), equity (numpy array)
+    """
+    total_bar = bars.shape[0]
+    dates = bars[:, IDX_DATETIME]
+    p_open, p_high, p_low, p_close = _get_price_columns(bars)
+    sl_pips = bars[:, IDX_STOP_LOSS].astype(float)
+    tp_pips = bars[:, IDX_TAKE_PROFIT].astype(float)
+    pos_size_pct = bars[:, IDX_POS_SIZE].astype(float)
+
+    actions = get_bar_actions(bars)
+    if action_bar == 2 and total_bar > 0:
+        # Signal on last bar could not be executed because there is no next bar
+        actions[total_bar - 1] = BAR_ACTION_NONE
+    exec_offset = 0 if action_bar == 1 else 1
+    exec_prices = p_close if action_bar == 1 else np.append(p_open[1:], np.nan)
+
+    # Signal bar indexes of each event type
+    open_idx = np.flatnonzero((actions == BAR_ACTION_BUY) | (actions == BAR_ACTION_SELL))
+    exit_buy_idx = np.flatnonzero((actions == BAR_ACTION_CLOSE_BUY) | (actions == BAR_ACTION_SELL))
+    exit_sell_idx = np.flatnonzero((actions == BAR_ACTION_CLOSE_SELL) | (actions == BAR_ACTION_BUY))
+
+    trades = _new_trade_columns()
+    cur_trade_id = 0
+    k = np.searchsorted(open_idx, 0)
+    sig_bar = open_idx[k] if k < open_idx.shape[0] else None
+
+    while sig_bar is not None:
+        # Open new position from signal bar
+        trade_type = state_machine.State.STATE_BUY if actions[sig_bar] == BAR_ACTION_BUY \
+            else state_machine.State.STATE_SELL
+        entry_bar = sig_bar + exec_offset
+        entry_price = exec_prices[sig_bar]
+        sl_price, tp_price = _get_sltp_prices(trade_type, entry_price, sl_pips[sig_bar], tp_pips[sig_bar]
+                                              , price_per_pip)
+        trade = {'trade_id': generate_trade_id(model_id, cur_trade_id), 'trade_type': trade_type
+                 , 'entry_bar': entry_bar, 'entry_date': dates[entry_bar], 'entry_price': entry_price
+                 , 'pos_size': pos_size_pct[sig_bar] * base_pos_size
+                 , 'stop_loss_price': sl_price, 'take_profit_price': tp_price}
+        cur_trade_id = cur_trade_id + 1
+
+        # Find next exit signal
+        exit_idx = exit_buy_idx if trade_type == state_machine.State.STATE_BUY else exit_sell_idx
+        k = np.searchsorted(exit_idx, sig_bar + 1)
+        exit_sig_bar = exit_idx[k] if k < exit_idx.shape[0] else None
+
+        # Find first bar that SL/TP has been reached, between next bar and exit signal bar
+        check_start = sig_bar + 1
+        check_end = exit_sig_bar + 1 if exit_sig_bar is not None else total_bar
+        sltp_bar = None
+        if check_start < check_end:
+            if trade_type == state_machine.State.STATE_BUY:
+                hit_sl = p_low[check_start:check_end] <= sl_price
+                hit_tp = p_high[check_start:check_end] >= tp_price
+            else:
+                hit_sl = p_high[check_start:check_end] >= sl_price
+                hit_tp = p_low[check_start:check_end] <= tp_price
+            hits = hit_sl | hit_tp
+            first = np.argmax(hits)
+            if hits[first]:
+                sltp_bar = check_start + first
+                exit_price, exit_reason = _get_sltp_exit(trade_type, sl_price, tp_price, p_open[sltp_bar])
+                if exit_price is None:
+                    if hit_sl[first] and hit_tp[first] and intrabar is not None:
+                        # Ambiguous bar, find which one has been reached first from lower timeframe
+                        exit_price, exit_reason = intrabar.resolve(dates[sltp_bar], trade_type, sl_price, tp_price)
+                    else:
+                        exit_price, exit_reason = (sl_price, EXIT_STOP_LOSS) if hit_sl[first] \
+                            else (tp_price, EXIT_TAKE_PROFIT)
+
+        # Exit and find next signal bar to open position
+        if sltp_bar is not None:
+            _append_trade(trades, trade, sltp_bar, dates[sltp_bar], exit_price, exit_reason
+                          , slippage, value_per_point)
+            next_start = sltp_bar
+        elif exit_sig_bar is not None:
+            exit_bar = exit_sig_bar + exec_offset
+            _append_trade(trades, trade, exit_bar, dates[exit_bar], exec_prices[exit_sig_bar], EXIT_CLOSE
+                          , slippage, value_per_point)
+            if actions[exit_sig_bar] in [BAR_ACTION_BUY, BAR_ACTION_SELL]:
+                # Reverse position on same signal bar
+                sig_bar = exit_sig_bar
+                continue
+            next_start = exit_sig_bar + 1
+        else:
+            _append_trade(trades, trade, total_bar - 1, dates[total_bar - 1], p_close[total_bar - 1]
+                          , EXIT_ACTIVE, slippage, value_per_point)
+            break
+
+        k = np.searchsorted(open_idx, next_start)
+        sig_bar = open_idx[k] if k < open_idx.shape[0] else None
+
+    trades = _to_trade_arrays(trades)
+    if cost_model is not None:
+        trades = apply_costs(trades, cost_model, p_high, p_low, value_per_point)
+    equity = _build_equity(trades, p_close, balance, value_per_point)
+    return trades, equity
+
+
+def resume_bars(bars, prev_trades, prev_total_bar, model_id=1, action_bar=1, balance=0.0, value_per_point=1.0
+                , **kwargs):
+    """
+    Continue simulation from trades of previous run on first prev_total_bar bars (e.g. before new bars have been
+    appended), returns same trades and equity as process_bars(bars) but simulates only bars from signal bar
+    of trade that was still active (or last bar of previous run), other parameters are same as process_bars.
+
+    Previous run is stateless except its last active trade (and last signal bar that could not be executed when
+    action_bar = 2), so simulation is restarted from that signal bar and closed trades are kept as they are.
+    """
+    exec_offset = 0 if action_bar == 1 else 1
+    active = prev_trades['exit_reason'] == EXIT_ACTIVE
+    if np.any(active):
+        resume_bar = int(prev_trades['entry_bar'][np.argmax(active)]) - exec_offset
+    else:
+        resume_bar = max(prev_total_bar - exec_offset, 0)
+
+    kept = {col: np.asarray(prev_trades[col])[~active] for col in TRADE_COLUMNS}
+    if resume_bar < bars.shape[0]:
+        new_trades, _ = process_bars(bars[resume_bar:], model_id=model_id, action_bar=action_bar, balance=balance
+                                     , value_per_point=value_per_point, **kwargs)
+        new_num = new_trades['trade_id'].shape[0]
+        new_trades['entry_bar'] = new_trades['entry_bar'] + resume_bar
+        new_trades['exit_bar'] = new_trades['exit_bar'] + resume_bar
+        new_trades['trade_id'] = np.array([generate_trade_id(model_id, kept['trade_id'].shape[0] + k)
+                                           for k in range(0, new_num)], dtype=np.int64)
+        trades = {col: np.concatenate([kept[col], new_trades[col]]) for col in TRADE_COLUMNS}
+    else:
+        trades = kept
+
+    equity = _build_equity(trades, _get_price_columns(bars)[3], balance, value_per_point)
+    return trades, equity
+
+
+def process_bars_loop(bars, model_id=1, action_bar=1, balance=0.0, base_pos_size=1.0
+                      , price_per_pip=1.0, value_per_point=1.0, slippage=0.0, intrabar=None, cost_model=None):
+    """
+    Reference implementation of process_bars, process bar by bar. Parameters and outputs are same as process_bars.
+    """
+    total_bar = bars.shape[0]
+    dates = bars[:, IDX_DATETIME]
+    p_open, p_high, p_low, p_close = _get_price_columns(bars)
+
+    trades = _new_trade_columns()
+    cur_trade_id = 0
+    cur_trade = None
+    pending = None
+
+    def exit_trade(exit_bar, exit_price, exit_reason):
+        _append_trade(trades, cur_trade, exit_bar, dates[exit_bar], exit_price, exit_reason
+                      , slippage, value_per_point)
+
+    def execute(action, sig_bar, exec_bar, exec_price):
+        nonlocal cur_trade, cur_trade_id
+        cur_type = cur_trade['trade_type'] if cur_trade is not None else state_machine.State.STATE_IDLE
+
+        if action == BAR_ACTION_CLOSE_BUY and cur_type == state_machine.State.STATE_BUY \
+                or action == BAR_ACTION_CLOSE_SELL and cur_type == state_machine.State.STATE_SELL \
+                or action == BAR_ACTION_BUY and cur_type == state_machine.State.STATE_SELL \
+                or action == BAR_ACTION_SELL and cur_type == state_machine.State.STATE_BUY:
+            exit_trade(exec_bar, exec_price, EXIT_CLOSE)
+            cur_trade = None
+
+        if action == BAR_ACTION_BUY and cur_type != state_machine.State.STATE_BUY \
+                or action == BAR_ACTION_SELL and cur_type != state_machine.State.STATE_SELL:
+            trade_type = state_machine.State.STATE_BUY if action == BAR_ACTION_BUY else state_machine.State.STATE_SELL
+            sl_price, tp_price = _get_sltp_prices(trade_type, exec_price, float(bars[sig_bar, IDX_STOP_LOSS])
+                                                  , float(bars[sig_bar, IDX_TAKE_PROFIT]), price_per_pip)
+            cur_trade = {'trade_id': generate_trade_id(model_id, cur_trade_id), 'trade_type': trade_type
+                         , 'entry_bar': exec_bar, 'entry_date': dates[exec_bar], 'entry_price': exec_price
+                         , 'pos_size': float(bars[sig_bar, IDX_POS_SIZE]) * base_pos_size
+                         , 'stop_loss_price': sl_price, 'take_profit_price': tp_price, 'check_start': sig_bar + 1}
+            cur_trade_id = cur_trade_id + 1
+
+    actions = get_bar_actions(bars)
+    for i in range(0, total_bar):
+        # Execute signal of previous bar at open price
+        if pending is not None:
+            execute(pending, i - 1, i, p_open[i])
+            pending = None
+
+        # Handle stop loss and take profit
+        if cur_trade is not None and i >= cur_trade['check_start']:
+            trade_type = cur_trade['trade_type']
+            sl_price = cur_trade['stop_loss_price']
+            tp_price = cur_trade['take_profit_price']
+            exit_price, exit_reason = _get_sltp_exit(trade_type, sl_price, tp_price, p_open[i])
+            if exit_price is None:
+                if trade_type == state_machine.State.STATE_BUY:
+                    reached_sl, reached_tp = p_low[i] <= sl_price, p_high[i] >= tp_price
+                else:
+                    reached_sl, reached_tp = p_high[i] >= sl_price, p_low[i] <= tp_price
+                if reached_sl and reached_tp and intrabar is not None:
+                    exit_price, exit_reason = intrabar.resolve(dates[i], trade_type, sl_price, tp_price)
+                elif reached_sl:
+                    exit_price, exit_reason = sl_price, EXIT_STOP_LOSS
+                elif reached_tp:
+                    exit_price, exit_reason = tp_price, EXIT_TAKE_PROFIT
+            if exit_price is not None:
+                exit_trade(i, exit_price, exit_reason)
+                cur_trade = None
+
+        # Handle signal of this bar
+        action = actions[i]
+        if action != BAR_ACTION_NONE:
+            if action_bar == 1:
+                execute(action, i, i, p_close[i])
+            elif i + 1 < total_bar:
+                pending = action
+
+    if cur_trade is not None:
+        exit_trade(total_bar - 1, p_close[total_bar - 1], EXIT_ACTIVE)
+
+    trades = _to_trade_arrays(trades)
+    if cost_model is not None:
+        trades = apply_costs(trades, cost_model, p_high, p_low, value_per_point)
+    equity = _build_equity(trades, p_close, balance, value_per_point)
+    return trades, equity
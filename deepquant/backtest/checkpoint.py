@@ -0,0 +1,99 @@
+import hashlib
+import os
+import pickle
+import tempfile
+
+import yaml
+
+"""
+## Backtest Checkpoint
+
+เก็บสถานะของ backtest ตอนจบการรัน เพื่อให้การรันครั้งถัดไปบนไฟล์ราคาที่มี bar ใหม่ต่อท้าย
+คำนวณเฉพาะส่วนที่เพิ่มขึ้น แทนการ predict signal และจำลองการเทรดใหม่ทั้งหมด
+
+### ข้อมูลใน checkpoint
+* key: hash ของ source code ของ trade model, config ของ backtest และ config ของ trading robot
+ถ้ามีการเปลี่ยนแปลงใดๆ checkpoint จะใช้ไม่ได้และจะรันใหม่ทั้งหมด
+* price_marks: จำนวน bar และ datetime key ของ bar แรกและ bar สุดท้ายของไฟล์ราคาแต่ละไฟล์
+ใช้ตรวจสอบว่าไฟล์ราคาใหม่คือไฟล์เดิมที่มี bar ต่อท้ายเท่านั้น
+* robots: signal bars, trade arrays (รวม trade ที่ยังเปิดอยู่) และ equity ของ trading robot แต่ละตัว
+
+### การรันต่อ (resume)
+* signal ของ bar ใหม่คำนวณจากราคาช่วงท้าย (warm-up bars ตาม config 'warmup_bars' + bar ใหม่) แล้วต่อท้าย signal เดิม
+ผลลัพธ์จะตรงกับการรันใหม่ทั้งหมดเมื่อ indicator ของ trade model ใช้ข้อมูลย้อนหลังไม่เกินจำนวน warm-up bars
+ซึ่ง backtest engine ตรวจสอบโดยเทียบ signal ของ warm-up bars ครึ่งหลังกับ signal เดิม ถ้าไม่ตรงกัน
+(เช่น EMA ที่ขึ้นกับทุก bar ก่อนหน้า) จะ predict signal ของทุก bar ใหม่และไม่ resume
+* การจำลองการเทรดใช้ bar_kernel.resume_bars ซึ่งเริ่มจาก signal bar ของ trade ที่ยังเปิดอยู่
+ผลลัพธ์ตรงกับการรันใหม่ทั้งหมดทุกประการ
+* ไฟล์ checkpoint เขียนลง temp file แล้ว os.replace จึงไม่มีทางอ่านเจอไฟล์ที่เขียนไม่เสร็จ
+"""
+
+CHECKPOINT_VERSION = 1
+
+
+def make_key(file_paths, *configs):
+    """
+    Returns checkpoint key from content of files (e.g. trade model source code) and YAML serializable configs
+    """
+    h = hashlib.sha256()
+    for file_path in file_paths:
+        with open(file_path, 'rb') as f:
+            h.update(hashlib.sha256(f.read()).hexdigest().encode())
+    for config in configs:
+        h.update(yaml.safe_dump(config, sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def get_price_mark(store):
+    """
+    Returns (row number, first datetime key, last datetime key) of price store
+    """
+    datetime_key = store.get_datetime_key()
+    if datetime_key is None or store.row_num == 0:
+        return store.row_num, None, None
+    return store.row_num, int(datetime_key[0]), int(datetime_key[store.row_num - 1])
+
+
+def is_appended(store, price_mark):
+    """
+    Returns True if price store has same bars as price mark plus zero or more new bars at the end
+    """
+    row_num, first_key, last_key = price_mark
+    datetime_key = store.get_datetime_key()
+    if datetime_key is None or first_key is None or store.row_num < row_num:
+        return False
+    return int(datetime_key[0]) == first_key and int(datetime_key[row_num - 1]) == last_key
+
+
+def save_checkpoint(file_path, key, price_marks, robots):
+    """
+    param: key, checkpoint key (see make_key)
+    param: price_marks, list of price marks (see get_price_mark) of price files
+    param: robots, dictionary of trading robot name and dictionary of 'bars', 'trades' and 'equity'
+    """
+    checkpoint = {'version': CHECKPOINT_VERSION, 'key': key, 'price_marks': price_marks, 'robots': robots}
+    dir_path = os.path.dirname(os.path.abspath(file_path))
+    os.makedirs(dir_path, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=dir_path)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(checkpoint, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, file_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def load_checkpoint(file_path, key):
+    """
+    Returns checkpoint dictionary, or None if not found or key (or version) is different
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            checkpoint = pickle.load(f)
+    except (FileNotFoundError, OSError, EOFError, pickle.UnpicklingError):
+        return None
+    if checkpoint.get('version') != CHECKPOINT_VERSION or checkpoint.get('key') != key:
+        return None
+    return checkpoint
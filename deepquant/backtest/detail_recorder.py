@@ -0,0 +1,135 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+import deepquant.backtest.bar_kernel as bar_kernel
+import deepquant.common.state_machine as state_machine
+
+"""
+## Detailed Mode Recorder
+
+บันทึกสถานะของ trade position ทุก bar (โหมดละเอียด) ลง column buffer ของ numpy ที่จองไว้ล่วงหน้า
+เมื่อ buffer เต็มจะ flush ต่อท้ายไฟล์ของแต่ละ column ทีละ chunk ไม่มีการสร้าง dictionary ต่อ bar
+และไม่ต้องส่ง message ผ่าน message broker
+
+* 1 แถวคือสถานะของ 1 position ใน 1 bar ตั้งแต่ entry bar ถึง exit bar (แถวของ exit bar จะมี exited = 1)
+position ที่ยังไม่ exit จะมีแถวถึง bar สุดท้าย และ exited = 0
+* ไฟล์ผลลัพธ์เป็น directory หนึ่งไฟล์ต่อหนึ่ง column (<column>.bin แบบ raw binary) และ header.json
+ที่เก็บ dtype ของแต่ละ column และจำนวนแถว อ่านกลับด้วย load_detail() ซึ่งใช้ memory map
+* โหมดเร็วไม่สร้าง recorder เลย จึงไม่มีค่าใช้จ่ายใดๆ เพิ่ม
+"""
+
+DETAIL_COLUMNS = [('bar', np.int64), ('trade_id', np.int64), ('trade_type', np.int8), ('exited', np.int8)
+                  , ('stop_loss_price', np.float64), ('take_profit_price', np.float64)
+                  , ('unrealized_profit', np.float64), ('hold_bars', np.int64)
+                  , ('scale_in_num', np.int32), ('scale_out_num', np.int32)]
+
+HEADER_FILE = 'header.json'
+
+
+def load_detail(detail_path):
+    """
+    Returns DataFrame of detailed records, columns are memory mapped (read-only)
+    """
+    with open(os.path.join(detail_path, HEADER_FILE)) as f:
+        header = json.load(f)
+    data = {}
+    for col, dtype in header['columns']:
+        if header['row_num'] == 0:
+            data[col] = np.empty(0, dtype=np.dtype(dtype))
+        else:
+            data[col] = np.memmap(os.path.join(detail_path, col + '.bin'), dtype=np.dtype(dtype), mode='r'
+                                  , shape=(header['row_num'],))
+    return pd.DataFrame(data, columns=[col for col, _ in header['columns']], copy=False)
+
+
+class DetailRecorder():
+
+    def __init__(self, detail_path, chunk_size=65536):
+        """
+        param: detail_path, output directory, existing records are removed
+        param: chunk_size, number of rows kept in memory before flushing to files
+        """
+        self.detail_path = detail_path
+        self.chunk_size = chunk_size
+        self.buffers = {col: np.empty(chunk_size, dtype=dtype) for col, dtype in DETAIL_COLUMNS}
+        self.buffer_len = 0
+        self.row_num = 0
+
+        if os.path.exists(detail_path):
+            shutil.rmtree(detail_path)
+        os.makedirs(detail_path)
+        self.files = {col: open(os.path.join(detail_path, col + '.bin'), 'wb') for col, _ in DETAIL_COLUMNS}
+        self.__write_header()
+
+    # =======================================================================================
+    # BEGIN: Public methods
+    # =======================================================================================
+    def record_trades(self, trades, p_close, value_per_point):
+        """
+        Record state of every bar of every trade
+        param: trades, trade arrays returned from bar_kernel.process_bars
+        param: p_close, close prices of signal bars
+        param: value_per_point, money value of 1.0 price change for position size 1.0
+        """
+        total_bar = p_close.shape[0]
+        for k in range(0, trades['trade_id'].shape[0]):
+            entry_bar = int(trades['entry_bar'][k])
+            exited = trades['exit_reason'][k] != bar_kernel.EXIT_ACTIVE
+            end_bar = int(trades['exit_bar'][k]) + 1 if exited else total_bar
+            direction = 1.0 if trades['trade_type'][k] == state_machine.State.STATE_BUY else -1.0
+            profit_per_point = direction * trades['pos_size'][k] * value_per_point
+
+            # Write rows of this trade into buffer slices, flush when buffer is full
+            bar = entry_bar
+            while bar < end_bar:
+                n = min(end_bar - bar, self.chunk_size - self.buffer_len)
+                s = slice(self.buffer_len, self.buffer_len + n)
+                bars = np.arange(bar, bar + n)
+                self.buffers['bar'][s] = bars
+                self.buffers['trade_id'][s] = trades['trade_id'][k]
+                self.buffers['trade_type'][s] = trades['trade_type'][k]
+                self.buffers['exited'][s] = 0
+                self.buffers['stop_loss_price'][s] = trades['stop_loss_price'][k]
+                self.buffers['take_profit_price'][s] = trades['take_profit_price'][k]
+                self.buffers['unrealized_profit'][s] = (p_close[bar:bar + n] - trades['entry_price'][k]) \
+                    * profit_per_point
+                self.buffers['hold_bars'][s] = bars - entry_bar
+                self.buffers['scale_in_num'][s] = 0
+                self.buffers['scale_out_num'][s] = 0
+                if exited and bar + n == end_bar:
+                    # Position has been exited on last row, profit is realized
+                    self.buffers['exited'][s.stop - 1] = 1
+                    self.buffers['unrealized_profit'][s.stop - 1] = 0.0
+
+                self.buffer_len = self.buffer_len + n
+                bar = bar + n
+                if self.buffer_len == self.chunk_size:
+                    self.flush()
+
+    def flush(self):
+        if self.buffer_len == 0:
+            return
+        for col, _ in DETAIL_COLUMNS:
+            self.buffers[col][:self.buffer_len].tofile(self.files[col])
+            self.files[col].flush()
+        self.row_num = self.row_num + self.buffer_len
+        self.buffer_len = 0
+        self.__write_header()
+
+    def close(self):
+        self.flush()
+        for f in self.files.values():
+            f.close()
+
+    # =======================================================================================
+    # END: Public methods
+    # =======================================================================================
+
+    def __write_header(self):
+        header = {'row_num': self.row_num, 'columns': [[col, np.dtype(dtype).str] for col, dtype in DETAIL_COLUMNS]}
+        with open(os.path.join(self.detail_path, HEADER_FILE), 'w') as f:
+            json.dump(header, f)
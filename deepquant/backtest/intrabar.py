@@ -0,0 +1,110 @@
+import numpy as np
+
+import deepquant.backtest.bar_kernel as bar_kernel
+import deepquant.common.state_machine as state_machine
+import deepquant.data.price_store as price_store
+
+"""
+## Intrabar SL/TP Resolution
+
+เมื่อ SL และ TP ถูกชนภายใน bar เดียวกัน (ambiguous bar) bar kernel ปกติจะถือว่าชน SL ก่อน
+โมดูลนี้ใช้ข้อมูลของ timeframe ที่เล็กกว่า (เช่น M1 หรือ tick) เพื่อหาว่าชนอะไรก่อนจริงๆ
+
+* สร้าง index จาก parent bar ไปยังช่วงของ child bars (start, stop) ครั้งเดียวด้วย np.searchsorted
+child bar ที่อยู่ใน parent bar คือ child ที่มีเวลาตั้งแต่เวลาของ parent bar จนถึงก่อนเวลาของ parent bar ถัดไป
+ส่วน parent bar สุดท้ายใช้ child ไม่เกินเวลาของ parent bar นั้นบวกช่วงเวลาของ parent bar (median ของระยะห่างระหว่าง bar)
+เพื่อไม่ให้ใช้ child bars ที่อยู่หลัง parent bar สุดท้าย เมื่อข้อมูล child ยาวกว่าข้อมูล parent
+* การหาช่วง child bars ของ parent bar ใดๆ เป็น O(1) (dictionary ที่ key คือ DATETIME ของ parent bar)
+จึงใช้ได้กับ signal bars ที่ถูกตัดช่วง (เช่น walk-forward) โดยไม่ต้องสนใจ bar index
+* bar kernel จะเรียก resolve เฉพาะ ambiguous bar เท่านั้น bar อื่นไม่แตะข้อมูล child เลย
+* ใน child bars ใช้กฎเดียวกับ bar kernel คือ ราคาเปิด gap ผ่าน SL/TP จะ exit ที่ราคาเปิด
+และถ้า child bar เองยังชนทั้ง SL และ TP จะถือว่าชน SL ก่อน
+* ข้อมูล tick ใช้ได้โดยให้ราคา tick เป็นทั้ง open, high, low, close
+"""
+
+
+def _find_column(df, names):
+    cols = {str(col).strip().upper(): col for col in df.columns}
+    for name in names:
+        if name in cols:
+            return df[cols[name]].to_numpy(dtype=float)
+    return None
+
+
+class IntrabarData():
+
+    def __init__(self, parent_dates, child_times, child_open, child_high, child_low):
+        """
+        param: parent_dates, DATETIME column of parent (signal) bars
+        param: child_times, int64 datetime key (nanoseconds) of child bars, sorted
+        param: child_open, child_high, child_low, prices of child bars
+        """
+        self.child_open = np.asarray(child_open, dtype=float)
+        self.child_high = np.asarray(child_high, dtype=float)
+        self.child_low = np.asarray(child_low, dtype=float)
+
+        # Parent bar -> child slice index
+        parent_times = price_store.to_datetime_keys(parent_dates)
+        starts = np.searchsorted(child_times, parent_times, side='left')
+        # Last parent bar ends after one parent bar interval, end of child data if interval is unknown
+        last_stop_time = parent_times[-1] + int(np.median(np.diff(parent_times))) if len(parent_times) > 1 \
+            else np.iinfo(np.int64).max
+        stops = np.append(starts[1:], np.searchsorted(child_times, last_stop_time, side='left'))
+        self.slices = dict(zip(parent_dates, zip(starts.tolist(), np.maximum(stops, starts).tolist())))
+        self.resolve_num = 0
+
+    @classmethod
+    def from_frame(cls, parent_dates, child_df):
+        """
+        Create from child price DataFrame (e.g. loaded by price_store), child must have DATETIME or DATE and TIME
+        columns and OPEN, HIGH, LOW columns or PRICE/BID column (tick data)
+        """
+        child_times = price_store.parse_datetime_key(child_df)
+        if child_times is None:
+            raise ValueError('Could not parse datetime of intrabar price data')
+        tick = _find_column(child_df, ['PRICE', 'BID', 'CLOSE'])
+        p_open = _find_column(child_df, ['OPEN'])
+        p_high = _find_column(child_df, ['HIGH'])
+        p_low = _find_column(child_df, ['LOW'])
+        return cls(parent_dates, child_times, p_open if p_open is not None else tick
+                   , p_high if p_high is not None else tick, p_low if p_low is not None else tick)
+
+    # =======================================================================================
+    # BEGIN: Public methods
+    # =======================================================================================
+    def get_slice(self, parent_date):
+        return self.slices.get(parent_date, (0, 0))
+
+    def resolve(self, parent_date, trade_type, sl_price, tp_price):
+        """
+        Returns (exit price, exit reason) of parent bar that both SL and TP have been reached
+        """
+        self.resolve_num = self.resolve_num + 1
+        start, stop = self.get_slice(parent_date)
+        if stop > start:
+            p_open = self.child_open[start:stop]
+            if trade_type == state_machine.State.STATE_BUY:
+                hit_sl = self.child_low[start:stop] <= sl_price
+                hit_tp = self.child_high[start:stop] >= tp_price
+                gap_sl, gap_tp = p_open <= sl_price, p_open >= tp_price
+            else:
+                hit_sl = self.child_high[start:stop] >= sl_price
+                hit_tp = self.child_low[start:stop] <= tp_price
+                gap_sl, gap_tp = p_open >= sl_price, p_open <= tp_price
+
+            hits = hit_sl | hit_tp
+            first = np.argmax(hits)
+            if hits[first]:
+                if gap_sl[first]:
+                    return p_open[first], bar_kernel.EXIT_STOP_LOSS
+                if gap_tp[first]:
+                    return p_open[first], bar_kernel.EXIT_TAKE_PROFIT
+                return (sl_price, bar_kernel.EXIT_STOP_LOSS) if hit_sl[first] \
+                    else (tp_price, bar_kernel.EXIT_TAKE_PROFIT)
+
+        # No child data, same as coarse backtest
+        return sl_price, bar_kernel.EXIT_STOP_LOSS
+
+    # =======================================================================================
+    # END: Public methods
+    # =======================================================================================
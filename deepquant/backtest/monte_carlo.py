@@ -0,0 +1,148 @@
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+"""
+## Monte Carlo Robustness Test
+
+ทดสอบความทนทานของ strategy จาก trade list ของ backtest โดยสร้างลำดับ trade แบบสุ่มหลายพันชุด (path)
+แล้วดูการกระจายตัวของผลตอบแทนและ drawdown
+
+### Scenarios (ใช้ร่วมกันได้)
+* method = 'shuffle': สลับลำดับ trade (กำไรรวมเท่าเดิม แต่ drawdown เปลี่ยน)
+* method = 'bootstrap': สุ่ม trade แบบใส่คืน (resample with replacement) จำนวนเท่าเดิม
+* skip_prob: โอกาสที่แต่ละ trade จะถูกข้าม (เช่น ระบบล่ม, ส่ง order ไม่ทัน) trade ที่ถูกข้ามมีกำไร 0
+* slippage_cost: ต้นทุน slippage สูงสุดต่อ trade (หน่วยเงิน) แต่ละ trade จะถูกหักแบบสุ่ม uniform(0, slippage_cost)
+
+### การคำนวณ
+* แต่ละ chunk ของ simulation คำนวณเป็น matrix (จำนวน simulation x จำนวน trade) ด้วย numpy ทั้งก้อน
+ไม่มีการวนลูปต่อ path หรือต่อ trade
+* chunk กระจายไปยัง process pool (fork) worker สืบทอด trade array จาก process หลักโดยไม่ต้อง pickle
+และส่งกลับเฉพาะ metric ของแต่ละ path
+* random seed ของแต่ละ chunk สร้างจาก np.random.SeedSequence(seed).spawn() ผลลัพธ์จึงเหมือนเดิมทุกครั้ง
+ไม่ว่าจะใช้ worker กี่ตัว
+"""
+
+METHOD_SHUFFLE = 'shuffle'
+METHOD_BOOTSTRAP = 'bootstrap'
+
+PATH_METRICS = ['net_profit', 'return_pct', 'max_drawdown', 'max_drawdown_pct', 'skipped_trades']
+
+DEFAULT_PERCENTILES = [1, 5, 10, 25, 50, 75, 90, 95, 99]
+
+# Context of running simulations, inherited by worker processes
+_mc_context = None
+
+
+def simulate_paths(net_profits, sim_num, rng, method=METHOD_SHUFFLE, skip_prob=0.0, slippage_cost=0.0):
+    """
+    Returns (profit matrix of shape (sim_num, trade number), skipped mask) of random trade sequences
+    """
+    net_profits = np.asarray(net_profits, dtype=float)
+    if method == METHOD_SHUFFLE:
+        paths = rng.permuted(np.broadcast_to(net_profits, (sim_num, net_profits.shape[0])), axis=1)
+    elif method == METHOD_BOOTSTRAP:
+        paths = net_profits[rng.integers(0, net_profits.shape[0], size=(sim_num, net_profits.shape[0]))]
+    else:
+        raise ValueError('Unknown Monte Carlo method: {}'.format(method))
+
+    skipped = rng.random(paths.shape) < skip_prob if skip_prob > 0.0 else np.zeros(paths.shape, dtype=bool)
+    if slippage_cost > 0.0:
+        paths = paths - rng.uniform(0.0, slippage_cost, size=paths.shape)
+    paths[skipped] = 0.0
+    return paths, skipped
+
+
+def path_metrics(paths, balance, skipped=None):
+    """
+    Returns dictionary of PATH_METRICS arrays (one value per path) of profit matrix
+    """
+    equity = balance + np.cumsum(paths, axis=1)
+    peak = np.maximum(np.maximum.accumulate(equity, axis=1), balance)
+    drawdown = peak - equity
+    net_profit = equity[:, -1] - balance if equity.shape[1] > 0 else np.zeros(equity.shape[0])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        drawdown_pct = np.where(peak > 0, drawdown / peak * 100.0, 0.0)
+        return_pct = net_profit / balance * 100.0 if balance != 0 else np.zeros(equity.shape[0])
+    return {'net_profit': net_profit
+            , 'return_pct': return_pct
+            , 'max_drawdown': drawdown.max(axis=1, initial=0.0)
+            , 'max_drawdown_pct': drawdown_pct.max(axis=1, initial=0.0)
+            , 'skipped_trades': skipped.sum(axis=1) if skipped is not None else np.zeros(equity.shape[0], dtype=int)}
+
+
+def percentile_table(results, percentiles=None):
+    """
+    Returns DataFrame of percentiles (index) of each path metric (columns)
+    """
+    percentiles = percentiles or DEFAULT_PERCENTILES
+    table = pd.DataFrame({col: np.percentile(results[col].to_numpy(), percentiles) for col in PATH_METRICS}
+                         , index=pd.Index(percentiles, name='percentile'))
+    return table
+
+
+def _run_chunk(job):
+    sim_num, seed_seq = job
+    rng = np.random.default_rng(seed_seq)
+    paths, skipped = simulate_paths(_mc_context['net_profits'], sim_num, rng, method=_mc_context['method']
+                                    , skip_prob=_mc_context['skip_prob'], slippage_cost=_mc_context['slippage_cost'])
+    return path_metrics(paths, _mc_context['balance'], skipped)
+
+
+class MonteCarlo():
+
+    def __init__(self, net_profits, balance, sim_num=10000, method=METHOD_SHUFFLE, skip_prob=0.0, slippage_cost=0.0
+                 , chunk_size=1000, processes=None, seed=None):
+        """
+        param: net_profits, net profit of each trade in trade order (e.g. trades['net_profit'] of backtest)
+        param: balance, initial balance
+        param: sim_num, number of simulated paths
+        param: method, 'shuffle' or 'bootstrap'
+        param: skip_prob, probability that each trade is skipped
+        param: slippage_cost, maximum random slippage cost (money) of each trade
+        param: chunk_size, number of paths simulated at once (memory is chunk_size x trade number floats)
+        param: processes, number of worker processes, None = number of CPUs, 1 = run in this process
+        param: seed, random seed, None = random
+        """
+        self.net_profits = np.asarray(net_profits, dtype=float)
+        self.balance = balance
+        self.sim_num = sim_num
+        self.method = method
+        self.skip_prob = skip_prob
+        self.slippage_cost = slippage_cost
+        self.chunk_size = chunk_size
+        self.processes = processes
+        self.seed = seed
+
+    # =======================================================================================
+    # BEGIN: Public methods
+    # =======================================================================================
+    def run(self):
+        """
+        Returns DataFrame of path metrics, one row per simulated path
+        """
+        global _mc_context
+        sizes = [min(self.chunk_size, self.sim_num - start) for start in range(0, self.sim_num, self.chunk_size)]
+        jobs = list(zip(sizes, np.random.SeedSequence(self.seed).spawn(len(sizes))))
+
+        _mc_context = {'net_profits': self.net_profits, 'balance': self.balance, 'method': self.method
+                       , 'skip_prob': self.skip_prob, 'slippage_cost': self.slippage_cost}
+        try:
+            if self.processes == 1 or len(jobs) <= 1:
+                chunks = list(map(_run_chunk, jobs))
+            else:
+                # Workers inherit trade arrays from this process
+                ctx = multiprocessing.get_context('fork')
+                with ctx.Pool(processes=min(self.processes or multiprocessing.cpu_count(), len(jobs))) as pool:
+                    chunks = pool.map(_run_chunk, jobs)
+        finally:
+            _mc_context = None
+
+        if len(chunks) == 0:
+            return pd.DataFrame(columns=PATH_METRICS)
+        return pd.DataFrame({col: np.concatenate([chunk[col] for chunk in chunks]) for col in PATH_METRICS})
+
+    # =======================================================================================
+    # END: Public methods
+    # =======================================================================================
@@ -0,0 +1,235 @@
+import itertools
+import multiprocessing
+import time
+
+import numpy as np
+import pandas as pd
+
+import deepquant.backtest.bar_kernel as bar_kernel
+
+"""
+## Parameter Optimization
+
+ช่วงของ parameter ที่จะ optimize กำหนดไว้ในฟีลด์ optimize ของ trading robot แต่ละตัวใน robot config (YAML)
+โดยแต่ละ parameter กำหนดได้ 2 แบบ คือ list ของค่า หรือ dictionary ที่มี start, stop, step (รวมค่า stop ด้วย)
+เช่น
+    optimize:
+        limit_pos_size : {start: 0.1, stop: 0.6, step: 0.1}
+        stop_loss : [100, 200, 300]
+        ma_period : {start: 10, stop: 50, step: 10}
+
+parameter แบ่งเป็น 2 กลุ่ม
+1. kernel parameter (KERNEL_PARAMS) คือ parameter ที่มีผลเฉพาะ position size, SL/TP และราคาที่ใช้ execute
+parameter กลุ่มนี้จะใช้ signal bars ชุดเดิมที่คำนวณไว้แล้ว และรันแค่ bar kernel ในแต่ละ trial
+    - limit_pos_size คือ position size เมื่อ POS_SIZE signal เท่ากับ 1.0
+    - stop_loss, take_profit คือค่า SL/TP (pip) ที่ใช้แทนค่าจาก signal, ค่า 0 หมายถึงไม่ใช้ SL/TP
+    - action_bar_price คือ 1=close price on signal bar, 2=open price of next bar
+2. signal parameter คือ parameter อื่นๆ ที่จะถูกเซ็ตลงใน config ของ trading robot แล้ว predict signal ใหม่
+signal bars ของแต่ละชุดค่า signal parameter จะถูกคำนวณครั้งเดียวต่อ worker process แล้วใช้ซ้ำ
+
+วิธีค้นหาที่รองรับ ได้แก่ grid, random และ successive halving (halving)
+"""
+
+KERNEL_PARAMS = ['limit_pos_size', 'stop_loss', 'take_profit', 'action_bar_price']
+
+RESULT_METRICS = ['net_profit', 'total_trades', 'win_rate', 'max_drawdown']
+
+# Context of running optimization, inherited by worker processes
+_trial_context = None
+
+
+def parse_param_space(optimize_config):
+    """
+    Returns dictionary of parameter name and list of values from 'optimize' field of trading robot config
+    """
+    space = {}
+    for name, spec in optimize_config.items():
+        if isinstance(spec, dict):
+            values = np.arange(spec['start'], spec['stop'] + spec['step'] / 2.0, spec['step'])
+            if all(isinstance(spec[k], int) for k in ['start', 'stop', 'step']):
+                values = [int(v) for v in values]
+            else:
+                values = [round(float(v), 10) for v in values]
+        elif isinstance(spec, (list, tuple)):
+            values = list(spec)
+        else:
+            values = [spec]
+        space[name] = values
+    return space
+
+
+def grid_trials(space):
+    names = list(space.keys())
+    return [dict(zip(names, values)) for values in itertools.product(*[space[name] for name in names])]
+
+
+def random_trials(space, n_trials, seed=None):
+    trials = grid_trials(space)
+    if n_trials >= len(trials):
+        return trials
+    rng = np.random.default_rng(seed)
+    return [trials[i] for i in sorted(rng.choice(len(trials), n_trials, replace=False))]
+
+
+def split_params(params):
+    kernel_params = {k: v for k, v in params.items() if k in KERNEL_PARAMS}
+    signal_params = {k: v for k, v in params.items() if k not in KERNEL_PARAMS}
+    return kernel_params, signal_params
+
+
+def evaluate_bars(bars, kernel_kwargs, kernel_params):
+    """
+    Run bar kernel with kernel parameters and returns result metrics dictionary
+    """
+    kwargs = dict(kernel_kwargs)
+    if 'limit_pos_size' in kernel_params:
+        kwargs['base_pos_size'] = kernel_params['limit_pos_size']
+    if 'action_bar_price' in kernel_params:
+        kwargs['action_bar'] = kernel_params['action_bar_price']
+
+    # Override SL/TP columns only, signal columns are shared
+    if 'stop_loss' in kernel_params or 'take_profit' in kernel_params:
+        bars = bars.copy()
+        if 'stop_loss' in kernel_params:
+            bars[:, bar_kernel.IDX_STOP_LOSS] = kernel_params['stop_loss']
+        if 'take_profit' in kernel_params:
+            bars[:, bar_kernel.IDX_TAKE_PROFIT] = kernel_params['take_profit']
+
+    trades, equity = bar_kernel.process_bars(bars, **kwargs)
+    net_profits = trades['net_profit']
+    drawdown = np.maximum.accumulate(equity) - equity if equity.shape[0] > 0 else np.zeros(1)
+    return {'net_profit': float(np.sum(net_profits))
+            , 'total_trades': int(net_profits.shape[0])
+            , 'win_rate': float(np.mean(net_profits > 0)) if net_profits.shape[0] > 0 else 0.0
+            , 'max_drawdown': float(np.max(drawdown))}
+
+
+def _get_signal_bars(signal_params):
+    key = tuple(sorted(signal_params.items()))
+    bars_cache = _trial_context['bars_cache']
+    if key not in bars_cache:
+        bars_cache[key] = _trial_context['signal_func'](signal_params)
+    return bars_cache[key]
+
+
+def _run_trial(trial):
+    trial_no, params, budget = trial
+    start_time = time.time()
+
+    kernel_params, signal_params = split_params(params)
+    bars = _get_signal_bars(signal_params)
+    if budget is not None:
+        bars = bars[:budget]
+    result = evaluate_bars(bars, _trial_context['kernel_kwargs'], kernel_params)
+
+    result['trial'] = trial_no
+    result['budget'] = bars.shape[0]
+    result['elapsed'] = time.time() - start_time
+    result.update(params)
+    return result
+
+
+class Optimizer():
+
+    def __init__(self, signal_func, kernel_kwargs, param_space, metric='net_profit', ascending=False
+                 , processes=None, on_result=None):
+        """
+        param: signal_func, function returns signal bars (numpy array) from signal parameters dictionary
+        param: kernel_kwargs, keyword arguments of bar_kernel.process_bars
+        param: param_space, dictionary of parameter name and list of values, see parse_param_space
+        param: metric, metric used to rank trials, one of RESULT_METRICS
+        param: ascending, True = lower metric is better (e.g. max_drawdown)
+        param: processes, number of worker processes, None = number of CPUs
+        param: on_result, callback function called with result dictionary when each trial finished
+        """
+        self.signal_func = signal_func
+        self.kernel_kwargs = kernel_kwargs
+        self.param_space = param_space
+        self.metric = metric
+        self.ascending = ascending
+        self.processes = processes
+        self.on_result = on_result
+        self.results = []
+
+        # Signal bars of each signal parameters, key is tuple of sorted signal parameters
+        self.bars_cache = {}
+
+    # =======================================================================================
+    # BEGIN: Public methods
+    # =======================================================================================
+    def grid_search(self):
+        return self.__run(grid_trials(self.param_space))
+
+    def random_search(self, n_trials, seed=None):
+        return self.__run(random_trials(self.param_space, n_trials, seed=seed))
+
+    def successive_halving(self, n_trials=None, eta=3, min_budget=None, seed=None):
+        """
+        Evaluate all trials on first min_budget bars, keep best 1/eta trials and increase bars by eta times
+        until full bars. Returns ranked table of last round (full bars).
+        """
+        trials = grid_trials(self.param_space) if n_trials is None \
+            else random_trials(self.param_space, n_trials, seed=seed)
+
+        self.__prepare_context()
+        total_bar = _get_signal_bars({}).shape[0]
+        if min_budget is None:
+            rungs = int(np.floor(np.log(max(len(trials), 1)) / np.log(eta) + 1e-9))
+        else:
+            rungs = int(np.ceil(np.log(max(total_bar / min_budget, 1)) / np.log(eta) - 1e-9))
+
+        result_df = None
+        for rung in range(0, rungs + 1):
+            budget = None if rung == rungs else max(int(total_bar / (eta ** (rungs - rung))), 1)
+            result_df = self.__run(trials, budget=budget)
+            if rung < rungs:
+                keep_num = max(int(len(trials) / eta), 1)
+                keep_trials = set(result_df['trial'].iloc[:keep_num])
+                trials = [params for i, params in enumerate(trials) if i in keep_trials]
+        return result_df
+
+    def get_ranked_table(self):
+        result_df = pd.DataFrame(self.results)
+        if len(result_df) > 0:
+            result_df = result_df.sort_values(by=[self.metric], ascending=self.ascending, kind='mergesort') \
+                .reset_index(drop=True)
+        return result_df
+
+    # =======================================================================================
+    # END: Public methods
+    # =======================================================================================
+
+    def __prepare_context(self):
+        global _trial_context
+        _trial_context = {'signal_func': self.signal_func, 'kernel_kwargs': self.kernel_kwargs
+                          , 'bars_cache': self.bars_cache}
+
+    def __run(self, trials, budget=None):
+        self.__prepare_context()
+
+        # Compute shared signal bars before starting workers, so that all workers use same memory (copy-on-write)
+        if all(len(split_params(params)[1]) == 0 for params in trials):
+            _get_signal_bars({})
+
+        # Sort trials by signal parameters, so that each worker can reuse signal bars of neighbour trials
+        jobs = [(i, params, budget) for i, params in enumerate(trials)]
+        jobs.sort(key=lambda job: repr(sorted(split_params(job[1])[1].items())))
+
+        self.results = []
+        if self.processes == 1:
+            for result in map(_run_trial, jobs):
+                self.__handle_result(result)
+        else:
+            # Workers inherit trial context from this process
+            ctx = multiprocessing.get_context('fork')
+            with ctx.Pool(processes=self.processes) as pool:
+                chunk_size = max(int(len(jobs) / ((self.processes or multiprocessing.cpu_count()) * 4)), 1)
+                for result in pool.imap_unordered(_run_trial, jobs, chunksize=chunk_size):
+                    self.__handle_result(result)
+
+        return self.get_ranked_table()
+
+    def __handle_result(self, result):
+        self.results.append(result)
+        if self.on_result is not None:
+            self.on_result(result)
@@ -0,0 +1,224 @@
+import numpy as np
+
+import deepquant.backtest.bar_kernel as bar_kernel
+import deepquant.backtest.trade_store as trade_store
+import deepquant.common.state_machine as state_machine
+import deepquant.data.price_store as price_store
+import deepquant.robotemplate_fx.model.model_helper as model_helper
+
+"""
+## Portfolio Backtest
+
+backtest ระดับ portfolio ที่ trading robot ทุกตัวใช้ balance, equity และ margin ร่วมกัน
+robot แต่ละตัวอาจเทรดคนละ symbol และคนละ timeframe
+
+### ขั้นตอน
+1. รัน bar kernel ของ robot แต่ละตัวด้วย position size 1.0 เพื่อหาจังหวะเข้า/ออกของแต่ละ trade
+(จังหวะเข้า/ออกและ SL/TP ไม่ขึ้นกับ position size จึงคำนวณแยกกันได้)
+2. รวม datetime ของ bar ทุก robot เป็น timeline เดียว (merged timeline) และคำนวณ aligned index
+ของ robot แต่ละตัวบน timeline ครั้งเดียว
+3. เดินตาม event (entry/exit ของทุก robot) เรียงตามเวลาบน timeline โดย exit ก่อน entry ใน bar เดียวกัน
+* exit: รับรู้กำไร/ขาดทุนเข้า balance ที่ใช้ร่วมกัน และคืน margin
+* entry: คำนวณ position size จาก balance ณ เวลานั้น ด้วยสูตรเดียวกับตอนเทรดจริง (model_helper.cal_entry_pos_size)
+ถ้ามีการกำหนด margin_rate และ margin ไม่พอ จะไม่เปิด trade นั้น (position size = 0)
+สถานะของ position ที่เปิดอยู่เก็บใน numpy array ขนาดเท่าจำนวน robot แต่ละ event ใช้เวลาคงที่
+ทำให้เวลาที่ใช้เพิ่มขึ้นแบบเชิงเส้นตามจำนวน trade และจำนวน robot
+* ถ้า kernel_kwargs มี cost_model ค่า spread/slippage และ commission จะคำนวณจาก position size จริงของ trade
+ทั้งตอนรับรู้กำไรเข้า balance และใน trade ที่ return (ใช้ bar_kernel.apply_costs เดียวกับ backtest ปกติ)
+4. สร้าง equity curve บน timeline แบบ vectorized = balance เริ่มต้น + กำไรที่รับรู้แล้วสะสม
++ unrealized profit ของทุก robot (ใช้ราคาปิดของ bar ล่าสุดของ robot นั้น ณ เวลานั้น)
+และ equity curve ของ robot แต่ละตัวบน bar ของตัวเองจาก trade ที่ใช้ position size ของ portfolio
+(ใช้คำนวณสถิติ เช่น drawdown ของ robot ให้ตรงกับ trade ของ robot นั้น)
+"""
+
+EVENT_EXIT = 0
+EVENT_ENTRY = 1
+
+
+def parse_times(dates):
+    """
+    Returns int64 (nanoseconds) datetime of bars from DATETIME column of signal bars
+    """
+    return price_store.to_datetime_keys(dates)
+
+
+def merge_timeline(robot_times):
+    """
+    Returns sorted unique datetime of all robots
+    """
+    return np.unique(np.concatenate(robot_times))
+
+
+def align_index(times, timeline):
+    """
+    Returns index of latest bar at or before each timeline datetime, -1 if no bar yet
+    """
+    return np.searchsorted(times, timeline, side='right') - 1
+
+
+class PortfolioEngine():
+
+    def __init__(self, balance, margin_rate=None):
+        """
+        param: balance, initial balance shared by all robots
+        param: margin_rate, required margin per position value (e.g. 0.01 for leverage 1:100), None = no margin check
+        """
+        self.balance = balance
+        self.margin_rate = margin_rate
+        self.robots = []
+
+    # =======================================================================================
+    # BEGIN: Public methods
+    # =======================================================================================
+    def add_robot(self, name, bars, kernel_kwargs, sizing=None):
+        """
+        param: name, trading robot name
+        param: bars, signal bars of trading robot
+        param: kernel_kwargs, keyword arguments of bar_kernel.process_bars (base_pos_size and balance are ignored)
+        param: sizing, position sizing fields of trading robot config (cal_pos_size_formula, fund_allocate_size,
+        base_risk, limit_pos_size, cal_pos_size_formula2_size) and pos_size_decimal_num, point_value.
+        None = POS_SIZE signal * limit_pos_size (same as single robot backtest)
+        """
+        self.robots.append({'name': name, 'bars': bars, 'kernel_kwargs': kernel_kwargs, 'sizing': sizing})
+
+    def run(self):
+        """
+        Returns dictionary of 'timeline' (datetime64 array), 'equity' (equity on timeline), 'balance' (final balance),
+        'trades' (dictionary of robot name and trade_store.TradeStore with shared balance position sizes)
+        and 'robot_equity' (dictionary of robot name and equity on bars of robot from its trades, from initial balance)
+        """
+        robot_num = len(self.robots)
+
+        # Trades of each robot with position size 1.0
+        unit_trades = []
+        robot_times = []
+        for robot in self.robots:
+            kwargs = dict(robot['kernel_kwargs'], base_pos_size=1.0, balance=0.0, cost_model=None)
+            trades, _ = bar_kernel.process_bars(robot['bars'], **kwargs)
+            unit_trades.append(trades)
+            robot_times.append(parse_times(robot['bars'][:, bar_kernel.IDX_DATETIME]))
+
+        # Aligned indexes on merged timeline, computed once
+        timeline = merge_timeline(robot_times)
+        bar_to_timeline = [np.searchsorted(timeline, times) for times in robot_times]
+
+        # Events of all robots sorted by timeline index, exit before entry, then robot order
+        ev_time, ev_type, ev_robot, ev_trade = [], [], [], []
+        for r, trades in enumerate(unit_trades):
+            n = trades['trade_id'].shape[0]
+            exited = trades['exit_reason'] != bar_kernel.EXIT_ACTIVE
+            ev_time.append(bar_to_timeline[r][trades['entry_bar']])
+            ev_type.append(np.full(n, EVENT_ENTRY))
+            ev_robot.append(np.full(n, r))
+            ev_trade.append(np.arange(n))
+            ev_time.append(bar_to_timeline[r][trades['exit_bar'][exited]])
+            ev_type.append(np.full(int(np.sum(exited)), EVENT_EXIT))
+            ev_robot.append(np.full(int(np.sum(exited)), r))
+            ev_trade.append(np.flatnonzero(exited))
+        ev_time, ev_type, ev_robot, ev_trade = [np.concatenate(arrs) if len(arrs) > 0 else np.zeros(0, dtype=int)
+                                                for arrs in [ev_time, ev_type, ev_robot, ev_trade]]
+        order = np.lexsort((ev_trade, ev_robot, ev_type, ev_time))
+
+        # Shared state of open positions, one slot per robot
+        value_per_point = np.array([robot['kernel_kwargs'].get('value_per_point', 1.0) for robot in self.robots])
+        open_margin = np.zeros(robot_num)
+        pos_sizes = [np.zeros(trades['trade_id'].shape[0]) for trades in unit_trades]
+        realized = np.zeros(timeline.shape[0])
+        balance = self.balance
+        margin_used = 0.0
+
+        for e in order:
+            r = ev_robot[e]
+            k = ev_trade[e]
+            trades = unit_trades[r]
+            if ev_type[e] == EVENT_EXIT:
+                profit = self.__get_net_profit(self.robots[r], trades, k, pos_sizes[r][k])
+                balance = balance + profit
+                realized[ev_time[e]] = realized[ev_time[e]] + profit
+                margin_used = margin_used - open_margin[r]
+                open_margin[r] = 0.0
+            else:
+                pos_size = self.__get_pos_size(self.robots[r], trades, k, balance)
+                if self.margin_rate is not None:
+                    margin = abs(trades['entry_price'][k]) * pos_size * value_per_point[r] * self.margin_rate
+                    if margin_used + margin > balance:
+                        # Not enough free margin, skip this trade
+                        pos_size = 0.0
+                        margin = 0.0
+                    open_margin[r] = margin
+                    margin_used = margin_used + margin
+                pos_sizes[r][k] = pos_size
+
+        # Equity on timeline, vectorized per robot
+        unrealized = np.zeros(timeline.shape[0])
+        result_trades = {}
+        robot_equity = {}
+        for r, unit in enumerate(unit_trades):
+            trades = self.__get_sized_trades(self.robots[r], unit, pos_sizes[r])
+            p_close = self.robots[r]['bars'][:, bar_kernel.IDX_PRICE_CLOSE].astype(float)
+            robot_unrealized = np.zeros(p_close.shape[0])
+            exited = trades['exit_reason'] != bar_kernel.EXIT_ACTIVE
+            for k in range(0, trades['trade_id'].shape[0]):
+                entry_bar = trades['entry_bar'][k]
+                end_bar = trades['exit_bar'][k] if exited[k] else p_close.shape[0]
+                direction = 1.0 if trades['trade_type'][k] == state_machine.State.STATE_BUY else -1.0
+                robot_unrealized[entry_bar:end_bar] = direction * pos_sizes[r][k] * value_per_point[r] \
+                    * (p_close[entry_bar:end_bar] - trades['entry_price'][k])
+
+            aligned = align_index(robot_times[r], timeline)
+            has_bar = aligned >= 0
+            unrealized[has_bar] = unrealized[has_bar] + robot_unrealized[aligned[has_bar]]
+
+            robot_realized = np.zeros(p_close.shape[0])
+            np.add.at(robot_realized, trades['exit_bar'][exited], trades['net_profit'][exited])
+            robot_equity[self.robots[r]['name']] = self.balance + np.cumsum(robot_realized) + robot_unrealized
+            result_trades[self.robots[r]['name']] = trade_store.TradeStore.from_arrays(trades)
+
+        equity = self.balance + np.cumsum(realized) + unrealized
+        return {'timeline': timeline.astype('datetime64[ns]'), 'equity': equity, 'balance': balance
+                , 'trades': result_trades, 'robot_equity': robot_equity}
+
+    # =======================================================================================
+    # END: Public methods
+    # =======================================================================================
+
+    def __get_sized_trades(self, robot, trades, pos_sizes):
+        """
+        Returns trades of robot with position sizes, costs of cost model are applied if defined
+        """
+        value_per_point = robot['kernel_kwargs'].get('value_per_point', 1.0)
+        trades = dict(trades, pos_size=pos_sizes, net_profit=trades['profit_points'] * pos_sizes * value_per_point)
+        cost_model = robot['kernel_kwargs'].get('cost_model')
+        if cost_model is not None:
+            bars = robot['bars']
+            trades = bar_kernel.apply_costs(trades, cost_model, bars[:, bar_kernel.IDX_PRICE_HIGH].astype(float)
+                                            , bars[:, bar_kernel.IDX_PRICE_LOW].astype(float), value_per_point)
+        return trades
+
+    def __get_net_profit(self, robot, trades, k, pos_size):
+        """
+        Returns net profit of exited trade k with position size
+        """
+        one_trade = {col: trades[col][k:k + 1] for col in bar_kernel.TRADE_COLUMNS}
+        return float(self.__get_sized_trades(robot, one_trade, np.array([pos_size]))['net_profit'][0])
+
+    def __get_pos_size(self, robot, trades, k, balance):
+        qty_percent = trades['pos_size'][k]
+        sizing = robot['sizing']
+        if sizing is None or sizing.get('cal_pos_size_formula') is None:
+            return qty_percent * robot['kernel_kwargs'].get('base_pos_size', 1.0)
+
+        # Stop loss distance in pips of this trade, 0 if no stop loss
+        price_per_pip = robot['kernel_kwargs'].get('price_per_pip', 1.0)
+        sl_pips = abs(trades['entry_price'][k] - trades['stop_loss_price'][k]) / price_per_pip \
+            if np.isfinite(trades['stop_loss_price'][k]) else 0.0
+        return model_helper.cal_entry_pos_size(stop_loss=sl_pips
+                                               , balance=balance
+                                               , base_risk=sizing.get('base_risk', 0.0)
+                                               , fund_allocate_size=sizing.get('fund_allocate_size', 1.0)
+                                               , cal_pos_size_formula=sizing['cal_pos_size_formula']
+                                               , limit_pos_size=sizing.get('limit_pos_size', 1.0)
+                                               , cal_pos_size_formula2_size=sizing.get('cal_pos_size_formula2_size')
+                                               , qty_percent=qty_percent
+                                               , pos_size_decimal_num=sizing.get('pos_size_decimal_num', 2)
+                                               , point_value=sizing.get('point_value', 1))
@@ -0,0 +1,146 @@
+import weakref
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+import pandas as pd
+
+"""
+## Shared Dataset
+
+price dataset ที่โหลดครั้งเดียวแล้วใช้ร่วมกันระหว่าง trade model ทุกตัว และ process ที่ใช้ประมวลผล signal
+* column ที่เป็นตัวเลขจะถูกเก็บไว้ใน shared memory block เดียว (multiprocessing.shared_memory)
+column อื่นๆ เช่น DATETIME แบบ string จะเก็บเป็น numpy object array ที่ read-only
+* view() จะ return DataFrame ใหม่ที่ทุก column ชี้ไปที่ข้อมูลชุดเดียวกัน (ไม่ copy)
+โดยอาศัย copy-on-write ของ pandas หาก trade model แก้ไขค่าใน column ใด จะ copy เฉพาะ column นั้นเท่านั้น
+ส่วนการเพิ่ม column ใหม่จะไม่กระทบกับ dataset ต้นฉบับ
+* object นี้ pickle ได้โดยส่งแค่ชื่อ shared memory block ไม่ได้ส่งข้อมูลราคา
+process ที่ unpickle จะ attach กับ shared memory block เดิม
+
+NOTE: โมดูลนี้ไม่เปลี่ยน option ของ pandas copy-on-write เปิดอยู่เสมอใน pandas >= 3.0
+ส่วน pandas 2.x ต้องเปิดเองด้วย pd.set_option('mode.copy_on_write', True) ถ้าไม่ได้เปิด (รวมถึง pandas 1.x)
+view() จะ copy column ตัวเลขให้ทุกครั้ง (ไม่แชร์ memory) เพื่อให้ trade model แก้ไขค่าใน DataFrame ได้เหมือนเดิม
+"""
+
+
+def is_copy_on_write():
+    """
+    Returns True if pandas copy-on-write is enabled, views of dataset share memory only in this case
+    """
+    if int(pd.__version__.split('.')[0]) >= 3:
+        return True
+    try:
+        return pd.get_option('mode.copy_on_write') is True
+    except KeyError:
+        # Option does not exist in pandas 1.x (OptionError is a KeyError)
+        return False
+
+
+# Alignment of each column in shared memory block
+COLUMN_ALIGN = 64
+
+
+class SharedDataset():
+
+    def __init__(self, df):
+        """
+        Copy numeric columns of DataFrame into shared memory, the DataFrame index is not kept (RangeIndex)
+        """
+        self.columns = [str(col) for col in df.columns]
+        self.row_num = len(df)
+
+        # Layout of numeric columns in shared memory: column name -> (dtype, offset)
+        self.layout = {}
+        self.object_columns = {}
+        offset = 0
+        for col in df.columns:
+            arr = df[col].to_numpy()
+            if arr.dtype.kind in 'biuf':
+                self.layout[str(col)] = (arr.dtype.str, offset)
+                offset = offset + self.__aligned(arr.nbytes)
+            else:
+                arr = np.array(arr, dtype=object)
+                arr.flags.writeable = False
+                self.object_columns[str(col)] = arr
+
+        self.shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        self.owner = True
+        for col in df.columns:
+            if str(col) in self.layout:
+                self.__get_array(str(col), writeable=True)[:] = df[col].to_numpy()
+
+        # Release shared memory block when this object has been garbage collected
+        self.finalizer = weakref.finalize(self, SharedDataset.__release, self.shm, True)
+        self.base_df = None
+
+    # =======================================================================================
+    # BEGIN: Public methods
+    # =======================================================================================
+    def view(self):
+        """
+        Returns DataFrame sharing data with this dataset, modified columns are copied on write.
+        Without pandas copy-on-write, numeric columns are copied (writable private copy)
+        """
+        if self.base_df is None:
+            data = {}
+            for col in self.columns:
+                data[col] = self.object_columns[col] if col in self.object_columns else self.__get_array(col)
+            self.base_df = pd.DataFrame(data, columns=self.columns, copy=False)
+        return self.base_df.copy(deep=not is_copy_on_write())
+
+    def nbytes(self):
+        return self.shm.size
+
+    def close(self):
+        """
+        Detach from shared memory block, the block is removed if this object is the owner (creator)
+        """
+        self.base_df = None
+        self.finalizer()
+
+    # =======================================================================================
+    # END: Public methods
+    # =======================================================================================
+
+    def __get_array(self, col, writeable=False):
+        dtype, offset = self.layout[col]
+        arr = np.ndarray((self.row_num,), dtype=np.dtype(dtype), buffer=self.shm.buf, offset=offset)
+        arr.flags.writeable = writeable
+        return arr
+
+    def __aligned(self, nbytes):
+        return ((nbytes + COLUMN_ALIGN - 1) // COLUMN_ALIGN) * COLUMN_ALIGN
+
+    def __getstate__(self):
+        return {'columns': self.columns, 'row_num': self.row_num, 'layout': self.layout
+                , 'object_columns': self.object_columns, 'shm_name': self.shm.name}
+
+    def __setstate__(self, state):
+        self.columns = state['columns']
+        self.row_num = state['row_num']
+        self.layout = state['layout']
+        self.object_columns = state['object_columns']
+        for arr in self.object_columns.values():
+            arr.flags.writeable = False
+
+        self.shm = shared_memory.SharedMemory(name=state['shm_name'])
+        # Only owner process removes shared memory block, do not let resource tracker of this process remove it
+        try:
+            resource_tracker.unregister(self.shm._name, 'shared_memory')
+        except Exception:
+            pass
+        self.owner = False
+        self.finalizer = weakref.finalize(self, SharedDataset.__release, self.shm, False)
+        self.base_df = None
+
+    @staticmethod
+    def __release(shm, unlink):
+        try:
+            shm.close()
+        except BufferError:
+            # Some views are still alive, memory will be unmapped when they are garbage collected
+            pass
+        if unlink:
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
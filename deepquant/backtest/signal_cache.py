@@ -0,0 +1,149 @@
+import hashlib
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import yaml
+
+"""
+## Signal Cache
+
+แคชผลลัพธ์ signal (DataFrame จาก trade_model.predict(output_type=1)) ของ trading robot แต่ละตัว
+key ของแคชคือ hash ของเนื้อหาไฟล์ราคา, config ของ trading robot และ source code ของ trade model
+ดังนั้นการ touch ไฟล์หรือ checkout ใหม่โดยที่เนื้อหาไม่เปลี่ยน จะไม่ทำให้ต้อง predict ใหม่
+แต่การแก้ไข trade model หรือ parameter ใดๆ จะทำให้ได้ key ใหม่เสมอ
+
+* ไฟล์แคชจัดเก็บแบบ columnar binary (.npz) หนึ่ง array ต่อหนึ่ง column
+* การเขียนไฟล์จะเขียนลง temp file ใน directory เดียวกันแล้ว os.replace เพื่อให้ process อื่นที่อ่านพร้อมกัน
+ไม่เห็นไฟล์ที่เขียนไม่เสร็จ
+* ลบไฟล์แคชเก่าได้ด้วยขนาดรวม (max_bytes) หรืออายุของไฟล์ (max_age วินาที) โดยลบไฟล์ที่ถูกใช้งานล่าสุดนานที่สุดก่อน
+"""
+
+CACHE_FILE_EXT = '.npz'
+COLUMNS_KEY = '__columns__'
+
+
+def hash_file(file_path, chunk_size=1 << 20):
+    """
+    Returns sha256 hex digest of file content
+    """
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        chunk = f.read(chunk_size)
+        while chunk:
+            h.update(chunk)
+            chunk = f.read(chunk_size)
+    return h.hexdigest()
+
+
+def make_key(price_file_path, trade_model_file_path, *configs):
+    """
+    Returns cache key from content of price file, source code of trade model and configurations (parameters)
+    of trading robot. Configuration can be any YAML serializable objects such as dictionary of robot config entry.
+    """
+    h = hashlib.sha256()
+    h.update(hash_file(price_file_path).encode())
+    h.update(hash_file(trade_model_file_path).encode())
+    for config in configs:
+        h.update(yaml.safe_dump(config, sort_keys=True).encode())
+    return h.hexdigest()
+
+
+class SignalCache():
+
+    def __init__(self, cache_path, max_bytes=None, max_age=None):
+        """
+        param: cache_path, directory of cache files
+        param: max_bytes, maximum total size of cache files in bytes, None = unlimited
+        param: max_age, maximum age (seconds since last used) of cache files, None = unlimited
+        """
+        self.cache_path = cache_path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        os.makedirs(self.cache_path, exist_ok=True)
+
+    def get_file_path(self, name, key):
+        return os.path.join(self.cache_path, '{}_{}{}'.format(name, key[:32], CACHE_FILE_EXT))
+
+    def load(self, name, key):
+        """
+        Returns cached signal DataFrame, or None if not found
+        """
+        file_path = self.get_file_path(name, key)
+        try:
+            with np.load(file_path, allow_pickle=False) as data:
+                columns = list(data[COLUMNS_KEY])
+                sig_df = pd.DataFrame({col: self.__from_array(data[col]) for col in columns}, columns=columns)
+        except (FileNotFoundError, OSError, KeyError, ValueError):
+            return None
+
+        # Mark as recently used for eviction
+        try:
+            os.utime(file_path)
+        except OSError:
+            pass
+        return sig_df
+
+    def save(self, name, key, sig_df):
+        file_path = self.get_file_path(name, key)
+        arrays = {COLUMNS_KEY: np.array([str(col) for col in sig_df.columns])}
+        for col in sig_df.columns:
+            arrays[str(col)] = self.__to_array(sig_df[col])
+
+        # Write to temp file (not counted by evict) then rename, so that concurrent workers never see partial file
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=self.cache_path)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, file_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return file_path
+
+    def evict(self):
+        """
+        Remove cache files older than max_age, then remove least recently used files until total size <= max_bytes.
+        Returns list of removed file paths.
+        """
+        entries = []
+        for file_name in os.listdir(self.cache_path):
+            if not file_name.endswith(CACHE_FILE_EXT):
+                continue
+            file_path = os.path.join(self.cache_path, file_name)
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, file_path))
+        entries.sort()
+
+        removed = []
+        now = time.time()
+        total_bytes = sum(entry[1] for entry in entries)
+        for mtime, size, file_path in entries:
+            expired = self.max_age is not None and now - mtime > self.max_age
+            oversize = self.max_bytes is not None and total_bytes > self.max_bytes
+            if not (expired or oversize):
+                continue
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+            total_bytes = total_bytes - size
+            removed.append(file_path)
+        return removed
+
+    def __to_array(self, series):
+        arr = series.to_numpy()
+        if arr.dtype == object:
+            arr = arr.astype(str)
+        return arr
+
+    def __from_array(self, arr):
+        if arr.dtype.kind == 'U':
+            arr = arr.astype(object)
+        return arr
@@ -0,0 +1,132 @@
+import concurrent.futures
+import multiprocessing
+import signal
+import traceback
+
+from deepquant.common.error import TradeModelError
+
+"""
+## Signal Worker Pool
+
+process pool ขนาดจำกัดสำหรับประมวลผล signal ของ trading robot หลายตัวพร้อมกัน ใช้แทนการสร้าง 1 process ต่อ 1 robot
+* จำนวน worker สูงสุดกำหนดด้วย max_workers (None = จำนวน CPU) robot ที่เกินจะรอคิว
+* robot จะถูกจัดกลุ่มเป็น chunk ละ chunk_size ตัวต่อ 1 task เพื่อลด overhead ในการส่งงานให้ worker
+* timeout คือเวลาสูงสุด (วินาที) ที่ robot แต่ละตัวใช้ได้ เมื่อเกินเวลาจะเกิด TimeoutError ใน worker
+และถ้า worker ค้างจนไม่มี task ใดเสร็จเลยภายใน timeout ของทั้ง chunk (บวก GRACE_TIME) จะ terminate worker ทั้งหมด
+* worker ที่ error หรือตาย (เช่น ถูก kill, segfault) จะถูก raise เป็น TradeModelError ที่ process หลัก
+แทนการรอผลลัพธ์ไปเรื่อยๆ
+
+ฟังก์ชันที่รันใน worker ควร return ผลลัพธ์ขนาดเล็ก เช่น key หรือ path ของไฟล์ที่เขียนผลลัพธ์ไว้
+ไม่ควร return numpy array ขนาดใหญ่ เพราะผลลัพธ์จะถูก pickle ส่งกลับมาทาง pipe
+
+NOTE: worker ถูกสร้างด้วย fork จึงสืบทอด task function และ object ต่างๆ จาก process หลักโดยไม่ต้อง pickle
+"""
+
+# Extra seconds before stuck workers are terminated
+GRACE_TIME = 10.0
+
+# Context of running tasks, inherited by worker processes
+_task_context = None
+
+
+def _raise_timeout(signum, frame):
+    raise TimeoutError('Task timed out after {} seconds'.format(_task_context['timeout']))
+
+
+def _run_chunk(chunk):
+    """
+    Run tasks in chunk sequentially, returns list of (task_no, result)
+    """
+    func = _task_context['func']
+    timeout = _task_context['timeout']
+    results = []
+    for task_no, args in chunk:
+        if timeout is not None:
+            signal.signal(signal.SIGALRM, _raise_timeout)
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+        try:
+            results.append((task_no, func(*args)))
+        except BaseException as e:
+            # Returns error detail instead of raising, so that main process knows which task failed
+            return results, (task_no, '{}: {}\n{}'.format(type(e).__name__, e, traceback.format_exc()))
+        finally:
+            if timeout is not None:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+    return results, None
+
+
+def make_chunks(tasks, chunk_size):
+    """
+    Split list of task arguments into chunks of (task_no, args)
+    """
+    chunk_size = max(int(chunk_size or 1), 1)
+    numbered = list(enumerate(tasks))
+    return [numbered[i:i + chunk_size] for i in range(0, len(numbered), chunk_size)]
+
+
+def run_tasks(func, tasks, max_workers=None, chunk_size=1, timeout=None, names=None):
+    """
+    Run func(*args) for each args in tasks using bounded worker pool, returns list of results in task order.
+    param: func, task function, inherited by worker processes
+    param: tasks, list of argument tuples
+    param: max_workers, maximum number of worker processes, None = number of CPUs
+    param: chunk_size, number of tasks sent to worker at once
+    param: timeout, maximum seconds of each task, None = no timeout
+    param: names, list of task names used in error message
+    """
+    global _task_context
+    _task_context = {'func': func, 'timeout': timeout}
+
+    names = names or ['task {}'.format(i) for i in range(len(tasks))]
+    chunks = make_chunks(tasks, chunk_size)
+    results = [None] * len(tasks)
+    if len(chunks) == 0:
+        return results
+
+    max_workers = min(max_workers or multiprocessing.cpu_count(), len(chunks))
+    stuck_time = None if timeout is None else timeout * max(len(chunk) for chunk in chunks) + GRACE_TIME
+
+    ctx = multiprocessing.get_context('fork')
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx)
+    try:
+        pending = {executor.submit(_run_chunk, chunk): chunk for chunk in chunks}
+        while len(pending) > 0:
+            done, _ = concurrent.futures.wait(pending, timeout=stuck_time
+                                              , return_when=concurrent.futures.FIRST_COMPLETED)
+            if len(done) == 0:
+                running = [names[task_no] for chunk in pending.values() for task_no, _ in chunk]
+                raise TradeModelError('Worker is not responding, unfinished tasks: {}'.format(', '.join(running)))
+
+            for future in done:
+                chunk = pending.pop(future)
+                try:
+                    chunk_results, error = future.result()
+                except concurrent.futures.process.BrokenProcessPool as e:
+                    failed = [names[task_no] for task_no, _ in chunk]
+                    raise TradeModelError('Worker process died while running {}: {}'.format(', '.join(failed), e))
+                for task_no, result in chunk_results:
+                    results[task_no] = result
+                if error is not None:
+                    raise TradeModelError('Task {} error: {}'.format(names[error[0]], error[1]))
+    except BaseException:
+        _terminate(executor)
+        raise
+    else:
+        executor.shutdown(wait=True)
+    finally:
+        _task_context = None
+
+    return results
+
+
+def _terminate(executor):
+    """
+    Cancel queued tasks and kill running workers, so that stuck worker can not block main process
+    """
+    processes = list((executor._processes or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for p in processes:
+        if p.is_alive():
+            p.terminate()
+    for p in processes:
+        p.join(timeout=1.0)
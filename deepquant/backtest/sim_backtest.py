@@ -121,4 +121,4 @@ class IndividualBackTest:
                                                      pos_size, avg_cost, equity, profitloss_pip, stoploss_type,
                                                      stoploss_found, loss_point, loss_money)
 
-        return self.tradestate_ctx.get_tradestate_context().to_json(orient='records')
\ No newline at end of file
+        return self.tradestate_ctx.to_json()
\ No newline at end of file
@@ -0,0 +1,86 @@
+import unittest
+
+import numpy as np
+
+import deepquant.backtest.bar_kernel as bar_kernel
+
+
+def make_signal_bars(total_bar, seed=0, signal_prob=0.05):
+    """
+    Build random signal bars with same columns as trade_model.predict(output_type=1)
+    """
+    rng = np.random.default_rng(seed)
+    p_close = 1500.0 + np.cumsum(rng.normal(0.0, 1.0, total_bar))
+    p_open = np.append(p_close[0], p_close[:-1]) + rng.normal(0.0, 0.2, total_bar)
+    p_high = np.maximum(p_open, p_close) + rng.exponential(0.5, total_bar)
+    p_low = np.minimum(p_open, p_close) - rng.exponential(0.5, total_bar)
+
+    bars = np.empty((total_bar, 16), dtype=object)
+    bars[:, bar_kernel.IDX_DATETIME] = np.array(['bar{}'.format(i) for i in range(total_bar)], dtype=object)
+    bars[:, bar_kernel.IDX_PRICE_OPEN] = p_open
+    bars[:, bar_kernel.IDX_PRICE_HIGH] = p_high
+    bars[:, bar_kernel.IDX_PRICE_LOW] = p_low
+    bars[:, bar_kernel.IDX_PRICE_CLOSE] = p_close
+    bars[:, bar_kernel.IDX_PRICE_VOLUME] = rng.integers(1, 100, total_bar)
+    for idx in [bar_kernel.IDX_OPEN_BUY, bar_kernel.IDX_OPEN_SELL, bar_kernel.IDX_CLOSE_BUY, bar_kernel.IDX_CLOSE_SELL]:
+        bars[:, idx] = (rng.random(total_bar) < signal_prob).astype(int)
+    bars[:, bar_kernel.IDX_STOP_LOSS] = rng.choice([0.0, 5.0, 20.0], total_bar)
+    bars[:, bar_kernel.IDX_TAKE_PROFIT] = rng.choice([0.0, 5.0, 30.0], total_bar)
+    bars[:, bar_kernel.IDX_POS_SIZE] = rng.choice([0.5, 1.0], total_bar)
+    bars[:, bar_kernel.IDX_SCALE_TYPE] = 0
+    bars[:, bar_kernel.IDX_SCALE_SIZE] = 0.0
+    bars[:, bar_kernel.IDX_STOP_TYPE] = 0
+    return bars
+
+
+class TestBarKernel(unittest.TestCase):
+
+    def assert_same_result(self, bars, min_trade_num=1, **kwargs):
+        trades, equity = bar_kernel.process_bars(bars, **kwargs)
+        ref_trades, ref_equity = bar_kernel.process_bars_loop(bars, **kwargs)
+
+        self.assertGreaterEqual(len(ref_trades['trade_id']), min_trade_num)
+        for col in bar_kernel.TRADE_COLUMNS:
+            np.testing.assert_array_equal(trades[col], ref_trades[col], err_msg=col)
+        np.testing.assert_array_equal(equity, ref_equity)
+
+    def test_same_as_reference_loop_close_price(self):
+        for seed in range(0, 5):
+            bars = make_signal_bars(3000, seed=seed)
+            self.assert_same_result(bars, model_id=40, action_bar=1, balance=1000.0, base_pos_size=0.6
+                                    , price_per_pip=0.1, value_per_point=100.0)
+
+    def test_same_as_reference_loop_next_open_price(self):
+        for seed in range(0, 5):
+            bars = make_signal_bars(3000, seed=seed)
+            self.assert_same_result(bars, model_id=41, action_bar=2, balance=1000.0, base_pos_size=0.6
+                                    , price_per_pip=0.1, value_per_point=100.0, slippage=0.05)
+
+    def test_same_as_reference_loop_no_bars(self):
+        # e.g. date window or walk-forward fold without bars
+        bars = make_signal_bars(10)[:0]
+        for action_bar in [1, 2]:
+            self.assert_same_result(bars, min_trade_num=0, action_bar=action_bar, balance=1000.0)
+            trades, equity = bar_kernel.process_bars(bars, action_bar=action_bar, balance=1000.0)
+            self.assertEqual(len(trades['trade_id']), 0)
+            self.assertEqual(len(equity), 0)
+
+    def test_stop_loss_reached(self):
+        bars = make_signal_bars(5, signal_prob=0.0)
+        bars[:, bar_kernel.IDX_PRICE_OPEN] = [100.0, 100.0, 100.0, 99.0, 98.0]
+        bars[:, bar_kernel.IDX_PRICE_HIGH] = [101.0, 101.0, 100.5, 99.5, 98.5]
+        bars[:, bar_kernel.IDX_PRICE_LOW] = [99.0, 99.5, 98.5, 97.0, 97.5]
+        bars[:, bar_kernel.IDX_PRICE_CLOSE] = [100.0, 100.0, 99.0, 98.0, 98.0]
+        bars[0, bar_kernel.IDX_OPEN_BUY] = 1
+        bars[0, bar_kernel.IDX_STOP_LOSS] = 10.0
+        bars[0, bar_kernel.IDX_TAKE_PROFIT] = 0.0
+
+        trades, equity = bar_kernel.process_bars(bars, price_per_pip=0.1)
+        self.assertEqual(trades['exit_reason'][0], bar_kernel.EXIT_STOP_LOSS)
+        self.assertEqual(trades['exit_bar'][0], 2)
+        self.assertAlmostEqual(trades['exit_price'][0], 99.0)
+        self.assertAlmostEqual(equity[-1], -1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import numpy as np
+import pandas as pd
+import yaml
+
+import deepquant.backtest.backtest_engine as backtest_engine
+import deepquant.backtest.bar_kernel as bar_kernel
+import deepquant.backtest.checkpoint as checkpoint
+import deepquant.data.price_store as price_store
+from deepquant.backtest.test.test_bar_kernel import make_signal_bars
+
+# Trade model of engine test, 'hhv' signals depend on last 10 bars only, 'ema' stop loss depends on all bars
+TRADE_MODEL_SOURCE = '''
+import numpy as np
+import pandas as pd
+
+
+class TradeModel:
+
+    def __init__(self, symbol_name, robot_context, config, trade_model_id):
+        self.config = config
+        self.price_df = robot_context.datasets[config['model_names'][0]]
+
+    def predict(self, output_type=1):
+        df = self.price_df
+        close = df['CLOSE']
+        stop_loss = np.full(len(df), 20.0)
+        if self.config['indicator'] == 'ema':
+            stop_loss = stop_loss + (close - close.ewm(span=10, adjust=False).mean()).abs().to_numpy()
+        open_buy = (close == close.rolling(10).max()).astype(int)
+        close_buy = (close == close.rolling(10).min()).astype(int)
+        return pd.DataFrame({'DATETIME': df['DATETIME'], 'OPEN': df['OPEN'], 'HIGH': df['HIGH'], 'LOW': df['LOW']
+                             , 'CLOSE': close, 'VOLUME': df['VOLUME'], 'OPEN_BUY': open_buy, 'OPEN_SELL': 0
+                             , 'CLOSE_BUY': close_buy, 'CLOSE_SELL': 0, 'STOP_LOSS': stop_loss, 'TAKE_PROFIT': 0.0
+                             , 'POS_SIZE': 1.0, 'SCALE_TYPE': 0, 'SCALE_SIZE': 0.0, 'STOP_TYPE': 0})
+'''
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_path = tempfile.mkdtemp()
+        self.cur_path = os.getcwd()
+
+    def tearDown(self):
+        os.chdir(self.cur_path)
+        shutil.rmtree(self.tmp_path)
+
+    def make_engine_config(self, indicator, checkpoint_file=None):
+        os.makedirs(os.path.join(self.tmp_path, 'models'), exist_ok=True)
+        with open(os.path.join(self.tmp_path, 'models', 'breakout_model.py'), 'w') as f:
+            f.write(TRADE_MODEL_SOURCE)
+        robot_config = {'root_module_path': 'models'
+                        , 'symbols': [{'id': 1, 'name': 'XAUUSD', 'tick_size': 0.01, 'tick_value': 0.01}]
+                        , 'trading_robots': [{'name': 'breakout', 'symbol': 1, 'trade_model_module': 'breakout_model'
+                                              , 'trade_model_class': 'TradeModel', 'trade_model_id': 1
+                                              , 'model_names': ['breakout_m1'], 'indicator': indicator}]}
+        with open(os.path.join(self.tmp_path, 'robot_config.yaml'), 'w') as f:
+            yaml.safe_dump(robot_config, f)
+        return {'robot_config_root_path': self.tmp_path + '/', 'robot_config_file': 'robot_config.yaml'
+                , 'trade_model_root_path': self.tmp_path + '/', 'root_price_path': self.tmp_path
+                , 'price_files': ['XAUUSD_M1.csv'], 'balance': 1000.0, 'action_bar_price': 1, 'warmup_bars': 50
+                , 'signal_max_workers': 1, 'checkpoint_file': checkpoint_file}
+
+    def write_price_file(self, total_bar):
+        rng = np.random.default_rng(0)
+        close = np.round(1500.0 + np.cumsum(rng.normal(0.0, 1.0, 800)), 2)
+        dt = pd.date_range('2020-01-01', periods=800, freq='min')
+        df = pd.DataFrame({'DATETIME': dt.strftime('%Y-%m-%d %H:%M'), 'OPEN': close, 'HIGH': close + 0.5
+                           , 'LOW': close - 0.5, 'CLOSE': close, 'VOLUME': 10})
+        csv_path = os.path.join(self.tmp_path, 'XAUUSD_M1.csv')
+        df.iloc[:total_bar].to_csv(csv_path, index=False)
+        future = time.time() + total_bar
+        os.utime(csv_path, (future, future))
+
+    def test_engine_resume_same_as_full_run(self):
+        os.chdir(self.tmp_path)
+        checkpoint_file = os.path.join(self.tmp_path, 'backtest.ckpt')
+        for indicator, resumed in [('hhv', True), ('ema', False)]:
+            if os.path.exists(checkpoint_file):
+                os.remove(checkpoint_file)
+            config = self.make_engine_config(indicator, checkpoint_file=checkpoint_file)
+            self.write_price_file(600)
+            backtest_engine.BacktestEngine(config).backtest(mode=2)
+            self.assertTrue(os.path.exists(checkpoint_file))
+
+            # Next run on price file with new bars appended
+            self.write_price_file(800)
+            engine = backtest_engine.BacktestEngine(config)
+            with self.assertLogs(backtest_engine.logger, 'INFO') as logs:
+                engine.backtest(mode=2)
+            log_text = '\n'.join(logs.output)
+            self.assertEqual('Signal processing of new bars finished' in log_text, resumed, msg=indicator)
+            self.assertEqual('differ from checkpoint' in log_text, not resumed, msg=indicator)
+
+            full_engine = backtest_engine.BacktestEngine(self.make_engine_config(indicator))
+            full_engine.reset()
+            full_engine.backtest(mode=2)
+            self.assertGreater(len(full_engine.trades['breakout']), 0)
+            pd.testing.assert_frame_equal(engine.trades['breakout'], full_engine.trades['breakout'])
+            np.testing.assert_array_equal(engine.equity_curves['breakout'], full_engine.equity_curves['breakout'])
+
+    def test_resume_same_as_full_run(self):
+        for seed in range(0, 5):
+            bars = make_signal_bars(1000, seed=seed, signal_prob=0.08)
+            for action_bar in [1, 2]:
+                kwargs = {'action_bar': action_bar, 'balance': 1000.0, 'price_per_pip': 0.1, 'value_per_point': 10.0}
+                trades, equity = bar_kernel.process_bars(bars, **kwargs)
+                for prev_total_bar in [1, 333, 999, 1000]:
+                    prev_trades, _ = bar_kernel.process_bars(bars[:prev_total_bar], **kwargs)
+                    resumed, resumed_equity = bar_kernel.resume_bars(bars, prev_trades, prev_total_bar, **kwargs)
+                    for col in bar_kernel.TRADE_COLUMNS:
+                        np.testing.assert_array_equal(resumed[col], trades[col], err_msg=col)
+                    np.testing.assert_array_equal(resumed_equity, equity)
+
+    def test_save_and_load(self):
+        file_path = os.path.join(self.tmp_path, 'backtest.ckpt')
+        bars = make_signal_bars(100)
+        trades, equity = bar_kernel.process_bars(bars)
+        checkpoint.save_checkpoint(file_path, 'key1', [(100, 1, 2)]
+                                   , {'robot': {'bars': bars, 'trades': trades, 'equity': equity}})
+
+        self.assertIsNone(checkpoint.load_checkpoint(file_path, 'key2'))
+        loaded = checkpoint.load_checkpoint(file_path, 'key1')
+        np.testing.assert_array_equal(loaded['robots']['robot']['equity'], equity)
+        self.assertEqual(loaded['price_marks'], [(100, 1, 2)])
+
+    def test_is_appended(self):
+        csv_path = os.path.join(self.tmp_path, 'XAUUSD_M1.csv')
+        dt = pd.date_range('2020-01-01', periods=300, freq='min')
+        df = pd.DataFrame({'DATETIME': dt.strftime('%Y-%m-%d %H:%M:%S'), 'CLOSE': np.arange(300.0)})
+        df.iloc[:200].to_csv(csv_path, index=False)
+        price_mark = checkpoint.get_price_mark(price_store.open_store(csv_path))
+
+        df.to_csv(csv_path, index=False)
+        store = price_store.open_store(csv_path)
+        self.assertTrue(checkpoint.is_appended(store, price_mark))
+        pd.testing.assert_frame_equal(store.load_rows(190).reset_index(drop=True)
+                                      , price_store.load_price(csv_path).iloc[190:].reset_index(drop=True))
+
+        df.iloc[1:].to_csv(csv_path, index=False)
+        self.assertFalse(checkpoint.is_appended(price_store.open_store(csv_path), price_mark))
+
+
+if __name__ == '__main__':
+    unittest.main()
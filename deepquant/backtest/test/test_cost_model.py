@@ -0,0 +1,50 @@
+import unittest
+
+import numpy as np
+
+import deepquant.backtest.bar_kernel as bar_kernel
+import deepquant.market_set.cost_model as cost_model
+from deepquant.backtest.test.test_bar_kernel import make_signal_bars
+from deepquant.market_set.commission_tfex_s50 import CommissionTable_TFEX_S50
+
+
+class TestCostModel(unittest.TestCase):
+
+    def test_tiered_commission(self):
+        comm_table = CommissionTable_TFEX_S50()
+        pos_sizes = np.array([0.0, 1.0, 25.0, 25.5, 26.0, 100.0, 101.0, 500.0, 501.0, 1e9])
+        expected = np.array([0.0, 85.0, 85.0, 0.0, 65.0, 65.0, 46.0, 46.0, 36.0, 0.0])
+        np.testing.assert_array_equal(comm_table.get_comm_rate(pos_sizes), expected)
+
+        # Live per-order call returns same rate as array call
+        for pos_size, rate in zip(pos_sizes, expected):
+            self.assertEqual(comm_table.get_comm_rate(pos_size), rate)
+        self.assertEqual(comm_table.cal_commission(30.0), 30.0 * 65)
+
+    def test_price_cost(self):
+        model = cost_model.CostModel(spread=0.2, slippage=cost_model.SlippageModel(fixed=0.1, size_factor=0.01
+                                                                                  , volatility_factor=0.5))
+        np.testing.assert_allclose(model.get_price_cost(np.array([1.0, 10.0]), np.array([0.0, 2.0]))
+                                   , [0.1 + 0.1 + 0.01, 0.1 + 0.1 + 0.1 + 1.0])
+
+    def test_kernel_costs(self):
+        bars = make_signal_bars(3000, seed=5)
+        model = cost_model.CostModel(commission=cost_model.TieredCommission([[0.1, 10, 2.0]]), spread=0.5
+                                     , slippage=cost_model.SlippageModel(fixed=0.1, volatility_factor=0.1))
+        kwargs = {'balance': 1000.0, 'price_per_pip': 0.1, 'value_per_point': 10.0}
+
+        trades, _ = bar_kernel.process_bars(bars, **kwargs)
+        cost_trades, equity = bar_kernel.process_bars(bars, cost_model=model, **kwargs)
+        ref_trades, ref_equity = bar_kernel.process_bars_loop(bars, cost_model=model, **kwargs)
+        for col in bar_kernel.TRADE_COLUMNS:
+            np.testing.assert_array_equal(cost_trades[col], ref_trades[col], err_msg=col)
+        np.testing.assert_array_equal(equity, ref_equity)
+
+        # Every exited trade pays spread, slippage and commission on both entry and exit
+        exited = trades['exit_reason'] != bar_kernel.EXIT_ACTIVE
+        self.assertTrue(np.all(cost_trades['net_profit'][exited] < trades['net_profit'][exited]))
+        np.testing.assert_allclose(cost_trades['commission'][exited], 2 * 2.0 * trades['pos_size'][exited])
+
+
+if __name__ == '__main__':
+    unittest.main()
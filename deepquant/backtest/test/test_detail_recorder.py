@@ -0,0 +1,56 @@
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import deepquant.backtest.bar_kernel as bar_kernel
+import deepquant.backtest.detail_recorder as detail_recorder
+from deepquant.backtest.test.test_bar_kernel import make_signal_bars
+
+
+class TestDetailRecorder(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_path)
+
+    def test_unrealized_profit_same_as_equity(self):
+        bars = make_signal_bars(3000, seed=3)
+        # Last trade is still open at end of data: no signal and no stop loss / take profit after bar 2980
+        for idx in [bar_kernel.IDX_OPEN_BUY, bar_kernel.IDX_OPEN_SELL, bar_kernel.IDX_CLOSE_BUY
+                    , bar_kernel.IDX_CLOSE_SELL, bar_kernel.IDX_STOP_LOSS, bar_kernel.IDX_TAKE_PROFIT]:
+            bars[-50:, idx] = 0
+        bars[2980, bar_kernel.IDX_OPEN_BUY] = 1
+        trades, equity = bar_kernel.process_bars(bars, balance=1000.0, price_per_pip=0.1, value_per_point=100.0)
+        p_close = bars[:, bar_kernel.IDX_PRICE_CLOSE].astype(float)
+
+        # Small chunk size so that trades are split across flushes
+        recorder = detail_recorder.DetailRecorder(self.tmp_path + '/detail', chunk_size=100)
+        recorder.record_trades(trades, p_close, 100.0)
+        recorder.close()
+        detail_df = detail_recorder.load_detail(self.tmp_path + '/detail')
+
+        exited = trades['exit_reason'] != bar_kernel.EXIT_ACTIVE
+        self.assertEqual(int(np.sum(~exited)), 1)
+        self.assertEqual(int(detail_df['exited'].sum()), int(np.sum(exited)))
+
+        # Rows of each trade are from entry bar to exit bar, or to last bar if trade is still open
+        for k, trade_id in enumerate(trades['trade_id']):
+            trade_df = detail_df[detail_df['trade_id'] == trade_id]
+            end_bar = trades['exit_bar'][k] if exited[k] else 2999
+            np.testing.assert_array_equal(trade_df['bar'], np.arange(trades['entry_bar'][k], end_bar + 1))
+            self.assertEqual(trade_df['exited'].iloc[-1], int(exited[k]))
+
+        # Equity = balance + realized profit + unrealized profit of every bar
+        realized = np.zeros(3000)
+        np.add.at(realized, trades['exit_bar'][exited], trades['net_profit'][exited])
+        unrealized = np.zeros(3000)
+        np.add.at(unrealized, detail_df['bar'].to_numpy(), detail_df['unrealized_profit'].to_numpy())
+        np.testing.assert_allclose(1000.0 + np.cumsum(realized) + unrealized, equity)
+
+
+if __name__ == '__main__':
+    unittest.main()
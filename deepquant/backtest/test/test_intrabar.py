@@ -0,0 +1,89 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import deepquant.backtest.bar_kernel as bar_kernel
+import deepquant.backtest.intrabar as intrabar
+from deepquant.backtest.test.test_bar_kernel import make_signal_bars
+
+
+def make_child_bars(total_child, seed=0):
+    rng = np.random.default_rng(seed)
+    p_close = 1500.0 + np.cumsum(rng.normal(0.0, 0.5, total_child))
+    p_open = np.append(p_close[0], p_close[:-1])
+    p_high = np.maximum(p_open, p_close) + rng.exponential(0.2, total_child)
+    p_low = np.minimum(p_open, p_close) - rng.exponential(0.2, total_child)
+    dates = pd.date_range('2020-01-01', periods=total_child, freq='min')
+    return pd.DataFrame({'DATETIME': dates.strftime('%Y-%m-%d %H:%M:%S'), 'OPEN': p_open, 'HIGH': p_high
+                         , 'LOW': p_low, 'CLOSE': p_close})
+
+
+def make_parent_bars(child_df, child_num, seed=0):
+    """
+    Aggregate child bars into parent bars (every child_num bars) with random signals
+    """
+    total_bar = len(child_df) // child_num
+    bars = make_signal_bars(total_bar, seed=seed, signal_prob=0.1)
+    group = child_df.iloc[:total_bar * child_num].groupby(np.arange(total_bar * child_num) // child_num)
+    bars[:, bar_kernel.IDX_DATETIME] = group['DATETIME'].first().to_numpy(dtype=object)
+    bars[:, bar_kernel.IDX_PRICE_OPEN] = group['OPEN'].first().to_numpy()
+    bars[:, bar_kernel.IDX_PRICE_HIGH] = group['HIGH'].max().to_numpy()
+    bars[:, bar_kernel.IDX_PRICE_LOW] = group['LOW'].min().to_numpy()
+    bars[:, bar_kernel.IDX_PRICE_CLOSE] = group['CLOSE'].last().to_numpy()
+    return bars
+
+
+class TestIntrabar(unittest.TestCase):
+
+    def test_take_profit_reached_first(self):
+        child_df = pd.DataFrame({'DATETIME': ['2020-01-01 00:0{}:00'.format(i) for i in range(0, 6)]
+                                 , 'OPEN': [100.0, 100.0, 100.0, 101.0, 102.0, 101.0]
+                                 , 'HIGH': [100.0, 100.0, 101.0, 102.5, 102.0, 101.0]
+                                 , 'LOW': [100.0, 100.0, 100.0, 101.0, 100.0, 98.5]
+                                 , 'CLOSE': [100.0, 100.0, 101.0, 102.0, 101.0, 99.0]})
+        bars = make_parent_bars(child_df, 3)
+        bars[:, bar_kernel.IDX_OPEN_BUY:bar_kernel.IDX_CLOSE_SELL + 1] = 0
+        bars[0, bar_kernel.IDX_OPEN_BUY] = 1
+        bars[0, bar_kernel.IDX_STOP_LOSS] = 10.0
+        bars[0, bar_kernel.IDX_TAKE_PROFIT] = 10.0
+
+        # Coarse backtest assumes SL first
+        trades, _ = bar_kernel.process_bars(bars, price_per_pip=0.1)
+        self.assertEqual(trades['exit_reason'][0], bar_kernel.EXIT_STOP_LOSS)
+
+        data = intrabar.IntrabarData.from_frame(bars[:, bar_kernel.IDX_DATETIME], child_df)
+        self.assertEqual(data.get_slice(bars[1, bar_kernel.IDX_DATETIME]), (3, 6))
+        trades, _ = bar_kernel.process_bars(bars, price_per_pip=0.1, intrabar=data)
+        self.assertEqual(trades['exit_reason'][0], bar_kernel.EXIT_TAKE_PROFIT)
+        self.assertAlmostEqual(trades['exit_price'][0], 102.0)
+        self.assertEqual(data.resolve_num, 1)
+
+    def test_child_data_after_last_parent_bar(self):
+        # Child data continues after last parent bar, e.g. M1 file is newer than signal bars
+        child_df = make_child_bars(12)
+        bars = make_parent_bars(child_df.iloc[:6], 3)
+        data = intrabar.IntrabarData.from_frame(bars[:, bar_kernel.IDX_DATETIME], child_df)
+        self.assertEqual(data.get_slice(bars[0, bar_kernel.IDX_DATETIME]), (0, 3))
+        self.assertEqual(data.get_slice(bars[1, bar_kernel.IDX_DATETIME]), (3, 6))
+
+        # Interval of single parent bar is unknown, all child bars from parent bar are used
+        data = intrabar.IntrabarData.from_frame(bars[1:, bar_kernel.IDX_DATETIME], child_df)
+        self.assertEqual(data.get_slice(bars[1, bar_kernel.IDX_DATETIME]), (3, 12))
+
+    def test_same_as_reference_loop(self):
+        child_df = make_child_bars(30000, seed=9)
+        bars = make_parent_bars(child_df, 5, seed=9)
+        kwargs = {'balance': 1000.0, 'price_per_pip': 0.1, 'value_per_point': 100.0}
+
+        data = intrabar.IntrabarData.from_frame(bars[:, bar_kernel.IDX_DATETIME], child_df)
+        trades, equity = bar_kernel.process_bars(bars, intrabar=data, **kwargs)
+        self.assertGreater(data.resolve_num, 0)
+        ref_trades, ref_equity = bar_kernel.process_bars_loop(bars, intrabar=data, **kwargs)
+        for col in bar_kernel.TRADE_COLUMNS:
+            np.testing.assert_array_equal(trades[col], ref_trades[col], err_msg=col)
+        np.testing.assert_array_equal(equity, ref_equity)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+
+import numpy as np
+
+import deepquant.backtest.monte_carlo as monte_carlo
+
+
+class TestMonteCarlo(unittest.TestCase):
+
+    def test_path_metrics(self):
+        paths = np.array([[10.0, -30.0, 5.0], [-10.0, -10.0, 40.0]])
+        metrics = monte_carlo.path_metrics(paths, 100.0)
+        np.testing.assert_allclose(metrics['net_profit'], [-15.0, 20.0])
+        np.testing.assert_allclose(metrics['max_drawdown'], [30.0, 20.0])
+        np.testing.assert_allclose(metrics['max_drawdown_pct'], [30.0 / 110.0 * 100.0, 20.0])
+
+    def test_shuffle_keeps_trades(self):
+        profits = np.random.default_rng(1).normal(10.0, 100.0, 500)
+        paths, skipped = monte_carlo.simulate_paths(profits, 50, np.random.default_rng(2))
+        self.assertFalse(skipped.any())
+        np.testing.assert_allclose(np.sort(paths, axis=1), np.broadcast_to(np.sort(profits), paths.shape))
+
+        paths, skipped = monte_carlo.simulate_paths(profits, 50, np.random.default_rng(2), skip_prob=0.5)
+        self.assertTrue(np.all(paths[skipped] == 0.0))
+
+    def test_same_result_in_parallel(self):
+        profits = np.random.default_rng(3).normal(5.0, 100.0, 5000)
+        kwargs = {'sim_num': 10000, 'method': monte_carlo.METHOD_BOOTSTRAP, 'skip_prob': 0.05, 'slippage_cost': 2.0
+                  , 'seed': 7}
+        results = monte_carlo.MonteCarlo(profits, 10000.0, processes=2, **kwargs).run()
+        self.assertEqual(len(results), 10000)
+
+        ref_results = monte_carlo.MonteCarlo(profits, 10000.0, processes=1, **kwargs).run()
+        np.testing.assert_array_equal(results.to_numpy(), ref_results.to_numpy())
+
+        table = monte_carlo.percentile_table(results)
+        self.assertEqual(list(table.columns), monte_carlo.PATH_METRICS)
+        self.assertTrue(table['max_drawdown'].is_monotonic_increasing)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+
+import deepquant.backtest.optimizer as optimizer
+from deepquant.backtest.test.test_bar_kernel import make_signal_bars
+
+
+class TestOptimizer(unittest.TestCase):
+
+    def setUp(self):
+        self.bars = make_signal_bars(2000, seed=1)
+        self.kernel_kwargs = {'balance': 1000.0, 'price_per_pip': 0.1, 'value_per_point': 100.0}
+        self.signal_calls = []
+
+    def signal_func(self, signal_params):
+        self.signal_calls.append(signal_params)
+        return self.bars
+
+    def test_parse_param_space(self):
+        space = optimizer.parse_param_space({'limit_pos_size': {'start': 0.1, 'stop': 0.3, 'step': 0.1}
+                                                , 'stop_loss': [10, 20], 'ma_period': {'start': 5, 'stop': 15, 'step': 5}})
+        self.assertEqual(space['limit_pos_size'], [0.1, 0.2, 0.3])
+        self.assertEqual(space['stop_loss'], [10, 20])
+        self.assertEqual(space['ma_period'], [5, 10, 15])
+        self.assertEqual(len(optimizer.grid_trials(space)), 18)
+
+    def test_grid_search_parallel_same_as_sequential(self):
+        space = {'limit_pos_size': [0.1, 0.5], 'stop_loss': [0, 10, 50], 'take_profit': [0, 30]}
+        seq_df = optimizer.Optimizer(self.signal_func, self.kernel_kwargs, space, processes=1).grid_search()
+        # Kernel parameters reuse signal bars
+        self.assertEqual(self.signal_calls, [{}])
+        par_df = optimizer.Optimizer(self.signal_func, self.kernel_kwargs, space, processes=2).grid_search()
+
+        self.assertEqual(len(seq_df), 12)
+        self.assertEqual(list(seq_df['trial']), list(par_df['trial']))
+        self.assertEqual(list(seq_df['net_profit']), list(par_df['net_profit']))
+        self.assertTrue(seq_df['net_profit'].is_monotonic_decreasing)
+
+    def test_successive_halving(self):
+        space = {'limit_pos_size': [0.1, 0.5, 1.0], 'stop_loss': [0, 10, 50], 'take_profit': [0, 10, 30]}
+        budgets = []
+        opt = optimizer.Optimizer(self.signal_func, self.kernel_kwargs, space, processes=1
+                                  , on_result=lambda result: budgets.append(result['budget']))
+        result_df = opt.successive_halving(eta=3)
+
+        # 27 trials -> 9 -> 3 -> 1, last round uses all bars
+        self.assertEqual(len(budgets), 27 + 9 + 3 + 1)
+        self.assertEqual(len(result_df), 1)
+        self.assertEqual(result_df['budget'][0], self.bars.shape[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import deepquant.backtest.bar_kernel as bar_kernel
+import deepquant.backtest.portfolio as portfolio
+from deepquant.backtest.test.test_bar_kernel import make_signal_bars
+
+
+def set_dates(bars, start, freq):
+    bars[:, bar_kernel.IDX_DATETIME] = pd.date_range(start, periods=bars.shape[0], freq=freq) \
+        .strftime('%Y-%m-%d %H:%M:%S').to_numpy(dtype=object)
+    return bars
+
+
+class TestPortfolio(unittest.TestCase):
+
+    def setUp(self):
+        self.kernel_kwargs = {'price_per_pip': 0.1, 'value_per_point': 100.0, 'base_pos_size': 0.5}
+
+    def test_single_robot_same_as_kernel(self):
+        bars = set_dates(make_signal_bars(2000, seed=5), '2020-01-01', '5min')
+        engine = portfolio.PortfolioEngine(1000.0)
+        engine.add_robot('robot1', bars, self.kernel_kwargs)
+        result = engine.run()
+
+        trades, equity = bar_kernel.process_bars(bars, balance=1000.0, **self.kernel_kwargs)
+        np.testing.assert_allclose(result['equity'], equity)
+        np.testing.assert_allclose(result['trades']['robot1'].get_column('net_profit'), trades['net_profit'])
+        np.testing.assert_allclose(result['robot_equity']['robot1'], equity)
+
+    def test_shared_balance_sizing(self):
+        bars_m5 = set_dates(make_signal_bars(3000, seed=6), '2020-01-01', '5min')
+        bars_m15 = set_dates(make_signal_bars(1000, seed=7), '2020-01-01', '15min')
+        sizing = {'cal_pos_size_formula': 2, 'cal_pos_size_formula2_size': 0.1, 'fund_allocate_size': 0.5
+                  , 'base_risk': 0.02, 'limit_pos_size': 1.0}
+        engine = portfolio.PortfolioEngine(10000.0)
+        engine.add_robot('m5', bars_m5, self.kernel_kwargs, sizing=sizing)
+        engine.add_robot('m15', bars_m15, self.kernel_kwargs, sizing=sizing)
+        result = engine.run()
+
+        self.assertEqual(result['timeline'].shape[0], 3000)
+        total_profit = sum(float(np.sum(store.get_column('net_profit'))) for store in result['trades'].values())
+        self.assertAlmostEqual(result['equity'][-1], 10000.0 + total_profit)
+
+        # Equity of each robot is on its own bars and built from its portfolio sized trades
+        for name, bars in [('m5', bars_m5), ('m15', bars_m15)]:
+            store = result['trades'][name]
+            robot_equity = result['robot_equity'][name]
+            self.assertEqual(robot_equity.shape[0], bars.shape[0])
+            exited = store.get_column('exit_reason') != bar_kernel.EXIT_ACTIVE
+            realized = np.zeros(bars.shape[0])
+            np.add.at(realized, store.get_column('exit_bar')[exited], store.get_column('net_profit')[exited])
+            flat = np.ones(bars.shape[0], dtype=bool)
+            for entry_bar, exit_bar, is_exited in zip(store.get_column('entry_bar'), store.get_column('exit_bar')
+                                                      , exited):
+                flat[entry_bar:exit_bar if is_exited else bars.shape[0]] = False
+            np.testing.assert_allclose(robot_equity[flat], 10000.0 + np.cumsum(realized)[flat])
+
+        # First trade is sized from initial balance
+        first_size = result['trades']['m5'].get_column('pos_size')[0]
+        qty_percent = bar_kernel.process_bars(bars_m5, **dict(self.kernel_kwargs, base_pos_size=1.0))[0]['pos_size'][0]
+        self.assertAlmostEqual(first_size, round(0.1 * 5000.0 / 1000 * qty_percent, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import multiprocessing
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from deepquant.backtest.shared_dataset import SharedDataset, is_copy_on_write
+
+
+def _sum_close(dataset, queue):
+    queue.put(float(dataset.view()['CLOSE'].sum()))
+
+
+class TestSharedDataset(unittest.TestCase):
+
+    def setUp(self):
+        self.df = pd.DataFrame({'DATETIME': ['2020.01.01 00:00', '2020.01.01 00:05', '2020.01.01 00:10']
+                                , 'OPEN': [1.0, 2.0, 3.0], 'CLOSE': [1.5, 2.5, 3.5], 'VOLUME': [10, 20, 30]})
+        self.dataset = SharedDataset(self.df)
+
+    def tearDown(self):
+        self.dataset.close()
+
+    def test_views_share_data(self):
+        view1 = self.dataset.view()
+        view2 = self.dataset.view()
+        pd.testing.assert_frame_equal(view1, self.df)
+        self.assertEqual(np.shares_memory(view1['CLOSE'].to_numpy(), view2['CLOSE'].to_numpy()), is_copy_on_write())
+
+    def test_copy_on_write_only_modified_column(self):
+        view1 = self.dataset.view()
+        view1.loc[0, 'CLOSE'] = 100.0
+        view1['MA'] = view1['OPEN'] * 2
+
+        view2 = self.dataset.view()
+        self.assertEqual(view2['CLOSE'][0], 1.5)
+        self.assertNotIn('MA', view2.columns)
+        self.assertEqual(np.shares_memory(view1['OPEN'].to_numpy(), view2['OPEN'].to_numpy()), is_copy_on_write())
+        self.assertFalse(np.shares_memory(view1['CLOSE'].to_numpy(), view2['CLOSE'].to_numpy()))
+
+    def test_attach_in_spawned_process(self):
+        ctx = multiprocessing.get_context('spawn')
+        queue = ctx.SimpleQueue()
+        process = ctx.Process(target=_sum_close, args=(self.dataset, queue))
+        process.start()
+        result = queue.get()
+        process.join()
+        self.assertEqual(result, 7.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import os
+import tempfile
+import time
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import deepquant.backtest.signal_cache as signal_cache
+
+
+class TestSignalCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root_path = self.tmp_dir.name
+        self.price_file = os.path.join(self.root_path, 'XAUUSD_M5.csv')
+        self.model_file = os.path.join(self.root_path, 'trade_model.py')
+        with open(self.price_file, 'w') as f:
+            f.write('DATETIME,OPEN,HIGH,LOW,CLOSE,VOLUME\n2020-01-01 00:00,1.0,2.0,0.5,1.5,10\n')
+        with open(self.model_file, 'w') as f:
+            f.write('class TradeModel:\n    pass\n')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_key_depends_on_content_only(self):
+        robot_config = {'name': 'barracuda_gold_4', 'limit_pos_size': 0.6}
+        key = signal_cache.make_key(self.price_file, self.model_file, robot_config)
+
+        # Touching file must not change key
+        os.utime(self.price_file, (time.time() + 10, time.time() + 10))
+        self.assertEqual(key, signal_cache.make_key(self.price_file, self.model_file, robot_config))
+
+        with open(self.model_file, 'a') as f:
+            f.write('# changed\n')
+        self.assertNotEqual(key, signal_cache.make_key(self.price_file, self.model_file, robot_config))
+        self.assertNotEqual(key, signal_cache.make_key(self.price_file, self.model_file
+                                                       , {'name': 'barracuda_gold_4', 'limit_pos_size': 0.3}))
+
+    def test_save_and_load(self):
+        cache = signal_cache.SignalCache(os.path.join(self.root_path, 'signal_results'))
+        sig_df = pd.DataFrame({'DATETIME': ['2020-01-01 00:00', '2020-01-01 00:05']
+                               , 'CLOSE': [1.5, 1.6], 'OPEN_BUY': [1, 0]})
+        self.assertIsNone(cache.load('barracuda_gold_4', 'abc'))
+
+        cache.save('barracuda_gold_4', 'abc', sig_df)
+        loaded_df = cache.load('barracuda_gold_4', 'abc')
+        self.assertEqual(list(loaded_df.columns), list(sig_df.columns))
+        np.testing.assert_array_equal(loaded_df.to_numpy(), sig_df.to_numpy())
+
+    def test_evict_by_size(self):
+        cache = signal_cache.SignalCache(os.path.join(self.root_path, 'signal_results'))
+        sig_df = pd.DataFrame({'CLOSE': np.arange(1000, dtype=float)})
+        old_file = cache.save('robot', 'old', sig_df)
+        new_file = cache.save('robot', 'new', sig_df)
+        os.utime(old_file, (time.time() - 100, time.time() - 100))
+
+        cache.max_bytes = os.path.getsize(new_file)
+        self.assertEqual(cache.evict(), [old_file])
+        self.assertTrue(os.path.exists(new_file))
+
+    def test_evict_skips_temp_file(self):
+        cache = signal_cache.SignalCache(os.path.join(self.root_path, 'signal_results'), max_bytes=0)
+        # Temp file of another writer which is not renamed yet
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=cache.cache_path)
+        os.close(fd)
+        cache_file = cache.save('robot', 'abc', pd.DataFrame({'CLOSE': [1.5, 1.6]}))
+        self.assertEqual([f for f in os.listdir(cache.cache_path) if f.endswith('.tmp')]
+                         , [os.path.basename(tmp_path)])
+
+        self.assertEqual(cache.evict(), [cache_file])
+        self.assertTrue(os.path.exists(tmp_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
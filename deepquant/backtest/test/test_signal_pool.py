@@ -0,0 +1,58 @@
+import os
+import time
+import unittest
+
+import deepquant.backtest.signal_pool as signal_pool
+from deepquant.common.error import TradeModelError
+
+
+def square(x):
+    return x * x
+
+
+def fail_on_three(x):
+    if x == 3:
+        raise ValueError('bad value')
+    return x
+
+
+def kill_on_two(x):
+    if x == 2:
+        os._exit(1)
+    return x
+
+
+def sleep_on_one(x):
+    if x == 1:
+        time.sleep(5)
+    return x
+
+
+class TestSignalPool(unittest.TestCase):
+
+    def test_results_in_task_order(self):
+        tasks = [(i,) for i in range(0, 10)]
+        results = signal_pool.run_tasks(square, tasks, max_workers=3, chunk_size=2)
+        self.assertEqual(results, [i * i for i in range(0, 10)])
+
+    def test_task_error_raised(self):
+        tasks = [(i,) for i in range(0, 5)]
+        with self.assertRaisesRegex(TradeModelError, 'robot3.*bad value'):
+            signal_pool.run_tasks(fail_on_three, tasks, max_workers=2
+                                  , names=['robot{}'.format(i) for i in range(0, 5)])
+
+    def test_dead_worker_raised(self):
+        tasks = [(i,) for i in range(0, 4)]
+        with self.assertRaises(TradeModelError):
+            signal_pool.run_tasks(kill_on_two, tasks, max_workers=2)
+
+    def test_timeout_raised(self):
+        tasks = [(i,) for i in range(0, 3)]
+        start_time = time.time()
+        with self.assertRaisesRegex(TradeModelError, 'TimeoutError'):
+            signal_pool.run_tasks(sleep_on_one, tasks, max_workers=2, timeout=0.5)
+        self.assertLess(time.time() - start_time, 4.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+
+import numpy as np
+
+import deepquant.backtest.bar_kernel as bar_kernel
+import deepquant.backtest.trade_stats as trade_stats
+import deepquant.common.state_machine as state_machine
+from deepquant.backtest.test.test_bar_kernel import make_signal_bars
+
+
+class TestTradeStats(unittest.TestCase):
+
+    def setUp(self):
+        self.bars = make_signal_bars(3000, seed=8)
+        self.trades, self.equity = bar_kernel.process_bars(self.bars, balance=10000.0, price_per_pip=0.1
+                                                           , value_per_point=100.0)
+
+    def test_drawdown(self):
+        stats = trade_stats.compute_stats([10.0, -5.0, 20.0, -10.0]
+                                          , equity=np.array([100.0, 110.0, 105.0, 95.0, 120.0, 115.0]))
+        self.assertEqual(stats['net_profit'], 15.0)
+        self.assertEqual(stats['win_rate'], 0.5)
+        self.assertEqual(stats['profit_factor'], 2.0)
+        self.assertEqual(stats['max_drawdown'], 15.0)
+        self.assertEqual(stats['max_drawdown_duration'], 2)
+
+    def test_mae_mfe_same_as_loop(self):
+        mae, mfe = trade_stats.get_mae_mfe(self.trades, self.bars, value_per_point=100.0)
+        p_high = self.bars[:, bar_kernel.IDX_PRICE_HIGH].astype(float)
+        p_low = self.bars[:, bar_kernel.IDX_PRICE_LOW].astype(float)
+        for k in range(0, self.trades['trade_id'].shape[0]):
+            start = self.trades['entry_bar'][k] + 1
+            stop = self.trades['exit_bar'][k] + 1
+            entry_price = self.trades['entry_price'][k]
+            favorable, adverse = 0.0, 0.0
+            if stop > start:
+                if self.trades['trade_type'][k] == state_machine.State.STATE_BUY:
+                    favorable, adverse = p_high[start:stop].max() - entry_price, entry_price - p_low[start:stop].min()
+                else:
+                    favorable, adverse = entry_price - p_low[start:stop].min(), p_high[start:stop].max() - entry_price
+            profit_points = self.trades['profit_points'][k]
+            money = self.trades['pos_size'][k] * 100.0
+            self.assertAlmostEqual(mfe[k], max(favorable, profit_points, 0.0) * money)
+            self.assertAlmostEqual(mae[k], max(adverse, -profit_points, 0.0) * money)
+
+    def test_incremental_same_as_batch(self):
+        mae, mfe = trade_stats.get_mae_mfe(self.trades, self.bars, value_per_point=100.0)
+        batch = trade_stats.compute_stats(self.trades['net_profit'], equity=self.equity, mae=mae, mfe=mfe
+                                          , annual_factor=252)
+
+        stats = trade_stats.TradeStats(annual_factor=252)
+        for k in range(0, self.trades['trade_id'].shape[0]):
+            stats.update_trade(self.trades['net_profit'][k], mae=mae[k], mfe=mfe[k])
+        for equity in self.equity:
+            stats.update_equity(equity)
+        incremental = stats.get_stats()
+
+        self.assertEqual(list(incremental.keys()), trade_stats.STAT_COLUMNS)
+        for col in trade_stats.STAT_COLUMNS:
+            self.assertAlmostEqual(incremental[col], batch[col], places=6, msg=col)
+
+
+if __name__ == '__main__':
+    unittest.main()
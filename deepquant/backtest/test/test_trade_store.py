@@ -0,0 +1,49 @@
+import unittest
+
+import numpy as np
+
+import deepquant.backtest.bar_kernel as bar_kernel
+import deepquant.backtest.trade_store as trade_store
+from deepquant.backtest.test.test_bar_kernel import make_signal_bars
+
+
+class TestTradeStore(unittest.TestCase):
+
+    def test_append_and_view(self):
+        store = trade_store.TradeStore(symbol='XAUUSD', capacity=2)
+        for i in range(0, 5):
+            trade = store.add_trade(i + 1, 1, i * 10, 'bar{}'.format(i * 10), 100.0 + i, 1.0)
+            trade.exit_price = 101.0 + i
+            trade.net_profit = 1.0
+        self.assertEqual(len(store), 5)
+        self.assertEqual(store[3].trade_id, 4)
+        self.assertEqual(store[-1].exit_price, 105.0)
+        self.assertEqual(store[0].symbol, 'XAUUSD')
+
+        trade = store[1]
+        trade.scale_list.append(12, 'bar12', trade_store.SCALE_TYPE_IN, 0.5, 1.0, 1.5, 101.0, 101.2)
+        trade.scale_list.append(13, 'bar13', trade_store.SCALE_TYPE_OUT, 0.5, 1.5, 1.0, 101.2, 101.2)
+        trade.scale_list.append(14, 'bar14', trade_store.SCALE_TYPE_IN, 0.5, 1.0, 1.5, 101.2, 101.5)
+        self.assertEqual(list(trade.scale_list.get_list()['scale_no']), [1, 1, 2])
+        self.assertEqual(trade.scale_in_num, 2)
+        self.assertEqual(trade.scale_out_num, 1)
+        self.assertFalse(hasattr(trade, '__dict__'))
+
+        trade_df = store.to_frame()
+        self.assertEqual(list(trade_df['entry_bar']), [0, 10, 20, 30, 40])
+        self.assertEqual(trade_df['net_profit'].sum(), 5.0)
+
+    def test_from_kernel_arrays(self):
+        bars = make_signal_bars(2000, seed=4)
+        trades, _ = bar_kernel.process_bars(bars, price_per_pip=0.1, value_per_point=100.0)
+        store = trade_store.TradeStore.from_arrays(trades)
+        trade_df = store.to_frame(bar_kernel.TRADE_COLUMNS)
+        for col in bar_kernel.TRADE_COLUMNS:
+            np.testing.assert_array_equal(trade_df[col].to_numpy(), trades[col])
+        # Numeric columns are not copied
+        self.assertTrue(np.shares_memory(store.get_column('net_profit'), trades['net_profit']))
+        self.assertTrue(np.shares_memory(trade_df['net_profit'].to_numpy(), trades['net_profit']))
+
+
+if __name__ == '__main__':
+    unittest.main()
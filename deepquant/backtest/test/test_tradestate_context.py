@@ -0,0 +1,55 @@
+import json
+import unittest
+
+import deepquant.backtest.tradestate_context as state_ctx
+
+
+class TestTradeStateContext(unittest.TestCase):
+
+    def test_add_state(self):
+        ctx = state_ctx.TradeStateContext(capacity=4)
+        for i in range(0, 10):
+            ctx.add_state('BUY' if i % 2 == 0 else 'SELL', 1.5 * i, 1.0, 100.0 + i, 1000.0 - i, 0.5 * i, 0, i % 2
+                          , -0.5 * i, -50.0 * i)
+        self.assertEqual(len(ctx), 10)
+
+        last_row = ctx.get_tradestate_last_row()
+        self.assertEqual(list(last_row.index), [9])
+        self.assertEqual(last_row['trade_action'].iloc[0], 'SELL')
+        self.assertEqual(last_row['avg_cost'].iloc[0], 109.0)
+
+        context = ctx.get_tradestate_context()
+        self.assertEqual(len(context), 10)
+        self.assertEqual(context['stop_loss'].tolist(), [1.5 * i for i in range(0, 10)])
+        records = json.loads(ctx.to_json())
+        self.assertEqual(records[3]['trade_action'], 'SELL')
+        self.assertEqual(records[3]['loss'], -150.0)
+
+    def test_add_state_none(self):
+        # Strategy may return None for trailing stop loss / stop loss type, e.g. passive_backtest.py
+        ctx = state_ctx.TradeStateContext()
+        ctx.add_state('HOLD', None, 0.0, None, 1000.0, None, None, 0, None, 0.0)
+        ctx.add_state('BUY', 'ATR', 1.0, 100.0, 1000.0, 0.5, 'TRAILING', 1, 0.0, 0.0)
+        context = ctx.get_tradestate_context()
+        self.assertTrue(context[['stop_loss', 'stoploss_type', 'avg_cost', 'profit_pip']].iloc[0].isna().all())
+        self.assertEqual(context['stop_loss'].iloc[1], 'ATR')
+        self.assertEqual(context['stoploss_type'].iloc[1], 'TRAILING')
+        self.assertEqual(context['stoploss_num'].tolist(), [0, 1])
+        records = json.loads(ctx.to_json())
+        self.assertIsNone(records[0]['stop_loss'])
+        self.assertIsNone(records[0]['profit_pip'])
+
+        with self.assertRaisesRegex(ValueError, 'equity'):
+            ctx.add_state('BUY', None, 1.0, 100.0, 'n/a', 0.5, 0, 1, 0.0, 0.0)
+        with self.assertRaisesRegex(ValueError, 'stoploss_num'):
+            ctx.add_state('BUY', None, 1.0, 100.0, 1000.0, 0.5, 0, None, 0.0, 0.0)
+        self.assertEqual(len(ctx), 2)
+
+    def test_empty(self):
+        ctx = state_ctx.TradeStateContext()
+        self.assertEqual(len(ctx.get_tradestate_last_row()), 0)
+        self.assertEqual(ctx.to_json(), '[]')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+
+import pandas as pd
+
+import deepquant.backtest.optimizer as optimizer
+import deepquant.backtest.walk_forward as walk_forward
+from deepquant.backtest.test.test_bar_kernel import make_signal_bars
+
+
+class TestWalkForward(unittest.TestCase):
+
+    def setUp(self):
+        self.bars = make_signal_bars(3000, seed=2)
+        self.kernel_kwargs = {'balance': 1000.0, 'price_per_pip': 0.1, 'value_per_point': 100.0}
+        self.space = {'limit_pos_size': [0.1, 0.5], 'stop_loss': [0, 10, 50]}
+
+    def signal_func(self, signal_params):
+        return self.bars
+
+    def test_make_windows(self):
+        windows = walk_forward.make_windows(100, 40, 20)
+        self.assertEqual(windows, [(0, 40, 40, 60), (20, 60, 60, 80), (40, 80, 80, 100)])
+        self.assertEqual(walk_forward.make_windows(50, 40, 20), [])
+
+    def test_parallel_same_as_sequential(self):
+        seq_df = walk_forward.WalkForward(self.signal_func, self.kernel_kwargs, self.space, 1000, 500
+                                          , processes=1).run()
+        par_df = walk_forward.WalkForward(self.signal_func, self.kernel_kwargs, self.space, 1000, 500
+                                          , processes=2).run()
+        self.assertEqual(len(seq_df), 4)
+        pd.testing.assert_frame_equal(seq_df.drop(columns=['elapsed']), par_df.drop(columns=['elapsed']))
+
+        # Test result is same as running best parameters on test bars only
+        row = seq_df.iloc[0]
+        kernel_params = {'limit_pos_size': row['limit_pos_size'], 'stop_loss': row['stop_loss']}
+        result = optimizer.evaluate_bars(self.bars[1000:1500], self.kernel_kwargs, kernel_params)
+        self.assertAlmostEqual(row['test_net_profit'], result['net_profit'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,267 @@
+import numpy as np
+import pandas as pd
+
+import deepquant.backtest.bar_kernel as bar_kernel
+import deepquant.common.state_machine as state_machine
+
+"""
+## Trade Statistics
+
+คำนวณสถิติของการเทรดจาก trade arrays (columnar) และ equity curve ที่ได้จาก bar kernel
+ทุกค่าคำนวณด้วย numpy แบบ O(n) ไม่มีการสร้าง object ต่อ trade จึงใช้กับ trade list ขนาดใหญ่มากได้
+
+### Metrics (STAT_COLUMNS)
+* net_profit, total_trades, win_rate, gross_profit, gross_loss, profit_factor (gross_profit / |gross_loss|)
+* avg_win, avg_loss, expectancy (กำไรเฉลี่ยต่อ trade)
+* max_drawdown, max_drawdown_pct และ max_drawdown_duration (จำนวน bar ที่ equity อยู่ต่ำกว่าจุดสูงสุดก่อนหน้านานที่สุด)
+* avg_mae, max_mae, avg_mfe, max_mfe คือ maximum adverse/favorable excursion (หน่วยเงิน) ระหว่างถือ position
+* sharpe, sortino คำนวณจากผลตอบแทนต่อ bar ของ equity curve คูณ sqrt(annual_factor)
+(annual_factor คือจำนวน bar ต่อปี, None = ไม่ปรับเป็นรายปี)
+
+### Incremental Update
+TradeStats ใช้สำหรับการเทรดจริง โดยอัพเดตทีละ trade (update_trade) และทีละ bar (update_equity)
+ด้วยเวลาคงที่ และให้ผลลัพธ์เหมือนกับ compute_stats
+"""
+
+STAT_COLUMNS = ['net_profit', 'total_trades', 'win_rate', 'gross_profit', 'gross_loss', 'profit_factor'
+                , 'avg_win', 'avg_loss', 'expectancy', 'max_drawdown', 'max_drawdown_pct', 'max_drawdown_duration'
+                , 'avg_mae', 'max_mae', 'avg_mfe', 'max_mfe', 'sharpe', 'sortino']
+
+
+def get_mae_mfe(trades, bars, value_per_point=1.0, action_bar=1):
+    """
+    Returns (mae, mfe) arrays of trades in money value.
+    Price range is from bar after entry (action_bar = 1, entry at close) or entry bar (action_bar = 2) to exit bar.
+    """
+    n = trades['trade_id'].shape[0]
+    if n == 0:
+        return np.zeros(0), np.zeros(0)
+
+    # Sentinel bar at the end, so that exit_bar + 1 is valid index of reduceat
+    p_high = np.append(bars[:, bar_kernel.IDX_PRICE_HIGH].astype(float), -np.inf)
+    p_low = np.append(bars[:, bar_kernel.IDX_PRICE_LOW].astype(float), np.inf)
+    starts = trades['entry_bar'] + (1 if action_bar == 1 else 0)
+    stops = trades['exit_bar'] + 1
+    has_range = stops > starts
+    starts = np.where(has_range, starts, stops - 1)
+
+    # Reduce over [start, stop) of each trade, trades of one robot never overlap except exit/entry bar
+    indexes = np.empty(2 * n, dtype=np.int64)
+    indexes[0::2] = starts
+    indexes[1::2] = stops
+    highest = np.maximum.reduceat(p_high, indexes)[0::2]
+    lowest = np.minimum.reduceat(p_low, indexes)[0::2]
+
+    is_buy = trades['trade_type'] == state_machine.State.STATE_BUY
+    favorable = np.where(is_buy, highest - trades['entry_price'], trades['entry_price'] - lowest)
+    adverse = np.where(is_buy, trades['entry_price'] - lowest, highest - trades['entry_price'])
+    favorable = np.where(has_range, favorable, 0.0)
+    adverse = np.where(has_range, adverse, 0.0)
+
+    # Excursion is at least realized profit or loss
+    favorable = np.maximum(np.maximum(favorable, trades['profit_points']), 0.0)
+    adverse = np.maximum(np.maximum(adverse, -trades['profit_points']), 0.0)
+    money = trades['pos_size'] * value_per_point
+    return adverse * money, favorable * money
+
+
+def get_returns(equity):
+    """
+    Returns percent change of equity on every bar, 0 when previous equity is not positive
+    """
+    prev = equity[:-1]
+    change = np.diff(equity)
+    return np.divide(change, prev, out=np.zeros(change.shape[0]), where=prev > 0)
+
+
+def compute_stats(net_profits, equity=None, mae=None, mfe=None, annual_factor=None):
+    """
+    Returns dictionary of STAT_COLUMNS
+    param: net_profits, net profit of each trade
+    param: equity, equity curve, None = drawdown, sharpe and sortino are NaN
+    param: mae, mfe, maximum adverse/favorable excursion of each trade (see get_mae_mfe), None = NaN
+    param: annual_factor, number of bars per year used to annualize sharpe and sortino
+    """
+    net_profits = np.asarray(net_profits, dtype=float)
+    total_trades = net_profits.shape[0]
+    wins = net_profits[net_profits > 0]
+    losses = net_profits[net_profits <= 0]
+    gross_profit = float(np.sum(wins))
+    gross_loss = float(np.sum(losses))
+
+    stats = {'net_profit': float(np.sum(net_profits))
+             , 'total_trades': total_trades
+             , 'win_rate': wins.shape[0] / total_trades if total_trades > 0 else 0.0
+             , 'gross_profit': gross_profit
+             , 'gross_loss': gross_loss
+             , 'profit_factor': _profit_factor(gross_profit, gross_loss)
+             , 'avg_win': float(np.mean(wins)) if wins.shape[0] > 0 else 0.0
+             , 'avg_loss': float(np.mean(losses)) if losses.shape[0] > 0 else 0.0
+             , 'expectancy': float(np.mean(net_profits)) if total_trades > 0 else 0.0}
+
+    for name, values in [('mae', mae), ('mfe', mfe)]:
+        has_values = values is not None and len(values) > 0
+        stats['avg_' + name] = float(np.mean(values)) if has_values else np.nan
+        stats['max_' + name] = float(np.max(values)) if has_values else np.nan
+
+    if equity is None or len(equity) == 0:
+        stats.update({'max_drawdown': np.nan, 'max_drawdown_pct': np.nan, 'max_drawdown_duration': np.nan
+                      , 'sharpe': np.nan, 'sortino': np.nan})
+        return {col: stats[col] for col in STAT_COLUMNS}
+
+    equity = np.asarray(equity, dtype=float)
+    peak = np.maximum.accumulate(equity)
+    drawdown = peak - equity
+    drawdown_pct = np.divide(drawdown, peak, out=np.zeros(equity.shape[0]), where=peak > 0)
+
+    # Duration is number of bars since last peak
+    bar_index = np.arange(equity.shape[0])
+    peak_index = np.maximum.accumulate(np.where(equity >= peak, bar_index, 0))
+    stats['max_drawdown'] = float(np.max(drawdown))
+    stats['max_drawdown_pct'] = float(np.max(drawdown_pct))
+    stats['max_drawdown_duration'] = int(np.max(bar_index - peak_index))
+
+    returns = get_returns(equity)
+    stats['sharpe'] = _sharpe(returns.shape[0], float(np.sum(returns)), float(np.sum(returns * returns))
+                              , annual_factor)
+    stats['sortino'] = _sortino(returns.shape[0], float(np.sum(returns))
+                                , float(np.sum(np.minimum(returns, 0.0) ** 2)), annual_factor)
+    return {col: stats[col] for col in STAT_COLUMNS}
+
+
+def compute_trade_stats(trades, equity=None, bars=None, value_per_point=1.0, action_bar=1, annual_factor=None):
+    """
+    Returns dictionary of STAT_COLUMNS from trade arrays of bar kernel, MAE/MFE are computed when bars are given
+    """
+    mae, mfe = (None, None) if bars is None else get_mae_mfe(trades, bars, value_per_point, action_bar)
+    return compute_stats(trades['net_profit'], equity=equity, mae=mae, mfe=mfe, annual_factor=annual_factor)
+
+
+def stats_table(robot_stats, total_stats=None):
+    """
+    Returns DataFrame of statistics, one row per robot (index is robot name) and 'total' row if given
+    """
+    rows = dict(robot_stats)
+    if total_stats is not None:
+        rows['total'] = total_stats
+    return pd.DataFrame.from_dict(rows, orient='index', columns=STAT_COLUMNS)
+
+
+def _profit_factor(gross_profit, gross_loss):
+    if gross_loss < 0:
+        return gross_profit / -gross_loss
+    return np.inf if gross_profit > 0 else np.nan
+
+
+def _sharpe(n, total, total_sq, annual_factor):
+    if n < 2:
+        return np.nan
+    mean = total / n
+    var = max((total_sq - n * mean * mean) / (n - 1), 0.0)
+    if var == 0:
+        return np.nan
+    return mean / np.sqrt(var) * (np.sqrt(annual_factor) if annual_factor else 1.0)
+
+
+def _sortino(n, total, downside_sq, annual_factor):
+    if n < 1 or downside_sq == 0:
+        return np.nan
+    return (total / n) / np.sqrt(downside_sq / n) * (np.sqrt(annual_factor) if annual_factor else 1.0)
+
+
+class TradeStats():
+    """
+    Incremental trade statistics for live trading, each update is O(1)
+    """
+
+    def __init__(self, annual_factor=None):
+        self.annual_factor = annual_factor
+        self.total_trades = 0
+        self.win_num = 0
+        self.gross_profit = 0.0
+        self.gross_loss = 0.0
+        self.mae_num = 0
+        self.mae_sum = 0.0
+        self.mae_max = np.nan
+        self.mfe_sum = 0.0
+        self.mfe_max = np.nan
+
+        self.bar_num = 0
+        self.last_equity = None
+        self.peak = None
+        self.peak_bar = 0
+        self.max_drawdown = 0.0
+        self.max_drawdown_pct = 0.0
+        self.max_drawdown_duration = 0
+        self.return_sum = 0.0
+        self.return_sq_sum = 0.0
+        self.downside_sq_sum = 0.0
+
+    # =======================================================================================
+    # BEGIN: Public methods
+    # =======================================================================================
+    def update_trade(self, net_profit, mae=None, mfe=None):
+        self.total_trades = self.total_trades + 1
+        if net_profit > 0:
+            self.win_num = self.win_num + 1
+            self.gross_profit = self.gross_profit + net_profit
+        else:
+            self.gross_loss = self.gross_loss + net_profit
+
+        if mae is not None and mfe is not None:
+            self.mae_num = self.mae_num + 1
+            self.mae_sum = self.mae_sum + mae
+            self.mfe_sum = self.mfe_sum + mfe
+            self.mae_max = mae if self.mae_num == 1 else max(self.mae_max, mae)
+            self.mfe_max = mfe if self.mae_num == 1 else max(self.mfe_max, mfe)
+
+    def update_equity(self, equity):
+        if self.last_equity is not None:
+            ret = (equity - self.last_equity) / self.last_equity if self.last_equity > 0 else 0.0
+            self.return_sum = self.return_sum + ret
+            self.return_sq_sum = self.return_sq_sum + ret * ret
+            self.downside_sq_sum = self.downside_sq_sum + min(ret, 0.0) ** 2
+
+        if self.peak is None or equity >= self.peak:
+            self.peak = equity
+            self.peak_bar = self.bar_num
+        drawdown = self.peak - equity
+        self.max_drawdown = max(self.max_drawdown, drawdown)
+        if self.peak > 0:
+            self.max_drawdown_pct = max(self.max_drawdown_pct, drawdown / self.peak)
+        self.max_drawdown_duration = max(self.max_drawdown_duration, self.bar_num - self.peak_bar)
+
+        self.last_equity = equity
+        self.bar_num = self.bar_num + 1
+
+    def get_stats(self):
+        net_profit = self.gross_profit + self.gross_loss
+        loss_num = self.total_trades - self.win_num
+        stats = {'net_profit': net_profit
+                 , 'total_trades': self.total_trades
+                 , 'win_rate': self.win_num / self.total_trades if self.total_trades > 0 else 0.0
+                 , 'gross_profit': self.gross_profit
+                 , 'gross_loss': self.gross_loss
+                 , 'profit_factor': _profit_factor(self.gross_profit, self.gross_loss)
+                 , 'avg_win': self.gross_profit / self.win_num if self.win_num > 0 else 0.0
+                 , 'avg_loss': self.gross_loss / loss_num if loss_num > 0 else 0.0
+                 , 'expectancy': net_profit / self.total_trades if self.total_trades > 0 else 0.0
+                 , 'avg_mae': self.mae_sum / self.mae_num if self.mae_num > 0 else np.nan
+                 , 'max_mae': self.mae_max
+                 , 'avg_mfe': self.mfe_sum / self.mae_num if self.mae_num > 0 else np.nan
+                 , 'max_mfe': self.mfe_max}
+
+        if self.bar_num == 0:
+            stats.update({'max_drawdown': np.nan, 'max_drawdown_pct': np.nan, 'max_drawdown_duration': np.nan
+                          , 'sharpe': np.nan, 'sortino': np.nan})
+        else:
+            n = self.bar_num - 1
+            stats.update({'max_drawdown': self.max_drawdown, 'max_drawdown_pct': self.max_drawdown_pct
+                          , 'max_drawdown_duration': self.max_drawdown_duration
+                          , 'sharpe': _sharpe(n, self.return_sum, self.return_sq_sum, self.annual_factor)
+                          , 'sortino': _sortino(n, self.return_sum, self.downside_sq_sum, self.annual_factor)})
+        return {col: stats[col] for col in STAT_COLUMNS}
+
+    # =======================================================================================
+    # END: Public methods
+    # =======================================================================================
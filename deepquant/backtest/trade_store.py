@@ -0,0 +1,236 @@
+import numpy as np
+import pandas as pd
+
+"""
+## Trade Store
+
+ที่จัดเก็บ trade และ scale in/out แบบ columnar ใช้แทน object Trade และ dictionary ต่อ scale event
+* แต่ละ attribute เก็บเป็น numpy array หนึ่งตัวต่อหนึ่ง column ขยายขนาดแบบเท่าตัว (amortized O(1) append)
+ไม่มี object ต่อ trade จึงประหยัดหน่วยความจำและไม่เป็นภาระของ garbage collector แม้มี trade เป็นล้าน
+* store[i] จะ return TradeView ซึ่งเป็น object เล็กๆ (__slots__) ที่อ่าน/เขียน attribute ผ่าน column ของ store
+* to_frame() สร้าง DataFrame จาก column โดยตรง ไม่ copy ทีละแถว
+* scale in/out ของทุก trade เก็บรวมใน ScaleStore โดยอ้างถึง trade ด้วย trade_index
+และ trade.scale_list คือ ScaleList ที่เป็น view ของ scale event ของ trade นั้น
+"""
+
+SCALE_TYPE_IN = 1
+SCALE_TYPE_OUT = 2
+
+TRADE_FIELDS = [('trade_id', np.int64), ('trade_type', np.int8), ('entry_bar', np.int64), ('entry_date', object)
+                , ('entry_price', np.float64), ('pos_size', np.float64)
+                , ('stop_loss', np.float64), ('take_profit', np.float64)
+                , ('stop_loss_price', np.float64), ('take_profit_price', np.float64), ('avg_cost', np.float64)
+                , ('exit_bar', np.int64), ('exit_date', object), ('exit_price', np.float64), ('exit_reason', np.int8)
+                , ('price_change', np.float64), ('price_change_pct', np.float64), ('pos_value', np.float64)
+                , ('profit_points', np.float64), ('unrealized_profit', np.float64)
+                , ('unrealized_profit_pct', np.float64), ('net_profit', np.float64), ('net_profit_pct', np.float64)
+                , ('commission', np.float64), ('hold_bars', np.int64)
+                , ('scale_in_num', np.int32), ('scale_out_num', np.int32)]
+
+SCALE_FIELDS = [('trade_index', np.int64), ('scale_no', np.int32), ('bar_index', np.int64), ('date', object)
+                , ('scale_type', np.int8), ('scale_size', np.float64)
+                , ('pos_size_before', np.float64), ('pos_size_after', np.float64)
+                , ('avg_cost_before', np.float64), ('avg_cost_after', np.float64)]
+
+
+def _empty_column(dtype, capacity):
+    return np.full(capacity, None, dtype=object) if dtype is object else np.zeros(capacity, dtype=dtype)
+
+
+class ColumnStore():
+
+    def __init__(self, fields, capacity=1024):
+        """
+        param: fields, list of (column name, dtype)
+        param: capacity, initial number of rows allocated
+        """
+        self.fields = fields
+        self.columns = {name: _empty_column(dtype, capacity) for name, dtype in fields}
+        self.capacity = capacity
+        self.size = 0
+
+    # =======================================================================================
+    # BEGIN: Public methods
+    # =======================================================================================
+    def append(self, **values):
+        """
+        Append one row, columns not given are zero (None for object columns). Returns row index.
+        """
+        if self.size == self.capacity:
+            self.__grow(self.size + 1)
+        index = self.size
+        for name, value in values.items():
+            self.columns[name][index] = value
+        self.size = self.size + 1
+        return index
+
+    def extend(self, arrays):
+        """
+        Append rows from dictionary of arrays (same length). Returns index of first appended row.
+        """
+        n = len(next(iter(arrays.values()))) if len(arrays) > 0 else 0
+        if self.size + n > self.capacity:
+            self.__grow(self.size + n)
+        index = self.size
+        for name, arr in arrays.items():
+            self.columns[name][index:index + n] = arr
+        self.size = self.size + n
+        return index
+
+    def get_column(self, name):
+        """
+        Returns view of column (not a copy)
+        """
+        return self.columns[name][:self.size]
+
+    def to_frame(self, columns=None):
+        """
+        Returns DataFrame of columns, numeric columns are views of the store
+        """
+        columns = columns or [name for name, _ in self.fields]
+        return pd.DataFrame({name: self.get_column(name) for name in columns}, columns=columns, copy=False)
+
+    def __len__(self):
+        return self.size
+
+    # =======================================================================================
+    # END: Public methods
+    # =======================================================================================
+
+    def __grow(self, min_capacity):
+        capacity = max(self.capacity * 2, min_capacity)
+        for name, dtype in self.fields:
+            arr = _empty_column(dtype, capacity)
+            arr[:self.size] = self.columns[name][:self.size]
+            self.columns[name] = arr
+        self.capacity = capacity
+
+
+class ScaleStore(ColumnStore):
+
+    def __init__(self, capacity=64):
+        super().__init__(SCALE_FIELDS, capacity=capacity)
+
+
+class TradeStore(ColumnStore):
+
+    def __init__(self, symbol=None, capacity=1024):
+        super().__init__(TRADE_FIELDS, capacity=capacity)
+        self.symbol = symbol
+        self.scales = ScaleStore()
+
+    @classmethod
+    def from_arrays(cls, trades, symbol=None):
+        """
+        Returns store of trade arrays returned from bar_kernel.process_bars
+        """
+        n = len(trades['trade_id'])
+        store = cls(symbol=symbol, capacity=1)
+
+        # Use kernel arrays as columns directly (no copy if dtype is same)
+        for name, dtype in TRADE_FIELDS:
+            store.columns[name] = np.asarray(trades[name], dtype=dtype) if name in trades \
+                else _empty_column(dtype, n)
+        store.capacity = n
+        store.size = n
+        return store
+
+    def add_trade(self, trade_id, trade_type, entry_bar, entry_date, entry_price, pos_size
+                  , stop_loss=0.0, take_profit=0.0, stop_loss_price=0.0, take_profit_price=0.0):
+        """
+        Append new active trade, returns TradeView of the trade
+        """
+        index = self.append(trade_id=trade_id, trade_type=trade_type, entry_bar=entry_bar, entry_date=entry_date
+                            , entry_price=entry_price, pos_size=pos_size, avg_cost=entry_price
+                            , stop_loss=stop_loss, take_profit=take_profit
+                            , stop_loss_price=stop_loss_price, take_profit_price=take_profit_price)
+        return TradeView(self, index)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index = index + self.size
+        if index < 0 or index >= self.size:
+            raise IndexError('Trade index out of range')
+        return TradeView(self, index)
+
+    def __iter__(self):
+        for index in range(0, self.size):
+            yield TradeView(self, index)
+
+
+class ScaleList():
+    """
+    Scale in/out events of one trade, stored in ScaleStore of trade store
+    """
+    __slots__ = ('store', 'index')
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+
+    def append(self, bar_index, date, scale_type, scale_size
+               , pos_size_before, pos_size_after
+               , avg_cost_before, avg_cost_after):
+        scale_no = 0
+        if scale_type == SCALE_TYPE_IN:
+            scale_no = self.total_scale_ins + 1
+            self.store.columns['scale_in_num'][self.index] = scale_no
+        elif scale_type == SCALE_TYPE_OUT:
+            scale_no = self.total_scale_outs + 1
+            self.store.columns['scale_out_num'][self.index] = scale_no
+
+        self.store.scales.append(trade_index=self.index, scale_no=scale_no, bar_index=bar_index, date=date
+                                 , scale_type=scale_type, scale_size=scale_size
+                                 , pos_size_before=pos_size_before, pos_size_after=pos_size_after
+                                 , avg_cost_before=avg_cost_before, avg_cost_after=avg_cost_after)
+
+    def get_list(self):
+        """
+        Returns DataFrame of scale events of this trade
+        """
+        scale_df = self.store.scales.to_frame()
+        return scale_df[scale_df['trade_index'] == self.index].drop(columns=['trade_index']).reset_index(drop=True)
+
+    @property
+    def total_scale_ins(self):
+        return int(self.store.columns['scale_in_num'][self.index])
+
+    @property
+    def total_scale_outs(self):
+        return int(self.store.columns['scale_out_num'][self.index])
+
+
+class TradeView():
+    """
+    Attribute access to one trade of TradeStore, attributes are TRADE_FIELDS
+    """
+    __slots__ = ('store', 'index')
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+
+    @property
+    def symbol(self):
+        return self.store.symbol
+
+    @property
+    def scale_list(self):
+        return ScaleList(self.store, self.index)
+
+    def to_dict(self):
+        return {name: self.store.columns[name][self.index] for name, _ in TRADE_FIELDS}
+
+
+def _field_property(name):
+    def getter(self):
+        return self.store.columns[name][self.index]
+
+    def setter(self, value):
+        self.store.columns[name][self.index] = value
+
+    return property(getter, setter)
+
+
+for _name, _ in TRADE_FIELDS:
+    setattr(TradeView, _name, _field_property(_name))
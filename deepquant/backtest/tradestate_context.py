@@ -1,14 +1,33 @@
+import numpy as np
 import pandas
 
+import deepquant.backtest.trade_store as trade_store
+
+"""
+## Trading State Context
+
+log สถานะการเทรดทีละ bar ของ IndividualBackTest (passive_backtest.py, sim_backtest.py)
+* เก็บแบบ columnar ใน trade_store.ColumnStore ที่จองพื้นที่ล่วงหน้าและขยายขนาดแบบเท่าตัว
+add_state จึงเป็น amortized O(1) ต่อ bar แทนการ append แถวให้ DataFrame ด้วย .loc ซึ่งช้าลงตามจำนวนแถว
+* get_tradestate_last_row สร้าง DataFrame 1 แถวจาก view ของ column โดยไม่ copy
+* DataFrame หรือ JSON ของทั้ง log สร้างครั้งเดียวตอนเรียก get_tradestate_context หรือ to_json
+* stop_loss, stoploss_type เป็นค่าจาก strategy (เช่น get_trailing_stoploss) ซึ่งอาจเป็น None หรือไม่ใช่ตัวเลข
+จึงเก็บเป็น object ส่วน column ตัวเลขอื่นๆ None จะเป็น NaN และค่าที่ไม่ใช่ตัวเลขจะ raise ValueError ที่ระบุชื่อ field
+"""
+
+STATE_FIELDS = [('trade_action', object), ('stop_loss', object), ('pos_size', np.float64)
+                , ('avg_cost', np.float64), ('equity', np.float64), ('profit_pip', np.float64)
+                , ('stoploss_type', object), ('stoploss_num', np.int64), ('loss_num', np.float64), ('loss', np.float64)]
+
+
 class TradeStateContext:
 
-    __result_columns = ['trade_action', 'stop_loss', 'pos_size', 'avg_cost',
-                        'equity', 'profit_pip', 'stoploss_type', 'stoploss_num',
-                        'loss_num', 'loss']
+    __result_columns = [name for name, _ in STATE_FIELDS]
+    __numeric_fields = {name: dtype for name, dtype in STATE_FIELDS if dtype is not object}
 
 
-    def __init__(self):
-        self.context = pandas.DataFrame(columns=self.__result_columns)
+    def __init__(self, capacity=1024):
+        self.context = trade_store.ColumnStore(STATE_FIELDS, capacity=capacity)
 
 
     # Add new trading state
@@ -16,17 +35,40 @@ class TradeStateContext:
         pos_size, avg_cost, equity, profit_pip, stoploss_type,
         stoploss_num, loss_num, loss):
 
-        self.context.loc[len(self.context.index)] = [trade_action, stoploss,
-                                                   pos_size, avg_cost, equity, profit_pip, stoploss_type,
-                                                   stoploss_num, loss_num, loss]
+        values = dict(pos_size=pos_size, avg_cost=avg_cost, equity=equity, profit_pip=profit_pip,
+                      stoploss_num=stoploss_num, loss_num=loss_num, loss=loss)
+        values = {name: self.__to_number(name, value) for name, value in values.items()}
+        self.context.append(trade_action=trade_action, stop_loss=stoploss, stoploss_type=stoploss_type, **values)
 
 
-    # Returns trading state context containing only latest N trading state in memory
+    # Returns trading state context (DataFrame) of all trading states, built once from state columns
     def get_tradestate_context(self):
-        return self.context
+        return self.context.to_frame(self.__result_columns)
 
 
-    # Returns latest trading state from trading state context
+    # Returns latest trading state from trading state context (DataFrame of 1 row, columns are views of the log)
     def get_tradestate_last_row(self):
         row_num = len(self.context)
-        return self.context.iloc[row_num - 1:]
\ No newline at end of file
+        return pandas.DataFrame({name: self.context.get_column(name)[row_num - 1:] for name in self.__result_columns},
+                                index=pandas.RangeIndex(max(row_num - 1, 0), row_num),
+                                columns=self.__result_columns, copy=False)
+
+
+    # Returns trading state context in JSON format (records)
+    def to_json(self):
+        return self.get_tradestate_context().to_json(orient='records')
+
+
+    def __len__(self):
+        return len(self.context)
+
+
+    # Convert value of numeric field to dtype of column, None is NaN for float columns
+    def __to_number(self, name, value):
+        dtype = TradeStateContext.__numeric_fields[name]
+        if value is None and dtype is np.float64:
+            return np.nan
+        try:
+            return dtype(value)
+        except (TypeError, ValueError):
+            raise ValueError('Trading state field {} must be numeric, got {!r}'.format(name, value)) from None
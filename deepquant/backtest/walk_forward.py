@@ -0,0 +1,140 @@
+import multiprocessing
+import time
+
+import pandas as pd
+
+import deepquant.backtest.bar_kernel as bar_kernel
+import deepquant.backtest.optimizer as optimizer
+
+"""
+## Walk-Forward Analysis
+
+แบ่ง signal bars เป็นหน้าต่าง train/test ที่เลื่อนไปเรื่อยๆ (rolling window) โดยขนาดกำหนดเป็นจำนวน bar
+    |---- train ----|-- test --|
+              |---- train ----|-- test --|
+                        |---- train ----|-- test --|
+* ในแต่ละหน้าต่างจะหา parameter ที่ดีที่สุด (grid search) บนช่วง train แล้วนำ parameter ชุดนั้นไปรันบนช่วง test
+* หน้าต่างแต่ละอันรันขนานกันใน process pool โดยแต่ละ worker รันเฉพาะ bar ในช่วงของหน้าต่างนั้นเท่านั้น
+* signal bars ของแต่ละชุด signal parameter จะถูกคำนวณครั้งเดียวบน bar ทั้งหมดใน process หลักก่อนเริ่ม worker
+(indicator ใช้แค่ข้อมูลในอดีต จึงตัดช่วงจาก signal bars ชุดเดียวกันได้ และ bar ก่อนหน้าต่างทำหน้าที่เป็น warm-up bars)
+
+ผลลัพธ์เป็น DataFrame หนึ่งแถวต่อหนึ่งหน้าต่าง ประกอบด้วยช่วง bar/วันที่, parameter ที่ดีที่สุด,
+metric บนช่วง train (train_*) และ metric บนช่วง test (test_*)
+"""
+
+# Context of running walk-forward, inherited by worker processes
+_wf_context = None
+
+
+def make_windows(total_bar, train_bars, test_bars, step_bars=None):
+    """
+    Returns list of (train_start, train_stop, test_start, test_stop), step_bars default is test_bars
+    """
+    step_bars = step_bars or test_bars
+    windows = []
+    train_start = 0
+    while train_start + train_bars + test_bars <= total_bar:
+        train_stop = train_start + train_bars
+        windows.append((train_start, train_stop, train_stop, train_stop + test_bars))
+        train_start = train_start + step_bars
+    return windows
+
+
+def _run_window(job):
+    window_no, (train_start, train_stop, test_start, test_stop) = job
+    start_time = time.time()
+    kernel_kwargs = _wf_context['kernel_kwargs']
+    metric = _wf_context['metric']
+
+    # Find best parameters on train bars, first trial wins on ties
+    best_params = None
+    best_result = None
+    for params in _wf_context['trials']:
+        kernel_params, signal_params = optimizer.split_params(params)
+        bars = _wf_context['bars_cache'][tuple(sorted(signal_params.items()))]
+        result = optimizer.evaluate_bars(bars[train_start:train_stop], kernel_kwargs, kernel_params)
+        if best_result is None \
+                or (result[metric] < best_result[metric] if _wf_context['ascending']
+                    else result[metric] > best_result[metric]):
+            best_params = params
+            best_result = result
+
+    kernel_params, signal_params = optimizer.split_params(best_params)
+    bars = _wf_context['bars_cache'][tuple(sorted(signal_params.items()))]
+    test_result = optimizer.evaluate_bars(bars[test_start:test_stop], kernel_kwargs, kernel_params)
+
+    row = {'window': window_no, 'train_start': train_start, 'train_stop': train_stop
+           , 'test_start': test_start, 'test_stop': test_stop
+           , 'train_start_date': bars[train_start, bar_kernel.IDX_DATETIME]
+           , 'test_start_date': bars[test_start, bar_kernel.IDX_DATETIME]
+           , 'test_end_date': bars[test_stop - 1, bar_kernel.IDX_DATETIME]}
+    row.update(best_params)
+    row.update({'train_{}'.format(k): v for k, v in best_result.items()})
+    row.update({'test_{}'.format(k): v for k, v in test_result.items()})
+    row['elapsed'] = time.time() - start_time
+    return row
+
+
+class WalkForward():
+
+    def __init__(self, signal_func, kernel_kwargs, param_space, train_bars, test_bars, step_bars=None
+                 , metric='net_profit', ascending=False, processes=None):
+        """
+        param: signal_func, function returns signal bars (numpy array) from signal parameters dictionary
+        param: kernel_kwargs, keyword arguments of bar_kernel.process_bars
+        param: param_space, dictionary of parameter name and list of values, see optimizer.parse_param_space
+        param: train_bars, number of bars of train period
+        param: test_bars, number of bars of test period
+        param: step_bars, number of bars to move window, None = test_bars (test periods do not overlap)
+        param: metric, metric used to select best parameters, one of optimizer.RESULT_METRICS
+        param: ascending, True = lower metric is better (e.g. max_drawdown)
+        param: processes, number of worker processes, None = number of CPUs
+        """
+        self.signal_func = signal_func
+        self.kernel_kwargs = kernel_kwargs
+        self.param_space = param_space
+        self.train_bars = train_bars
+        self.test_bars = test_bars
+        self.step_bars = step_bars
+        self.metric = metric
+        self.ascending = ascending
+        self.processes = processes
+
+    # =======================================================================================
+    # BEGIN: Public methods
+    # =======================================================================================
+    def run(self):
+        """
+        Returns DataFrame of walk-forward results, one row per window
+        """
+        global _wf_context
+        trials = optimizer.grid_trials(self.param_space)
+
+        # Compute signal bars of every signal parameters before starting workers
+        bars_cache = {}
+        for params in trials:
+            signal_params = optimizer.split_params(params)[1]
+            key = tuple(sorted(signal_params.items()))
+            if key not in bars_cache:
+                bars_cache[key] = self.signal_func(signal_params)
+        total_bar = min(bars.shape[0] for bars in bars_cache.values())
+
+        _wf_context = {'trials': trials, 'bars_cache': bars_cache, 'kernel_kwargs': self.kernel_kwargs
+                       , 'metric': self.metric, 'ascending': self.ascending}
+        jobs = list(enumerate(make_windows(total_bar, self.train_bars, self.test_bars, self.step_bars)))
+        try:
+            if self.processes == 1 or len(jobs) <= 1:
+                rows = list(map(_run_window, jobs))
+            else:
+                # Workers inherit signal bars from this process
+                ctx = multiprocessing.get_context('fork')
+                with ctx.Pool(processes=min(self.processes or multiprocessing.cpu_count(), len(jobs))) as pool:
+                    rows = pool.map(_run_window, jobs)
+        finally:
+            _wf_context = None
+
+        return pd.DataFrame(rows)
+
+    # =======================================================================================
+    # END: Public methods
+    # =======================================================================================
@@ -0,0 +1,132 @@
+import numpy as np
+
+"""
+## Binning
+
+แบ่งค่าต่อเนื่อง (เช่น ช่วงราคา, ความผันผวน, ระดับ rsi/macd) เป็น code ด้วยตาราง แทนการเขียน if/elif ทีละ bar
+ขอบของแต่ละช่วง (edges) ถูกประกาศครั้งเดียวและ compile เป็น array ที่เรียงแล้ว
+จากนั้นหา bin ของทั้ง column ในการเรียกครั้งเดียว ด้วยการนับขอบที่ค่าผ่าน (ไม่เกิน 16 ขอบ ซึ่งเร็วกว่า)
+หรือ np.searchsorted (มากกว่า 16 ขอบ)
+
+### Binner
+* edges: ขอบของช่วงเรียงจากน้อยไปมาก n ค่า ได้ n + 1 bin (index 0 ถึง n)
+* closed: ขอบแต่ละค่าเป็นของ bin ไหน
+    'right' (ค่าเริ่มต้น) x == edge อยู่ใน bin ล่าง เช่น edges [1, 2] ได้ bin x <= 1, 1 < x <= 2, x > 2
+    'left' x == edge อยู่ใน bin บน เช่น edges [1, 2] ได้ bin x < 1, 1 <= x < 2, x >= 2
+    กำหนดแยกแต่ละขอบได้ด้วย list เช่น edges [0, 0] closed ['left', 'right'] ได้ bin x < 0, x == 0, x > 0
+* labels: code ของแต่ละ bin (ค่าเริ่มต้น 1 ถึง n + 1), nan_label: code ของค่า NaN
+
+### CodeTable
+code แบบ composite จากหลาย input เช่น code จากเครื่องหมายและขนาดของผลต่าง
+* table เป็น array n มิติ มิติที่ i มีขนาดเท่ากับจำนวน bin ของ Binner ตัวที่ i
+* code ของแต่ละ bar คือ table[bin ของ input 1, bin ของ input 2, ...] และเป็น nan_code เมื่อ input ใดเป็น NaN
+
+### ตัวอย่าง
+    channel = Binner([50, 100])  # x <= 50: 1, 50 < x <= 100: 2, x > 100: 3
+    channel.apply(high_low_range)
+    sign = Binner([0, 0], closed=['left', 'right'])  # x < 0, x == 0, x > 0
+    size = Binner([1, 2, 4])
+    table = CodeTable([[4, 3, 2, 1], [0, 0, 0, 0], [5, 6, 7, 8]], sign, size)
+    table.apply(diff, np.abs(diff))
+"""
+
+
+class Binner():
+
+    # Maximum number of edges of which bin index is counted by comparing with each edge instead of np.searchsorted
+    __scan_max_edges = 16
+
+    def __init__(self, edges, labels=None, closed='right', nan_label=0):
+        """
+        param: edges, sorted bin edges
+        param: labels, code of each bin (len(edges) + 1 values), None = 1 to len(edges) + 1
+        param: closed, 'right', 'left' or list of 'right'/'left' of each edge
+        param: nan_label, code of NaN values
+        """
+        self.edges = np.asarray(edges, dtype=float)
+        if self.edges.ndim != 1 or np.any(np.diff(self.edges) < 0):
+            raise ValueError('Bin edges must be a sorted list: {}'.format(edges))
+
+        closed = [closed] * len(self.edges) if isinstance(closed, str) else list(closed)
+        if len(closed) != len(self.edges) or any(c not in ['right', 'left'] for c in closed):
+            raise ValueError('closed must be "right", "left" or list of them for each edge: {}'.format(closed))
+        self.closed = closed
+        # Edges of which x == edge is in upper bin, counted in addition to edges less than x
+        self.__left_edges = self.edges[np.array([c == 'left' for c in closed], dtype=bool)]
+
+        self.labels = np.arange(1, len(self.edges) + 2) if labels is None else np.asarray(labels)
+        if len(self.labels) != self.bin_num():
+            raise ValueError('Number of labels must be {} (number of edges + 1), got {}'.format(self.bin_num()
+                                                                                                 , len(self.labels)))
+        self.nan_label = nan_label
+
+    # =======================================================================================
+    # BEGIN: Public methods
+    # =======================================================================================
+    def bin_num(self):
+        return len(self.edges) + 1
+
+    def bin_index(self, x):
+        """
+        Returns bin index (0 to len(edges)) of each value, index of NaN is not defined (see apply)
+        """
+        x = np.asarray(x, dtype=float)
+        if len(self.edges) <= Binner.__scan_max_edges:
+            # Counting edges passed is faster than binary search for a few edges
+            index = np.zeros(x.shape, dtype=np.intp)
+            for edge, closed in zip(self.edges, self.closed):
+                index += (x >= edge) if closed == 'left' else (x > edge)
+            return index
+        index = np.searchsorted(self.edges, x, side='left')
+        if len(self.__left_edges) > 0:
+            index += np.searchsorted(self.__left_edges, x, side='right') \
+                     - np.searchsorted(self.__left_edges, x, side='left')
+        return index
+
+    def apply(self, x):
+        """
+        Returns label of bin of each value (array), nan_label for NaN
+        """
+        x = np.asarray(x, dtype=float)
+        result = self.labels[self.bin_index(x)]
+        nan = np.isnan(x)
+        return np.where(nan, self.nan_label, result) if nan.any() else result
+
+    # =======================================================================================
+    # END: Public methods
+    # =======================================================================================
+
+
+class CodeTable():
+
+    def __init__(self, table, *binners, nan_code=0):
+        """
+        param: table, n-dimensional array of codes, size of dimension i = number of bins of binners[i]
+        param: binners, Binner of each input
+        param: nan_code, code of bars which any input is NaN
+        """
+        self.table = np.asarray(table)
+        self.binners = binners
+        shape = tuple(binner.bin_num() for binner in binners)
+        if self.table.shape != shape:
+            raise ValueError('Shape of code table must be {} (number of bins of each input), got {}'
+                             .format(shape, self.table.shape))
+        self.nan_code = nan_code
+
+    # =======================================================================================
+    # BEGIN: Public methods
+    # =======================================================================================
+    def apply(self, *values):
+        """
+        Returns code of each bar (array) from values of each input, nan_code when any input is NaN
+        """
+        if len(values) != len(self.binners):
+            raise ValueError('Code table requires {} inputs, got {}'.format(len(self.binners), len(values)))
+        values = [np.asarray(value, dtype=float) for value in values]
+        result = self.table[tuple(binner.bin_index(value) for binner, value in zip(self.binners, values))]
+        nan = np.logical_or.reduce([np.isnan(value) for value in values])
+        return np.where(nan, self.nan_code, result) if nan.any() else result
+
+    # =======================================================================================
+    # END: Public methods
+    # =======================================================================================
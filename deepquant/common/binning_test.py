@@ -0,0 +1,49 @@
+import unittest
+
+import numpy as np
+
+from deepquant.common.binning import Binner, CodeTable
+from deepquant.common.dq_indi import DQIndi
+
+
+class TestBinning(unittest.TestCase):
+
+    def test_binner_closed_side(self):
+        x = np.array([0.0, 1.0, 1.5, 2.0, 3.0, np.nan])
+        self.assertEqual(Binner([1, 2]).apply(x).tolist(), [1, 1, 2, 2, 3, 0])
+        self.assertEqual(Binner([1, 2], closed='left').apply(x).tolist(), [1, 2, 2, 3, 3, 0])
+        self.assertEqual(Binner([0, 0], labels=[-1, 0, 1], closed=['left', 'right'], nan_label=9)
+                         .apply([-0.5, 0.0, 0.5, np.nan]).tolist(), [-1, 0, 1, 9])
+
+        # Binary search (more than 16 edges) gives same bins as counting edges
+        edges = np.arange(20.0)
+        closed = ['left', 'right'] * 10
+        x = np.arange(-10, 410) / 20.0
+        expected = sum(((x >= e) if c == 'left' else (x > e)).astype(int) for e, c in zip(edges, closed))
+        self.assertEqual(Binner(edges, closed=closed).bin_index(x).tolist(), expected.tolist())
+
+    def test_code_table(self):
+        sign = Binner([0, 0], closed=['left', 'right'])
+        table = CodeTable([[4, 3, 2, 1], [0, 0, 0, 0], [5, 6, 7, 8]], sign, Binner([1, 2, 4]))
+        diff = np.array([-5.0, -1.5, -0.5, 0.0, 0.5, 2.0, 9.0, np.nan])
+        self.assertEqual(table.apply(diff, np.abs(diff)).tolist(), [1, 3, 4, 0, 5, 6, 8, 0])
+
+    def test_invalid_table(self):
+        with self.assertRaises(ValueError):
+            Binner([2, 1])
+        with self.assertRaises(ValueError):
+            Binner([1, 2], labels=[1, 2])
+        with self.assertRaises(ValueError):
+            CodeTable([[1, 2], [3, 4]], Binner([1, 2]), Binner([1]))
+
+    def test_dq_indi_codes(self):
+        signal = np.array([np.nan, -5.0, -4.0, -3.0, -2.0, 0.0, 2.0, 3.0, 4.0, 5.0])
+        self.assertEqual(DQIndi.macd_momentum_code(signal, 2, 4, -2, -4).tolist(), [0, 3, 2, 2, 1, 1, 1, 2, 2, 3])
+
+        ma_short = np.array([np.nan, 10.0, 10.0, 10.0, 10.0, 10.0, 10.0])
+        ma_long = np.array([10.0, 10.0, 9.5, 8.0, 5.0, 10.5, 15.0])
+        self.assertEqual(DQIndi.ma_volatility_code(ma_short, ma_long, 1, 2, 4).tolist(), [0, 0, 5, 7, 8, 1, 4])
+
+
+if __name__ == '__main__':
+    unittest.main()
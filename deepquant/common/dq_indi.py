@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import talib
 
@@ -5,8 +6,17 @@ import warnings
 
 warnings.simplefilter(action="ignore", category=RuntimeWarning)
 
+import deepquant.common.precision as precision
+from deepquant.common.binning import Binner, CodeTable
 from deepquant.common.felib import FELib
 
+# RSI - MACD Code: round((rsi code + macd code) / 2) with .5 rounded up, row = rsi code 1 - 4, column = macd code 1 - 4
+RSI_MACD_CODE_TABLE = CodeTable([[1.0, 2.0, 2.0, 3.0]
+                                 , [2.0, 2.0, 3.0, 3.0]
+                                 , [2.0, 3.0, 3.0, 4.0]
+                                 , [3.0, 3.0, 4.0, 4.0]]
+                                , Binner([1, 2, 3]), Binner([1, 2, 3]))
+
 
 class DQIndi():
     """
@@ -22,45 +32,55 @@ class DQIndi():
     เช่น
         1) GOLD ทั่วไปมีทศนิยม 2 ตำแหน่ง ดังนั้น digits_num มีค่าเท่ากับ 10 ยกกำลัง (2-1) = 10
         2) EURUSD ทั่วไปมีทศนิยม 5 ตำแหน่ง ดังนั้น digits_num มีค่าเท่ากับ 10 ยกกำลัง (5-1) = 10
+
+    ทุก code รับ parameter graph (IndiGraph, deepquant/common/indi_graph.py) ได้
+    เมื่อส่ง graph เดียวกันให้หลาย code ในรอบการคำนวณเดียวกัน indicator พื้นฐาน (talib, FELib.hhv/llv)
+    ที่มี input และ parameter เหมือนกันจะถูกคำนวณเพียงครั้งเดียว เช่น talib.MACD ใน trend_code และ rsi_macd_code
+
+    ผลลัพธ์ของ indicator พื้นฐานเป็น dtype ตาม precision mode (deepquant/common/precision.py)
+
+    code ที่แบ่งช่วงของค่า (price channel, macd momentum, ma volatility) และ code แบบ composite (rsi - macd)
+    ใช้ Binner และ CodeTable (deepquant/common/binning.py) แทน iif ซ้อนกัน ขอบของช่วงจึงต้องเรียงจากน้อยไปมาก
     """
 
     # ==============================================================================================================================
     @staticmethod
-    def price_channel_code(digits_num, p_high, p_low, period, channel1_val, channel2_val):
+    def __compute(graph, func, *args):
+        # talib requires float64 input, results are in dtype of precision mode
+        func = precision.wrap(func)
+        return func(*args) if graph is None else graph.get(func, *args)
+
+    # ==============================================================================================================================
+    @staticmethod
+    def price_channel_code(digits_num, p_high, p_low, period, channel1_val, channel2_val, graph=None):
         # INDI: Price Channel Code
-        HighestHigh = FELib.hhv(p_high, period) * digits_num
-        LowestLow = FELib.llv(p_low, period) * digits_num
+        HighestHigh = DQIndi.__compute(graph, FELib.hhv, p_high, period) * digits_num
+        LowestLow = DQIndi.__compute(graph, FELib.llv, p_low, period) * digits_num
         HighLowRange = HighestHigh - LowestLow
 
-        channel1 = pd.Series([channel1_val] * len(HighLowRange))
-        channel2 = pd.Series([channel2_val] * len(HighLowRange))
-
-        channelColorCode = FELib.iif(HighLowRange <= channel1 \
-                                     , 1 \
-                                     , FELib.iif((HighLowRange > channel1) & (HighLowRange <= channel2), 2, 3))
-
-        channelColorCode = pd.Series(channelColorCode)
-        return channelColorCode
+        # HighLowRange <= channel1: 1, channel1 < HighLowRange <= channel2: 2, otherwise (including NaN): 3
+        channelColorCode = Binner([channel1_val, channel2_val], nan_label=3).apply(HighLowRange)
+        return pd.Series(channelColorCode)
 
     # ==============================================================================================================================
     @staticmethod
     def sideway_code(digits_num, channel_code, p_close, channel_range1, channel_range2, channel_range3 \
-                    , ma, stddev_ma_period, ma_stddev_const, ma_hl_period, ma_close_period1, ma_close_period2):
+                    , ma, stddev_ma_period, ma_stddev_const, ma_hl_period, ma_close_period1, ma_close_period2, graph=None):
         # INDI: Sideway Code
         diffLevel = FELib.iif(channel_code == 1, channel_range1 \
                               , FELib.iif(channel_code == 2, channel_range2, channel_range3))
 
-        ma3Stdev = talib.STDDEV(ma, stddev_ma_period) * digits_num
+        ma3Stdev = DQIndi.__compute(graph, talib.STDDEV, ma, stddev_ma_period) * digits_num
 
         maStdevLevel = FELib.iif(channel_code == 1, ma_stddev_const \
                                  , FELib.iif(channel_code == 2, ma_stddev_const * 2, ma_stddev_const * 3))
 
-        sidewayCode = FELib.iif((((ma - FELib.llv(ma, ma_hl_period)) * digits_num < diffLevel / 2.5) \
-                                | ((FELib.hhv(ma, ma_hl_period) - ma) * digits_num < diffLevel / 2.5)) \
+        sidewayCode = FELib.iif((((ma - DQIndi.__compute(graph, FELib.llv, ma, ma_hl_period)) * digits_num < diffLevel / 2.5) \
+                                | ((DQIndi.__compute(graph, FELib.hhv, ma, ma_hl_period) - ma) * digits_num < diffLevel / 2.5)) \
                                 & (ma3Stdev < maStdevLevel) \
-                                & (abs(ma - talib.SMA(p_close, ma_close_period1)) * digits_num < diffLevel), 2, 1)
+                                & (abs(ma - DQIndi.__compute(graph, talib.SMA, p_close, ma_close_period1)) * digits_num < diffLevel), 2, 1)
 
-        sidewayCode = FELib.iif(abs(talib.EMA(p_close, ma_close_period2) - ma) * digits_num < diffLevel / 2, 2, sidewayCode)
+        sidewayCode = FELib.iif(abs(DQIndi.__compute(graph, talib.EMA, p_close, ma_close_period2) - ma) * digits_num < diffLevel / 2, 2, sidewayCode)
         return sidewayCode
 
     # ==============================================================================================================================
@@ -68,13 +88,13 @@ class DQIndi():
     def trend_code(channel_code, p_close, macd1_short_period, macd1_long_period, macd1_signal_period \
                     , macd2_short_period, macd2_long_period, macd2_signal_period \
                     , macd3_short_period, macd3_long_period, macd3_signal_period \
-                    , rolling_period1, rolling_period2, rolling_period3, ma):
+                    , rolling_period1, rolling_period2, rolling_period3, ma, graph=None):
         # INDI: Trend Code
-        MACDLarge1, MACDSignalLarge1, MACDHist1 = talib.MACD(p_close, macd1_short_period, macd1_long_period, macd1_signal_period)
+        MACDLarge1, MACDSignalLarge1, MACDHist1 = DQIndi.__compute(graph, talib.MACD, p_close, macd1_short_period, macd1_long_period, macd1_signal_period)
         if macd2_short_period > 0:
-            MACDLarge2, MACDSignalLarge2, MACDHist2 = talib.MACD(p_close, macd2_short_period, macd2_long_period, macd2_signal_period)
+            MACDLarge2, MACDSignalLarge2, MACDHist2 = DQIndi.__compute(graph, talib.MACD, p_close, macd2_short_period, macd2_long_period, macd2_signal_period)
         if macd3_short_period > 0:
-            MACDLarge3, MACDSignalLarge3, MACDHist3 = talib.MACD(p_close, macd3_short_period, macd3_long_period, macd3_signal_period)
+            MACDLarge3, MACDSignalLarge3, MACDHist3 = DQIndi.__compute(graph, talib.MACD, p_close, macd3_short_period, macd3_long_period, macd3_signal_period)
 
         if macd2_short_period > 0 and macd3_short_period > 0:
             MACDLarge = FELib.iif(channel_code == 1, MACDLarge1, FELib.iif(channel_code == 2, MACDLarge2, MACDLarge3))
@@ -87,9 +107,9 @@ class DQIndi():
         rolling = FELib.iif(channel_code == 1, rolling_period1 \
                             , FELib.iif(channel_code == 2, rolling_period2, rolling_period3))
 
-        trendCode = FELib.iif((ma <= talib.SMA(ma, rolling[0])) & (MACDLarge < MACDSignalLarge) \
-                              , 2, FELib.iif((ma <= talib.SMA(ma, rolling[0])) & (MACDLarge >= MACDSignalLarge) \
-                                             , 1, FELib.iif((ma >= talib.SMA(ma, rolling[0])) & (MACDLarge > MACDSignalLarge), 4, 3)))
+        trendCode = FELib.iif((ma <= DQIndi.__compute(graph, talib.SMA, ma, rolling[0])) & (MACDLarge < MACDSignalLarge) \
+                              , 2, FELib.iif((ma <= DQIndi.__compute(graph, talib.SMA, ma, rolling[0])) & (MACDLarge >= MACDSignalLarge) \
+                                             , 1, FELib.iif((ma >= DQIndi.__compute(graph, talib.SMA, ma, rolling[0])) & (MACDLarge > MACDSignalLarge), 4, 3)))
         return trendCode
 
     # ==============================================================================================================================
@@ -97,16 +117,16 @@ class DQIndi():
     def rsi_macd_code(channel_code, p_close, rsi_period, ma_rsi_period \
                     , macd1_short_period, macd1_long_period, macd1_signal_period \
                     , macd2_short_period, macd2_long_period, macd2_signal_period \
-                    , macd3_short_period, macd3_long_period, macd3_signal_period):
+                    , macd3_short_period, macd3_long_period, macd3_signal_period, graph=None):
         # INDI: RSI - MACD Code
-        MA_RSI = talib.SMA(talib.RSI(p_close, rsi_period), ma_rsi_period)
+        MA_RSI = DQIndi.__compute(graph, talib.SMA, DQIndi.__compute(graph, talib.RSI, p_close, rsi_period), ma_rsi_period)
         rsiCode = FELib.iif(MA_RSI <= 50 \
-                            , FELib.iif(MA_RSI >= talib.SMA(MA_RSI, 10), 1, 2) \
-                            , FELib.iif(MA_RSI <= talib.SMA(MA_RSI, 10), 3, 4))
+                            , FELib.iif(MA_RSI >= DQIndi.__compute(graph, talib.SMA, MA_RSI, 10), 1, 2) \
+                            , FELib.iif(MA_RSI <= DQIndi.__compute(graph, talib.SMA, MA_RSI, 10), 3, 4))
 
-        MACDLarge1, MACDSignalLarge1, MACDHist1 = talib.MACD(p_close, macd1_short_period, macd1_long_period, macd1_signal_period)
-        MACDLarge2, MACDSignalLarge2, MACDHist2 = talib.MACD(p_close, macd2_short_period, macd2_long_period, macd2_signal_period)
-        MACDLarge3, MACDSignalLarge3, MACDHist3 = talib.MACD(p_close, macd3_short_period, macd3_long_period, macd3_signal_period)
+        MACDLarge1, MACDSignalLarge1, MACDHist1 = DQIndi.__compute(graph, talib.MACD, p_close, macd1_short_period, macd1_long_period, macd1_signal_period)
+        MACDLarge2, MACDSignalLarge2, MACDHist2 = DQIndi.__compute(graph, talib.MACD, p_close, macd2_short_period, macd2_long_period, macd2_signal_period)
+        MACDLarge3, MACDSignalLarge3, MACDHist3 = DQIndi.__compute(graph, talib.MACD, p_close, macd3_short_period, macd3_long_period, macd3_signal_period)
 
         MACDLarge = FELib.iif(channel_code == 1, MACDLarge1, FELib.iif(channel_code == 2, MACDLarge2, MACDLarge3))
         MACDSignalLarge = FELib.iif(channel_code == 1, MACDSignalLarge1 \
@@ -116,14 +136,14 @@ class DQIndi():
                              , FELib.iif(MACDSignalLarge >= 0, 1, 2) \
                              , FELib.iif(MACDSignalLarge < 0, 3, 4))
 
-        rsiMacdCode = FELib.round_num((rsiCode + macdCode) / 2, 0)
+        rsiMacdCode = RSI_MACD_CODE_TABLE.apply(rsiCode, macdCode)
         return rsiMacdCode
 
     # ==============================================================================================================================
     @staticmethod
-    def macd_code(p_close, short_period, long_period, signal_period, muliplier):
+    def macd_code(p_close, short_period, long_period, signal_period, muliplier, graph=None):
         # INDI: MACD Code
-        MACDSuperLarge, MACDSignalSuperLarge, MACDHistSuperLarge = talib.MACD(p_close \
+        MACDSuperLarge, MACDSignalSuperLarge, MACDHistSuperLarge = DQIndi.__compute(graph, talib.MACD, p_close \
                                         , short_period, long_period, signal_period)
         MACDSuperLarge = MACDSuperLarge * muliplier
         MACDSignalSuperLarge = MACDSignalSuperLarge * muliplier
@@ -136,15 +156,15 @@ class DQIndi():
     # ==============================================================================================================================
     @staticmethod
     def atr_code(p_high, p_low, p_close, period, ma_period1, ma_period2, ma_period3, ma_period4 \
-            , hl_period, multiplier):
+            , hl_period, multiplier, graph=None):
         # INDI: MA - ATR Code
-        MA_ATR_Original = talib.EMA(talib.EMA(talib.ATR(p_high, p_low, p_close, period), ma_period1) \
+        MA_ATR_Original = DQIndi.__compute(graph, talib.EMA, DQIndi.__compute(graph, talib.EMA, DQIndi.__compute(graph, talib.ATR, p_high, p_low, p_close, period), ma_period1) \
                                     , ma_period2) * multiplier
-        MA_ATR = talib.EMA(MA_ATR_Original, ma_period3)
+        MA_ATR = DQIndi.__compute(graph, talib.EMA, MA_ATR_Original, ma_period3)
 
-        atrCode = FELib.iif(MA_ATR <= talib.SMA(MA_ATR, ma_period4) \
-                            , FELib.iif(MA_ATR != FELib.llv(MA_ATR, hl_period ), 1, 2) \
-                            , FELib.iif(MA_ATR != FELib.hhv(MA_ATR, hl_period ), 3, 4))
+        atrCode = FELib.iif(MA_ATR <= DQIndi.__compute(graph, talib.SMA, MA_ATR, ma_period4) \
+                            , FELib.iif(MA_ATR != DQIndi.__compute(graph, FELib.llv, MA_ATR, hl_period ), 1, 2) \
+                            , FELib.iif(MA_ATR != DQIndi.__compute(graph, FELib.hhv, MA_ATR, hl_period ), 3, 4))
         return atrCode
 
     # ==============================================================================================================================
@@ -152,13 +172,13 @@ class DQIndi():
     def highlow_zone_code(channel_code, p_close, macd1_short_period, macd1_long_period, macd1_signal_period \
                             , macd2_short_period, macd2_long_period, macd2_signal_period \
                             , macd3_short_period, macd3_long_period, macd3_signal_period \
-                            , large_stochd, ma_large_stochd, highlow_upper_zone, highlow_lower_zone):
+                            , large_stochd, ma_large_stochd, highlow_upper_zone, highlow_lower_zone, graph=None):
         # INDI: High / Low Zone Code
-        MACDLarge1, MACDSignalLarge1, MACDHist1 = talib.MACD(p_close, macd1_short_period, macd1_long_period, macd1_signal_period)
+        MACDLarge1, MACDSignalLarge1, MACDHist1 = DQIndi.__compute(graph, talib.MACD, p_close, macd1_short_period, macd1_long_period, macd1_signal_period)
         if macd2_short_period > 0:
-            MACDLarge2, MACDSignalLarge2, MACDHist2 = talib.MACD(p_close, macd2_short_period, macd2_long_period, macd2_signal_period)
+            MACDLarge2, MACDSignalLarge2, MACDHist2 = DQIndi.__compute(graph, talib.MACD, p_close, macd2_short_period, macd2_long_period, macd2_signal_period)
         if macd3_short_period > 0:
-            MACDLarge3, MACDSignalLarge3, MACDHist3 = talib.MACD(p_close, macd3_short_period, macd3_long_period, macd3_signal_period)
+            MACDLarge3, MACDSignalLarge3, MACDHist3 = DQIndi.__compute(graph, talib.MACD, p_close, macd3_short_period, macd3_long_period, macd3_signal_period)
 
         if macd2_short_period > 0 and macd3_short_period > 0:
             MACDLarge = FELib.iif(channel_code == 1, MACDLarge1, FELib.iif(channel_code == 2, MACDLarge2, MACDLarge3))
@@ -172,7 +192,7 @@ class DQIndi():
                              , FELib.iif(MACDSignalLarge >= 0, 1, 2) \
                              , FELib.iif(MACDSignalLarge < 0, 3, 4))
 
-        MA_Cur_Large_StochD = talib.SMA(large_stochd, ma_large_stochd)
+        MA_Cur_Large_StochD = DQIndi.__compute(graph, talib.SMA, large_stochd, ma_large_stochd)
 
         HighLowZoneCode = FELib.iif((MA_Cur_Large_StochD < highlow_lower_zone) & (MACDCode == 2) \
                                     , 1, FELib.iif((MA_Cur_Large_StochD > highlow_upper_zone) & ((MACDCode == 3) | (MACDCode == 4)), 3, 2))
@@ -181,16 +201,16 @@ class DQIndi():
     # ==============================================================================================================================
     @staticmethod
     def refine_trend_code(p_close, trend_code, channel_code, sideway_code \
-                            , ma_short, ma_long, period1, period2, period3):
+                            , ma_short, ma_long, period1, period2, period3, graph=None):
         # INDI: Refined Trend Code
-        trend_code = FELib.iif((trend_code == 4) & (talib.SMA(p_close, period2) < talib.SMA(ma_short, period2)), 3, trend_code)
-        trend_code = FELib.iif((trend_code == 4) & (talib.SMA(p_close, period2) < talib.SMA(ma_long, period2)) \
-                              & (talib.SMA(p_close, period3) < talib.SMA(ma_short, period3)), 3, trend_code)
-        trend_code = FELib.iif((trend_code == 4) & (talib.SMA(p_close, period1) < talib.SMA(ma_long, period1)), 3, trend_code)
-        trend_code = FELib.iif((trend_code == 2) & (talib.SMA(p_close, period2) > talib.SMA(ma_short, period2)), 1, trend_code)
-        trend_code = FELib.iif((trend_code == 2) & (talib.SMA(p_close, period2) > talib.SMA(ma_long, period2)) \
-                              & (talib.SMA(p_close, period3) > talib.SMA(ma_short, period3)), 1, trend_code)
-        trend_code = FELib.iif((trend_code == 2) & (talib.SMA(p_close, period1) > talib.SMA(ma_long, period1)), 1, trend_code)
+        trend_code = FELib.iif((trend_code == 4) & (DQIndi.__compute(graph, talib.SMA, p_close, period2) < DQIndi.__compute(graph, talib.SMA, ma_short, period2)), 3, trend_code)
+        trend_code = FELib.iif((trend_code == 4) & (DQIndi.__compute(graph, talib.SMA, p_close, period2) < DQIndi.__compute(graph, talib.SMA, ma_long, period2)) \
+                              & (DQIndi.__compute(graph, talib.SMA, p_close, period3) < DQIndi.__compute(graph, talib.SMA, ma_short, period3)), 3, trend_code)
+        trend_code = FELib.iif((trend_code == 4) & (DQIndi.__compute(graph, talib.SMA, p_close, period1) < DQIndi.__compute(graph, talib.SMA, ma_long, period1)), 3, trend_code)
+        trend_code = FELib.iif((trend_code == 2) & (DQIndi.__compute(graph, talib.SMA, p_close, period2) > DQIndi.__compute(graph, talib.SMA, ma_short, period2)), 1, trend_code)
+        trend_code = FELib.iif((trend_code == 2) & (DQIndi.__compute(graph, talib.SMA, p_close, period2) > DQIndi.__compute(graph, talib.SMA, ma_long, period2)) \
+                              & (DQIndi.__compute(graph, talib.SMA, p_close, period3) > DQIndi.__compute(graph, talib.SMA, ma_short, period3)), 1, trend_code)
+        trend_code = FELib.iif((trend_code == 2) & (DQIndi.__compute(graph, talib.SMA, p_close, period1) > DQIndi.__compute(graph, talib.SMA, ma_long, period1)), 1, trend_code)
 
         trend_code = FELib.iif((channel_code == 1) & (sideway_code == 2) & (ma_short < ma_long) & (trend_code == 4), 3, trend_code)
         trend_code = FELib.iif((channel_code == 1) & (sideway_code == 2) & (ma_short > ma_long) & (trend_code == 2), 1, trend_code)
@@ -199,30 +219,22 @@ class DQIndi():
     # ==============================================================================================================================
     @staticmethod
     def macd_momentum_code(macd_signal, upper_level1, upper_level2, lower_level1, lower_level2):
-        MACDMomentumCode = FELib.iif((macd_signal >= lower_level1) & (macd_signal <= upper_level1), 1, 0)
-        MACDMomentumCode = FELib.iif((MACDMomentumCode == 0)
-                                     & (((macd_signal > upper_level1) & (macd_signal <= upper_level2))
-                                        | ((macd_signal >= lower_level2) & (macd_signal < lower_level1)))
-                                     , 2, MACDMomentumCode)
-        MACDMomentumCode = FELib.iif((MACDMomentumCode == 0) & ((macd_signal > upper_level2) | (macd_signal < lower_level2))
-                                     , 3, MACDMomentumCode)
+        # [lower_level1, upper_level1]: 1, [lower_level2, lower_level1) and (upper_level1, upper_level2]: 2
+        # < lower_level2 and > upper_level2: 3, NaN: 0
+        MACDMomentumCode = Binner([lower_level2, lower_level1, upper_level1, upper_level2], labels=[3, 2, 1, 2, 3]
+                                  , closed=['left', 'left', 'right', 'right']).apply(macd_signal)
         return MACDMomentumCode * 1.0
 
     # ==============================================================================================================================
     @staticmethod
     def ma_volatility_code(ma_short, ma_long, range1, range2, range3):
-        MAVolatilityCode = FELib.iif((ma_short > ma_long) & (ma_short - ma_long < range1), 5, 0)
-        MAVolatilityCode = FELib.iif((MAVolatilityCode == 0) & (ma_short > ma_long) & (ma_short - ma_long >= range1) & (ma_short - ma_long < range2)
-                                     , 6, MAVolatilityCode)
-        MAVolatilityCode = FELib.iif((MAVolatilityCode == 0) & (ma_short > ma_long) & (ma_short - ma_long >= range2) & (ma_short - ma_long < range3)
-                                     , 7, MAVolatilityCode)
-        MAVolatilityCode = FELib.iif((MAVolatilityCode == 0) & (ma_short > ma_long) & (ma_short - ma_long >= range3), 8, MAVolatilityCode)
-
-        MAVolatilityCode = FELib.iif((MAVolatilityCode == 0) & (ma_short < ma_long) & (ma_long - ma_short < range1), 1, MAVolatilityCode)
-        MAVolatilityCode = FELib.iif((MAVolatilityCode == 0) & (ma_short < ma_long) & (ma_long - ma_short >= range1) & (ma_long - ma_short < range2)
-                                     , 2, MAVolatilityCode)
-        MAVolatilityCode = FELib.iif((MAVolatilityCode == 0) & (ma_short < ma_long) & (ma_long - ma_short >= range2) & (ma_long - ma_short < range3)
-                                     , 3, MAVolatilityCode)
-        MAVolatilityCode = FELib.iif((MAVolatilityCode == 0) & (ma_short < ma_long) & (ma_long - ma_short >= range3), 4, MAVolatilityCode)
+        # Row: ma_short < ma_long, ma_short == ma_long, ma_short > ma_long
+        # Column: |ma_short - ma_long| < range1, [range1, range2), [range2, range3), >= range3
+        volatility_table = CodeTable([[1, 2, 3, 4]
+                                      , [0, 0, 0, 0]
+                                      , [5, 6, 7, 8]]
+                                     , Binner([0, 0], closed=['left', 'right'])
+                                     , Binner([range1, range2, range3], closed='left'))
+        diff = np.asarray(ma_short, dtype=float) - np.asarray(ma_long, dtype=float)
+        MAVolatilityCode = volatility_table.apply(diff, np.abs(diff))
         return MAVolatilityCode * 1.0
-
@@ -0,0 +1,224 @@
+import numpy as np
+import pandas as pd
+import talib
+
+import deepquant.common.precision as precision
+from deepquant.common.binning import Binner
+from deepquant.common.dq_indi import RSI_MACD_CODE_TABLE
+
+"""
+## Multi-symbol (2D) Indicators
+
+indicator และ code ของ DQIndi สำหรับหลาย symbol พร้อมกัน input เป็น matrix (bars x symbols) ที่เรียงตาม timestamp เดียวกัน
+(numpy 2D array หรือ DataFrame ที่มี index เป็น timestamp และ column เป็น symbol) คำนวณทุก symbol ในการเรียกครั้งเดียว
+แทนการสร้าง DataFrame และเรียก DQIndi ทีละ symbol
+* matrix ถูกเก็บแบบ column-major ราคาของแต่ละ symbol จึงต่อเนื่องกันใน memory
+* indicator แบบ recursive (EMA, MACD, RSI) และ talib อื่นๆ เรียก talib ต่อ column โดยตรง (ไม่มี overhead ของ DataFrame)
+* hhv/llv ใช้ rolling ของ DataFrame ทั้ง matrix ส่วนการเปรียบเทียบและเลือก code ทั้งหมดเป็น numpy ทั้ง matrix
+
+### Missing bars
+* bar ที่ราคาปิดของ symbol เป็น NaN คือ bar ที่ symbol นั้นไม่มีข้อมูล (เช่น ตลาดปิด)
+* ก่อนคำนวณ bar ของแต่ละ symbol จะถูกอัดให้ต่อกัน (compact) ตัด bar ที่ไม่มีข้อมูลออก แล้วกระจายกลับ (expand) หลังคำนวณ
+ผลลัพธ์ของแต่ละ symbol จึงเท่ากับการคำนวณด้วย DQIndi บนข้อมูลของ symbol นั้นเพียงตัวเดียว
+* bar ที่ไม่มีข้อมูลมีผลลัพธ์เป็น NaN (code จึงเป็น float)
+
+### FELib2D
+* sma, ema, macd, rsi, stddev: talib ของแต่ละ column
+* hhv, llv: เหมือน FELib.hhv, FELib.llv
+"""
+
+
+class FELib2D():
+
+    # =======================================================================================
+    # BEGIN: Public methods
+    # =======================================================================================
+    @staticmethod
+    def compact(valid, *arrays):
+        """
+        Returns (order, arrays) of which valid bars of each column are moved to the top in time order,
+        other rows are NaN. order is used by expand to move results back (None when all bars are valid).
+        Returned arrays are column-major, bars of each symbol are contiguous
+        """
+        if valid.all():
+            return None, [np.asfortranarray(arr, dtype=float) for arr in arrays]
+        # Work on transposed (symbols x bars) arrays, gathering along contiguous rows
+        order = np.argsort(~valid.T, axis=1, kind='stable')
+        padding = np.arange(valid.shape[0])[None, :] >= valid.sum(axis=0)[:, None]
+        packed = []
+        for arr in arrays:
+            arr = np.take_along_axis(np.ascontiguousarray(np.asarray(arr, dtype=float).T), order, axis=1)
+            arr[padding] = np.nan
+            packed.append(arr.T)
+        return order, packed
+
+    @staticmethod
+    def expand(valid, order, packed):
+        """
+        Returns compacted result moved back to original bars, NaN on invalid bars
+        """
+        if order is None:
+            return np.array(packed, dtype=float)
+        result = np.full(packed.T.shape, np.nan)
+        np.put_along_axis(result, order, np.ascontiguousarray(packed.T), axis=1)
+        result = result.T
+        result[~valid] = np.nan
+        return result
+
+    @staticmethod
+    def sma(x, period):
+        return FELib2D.__by_column(talib.SMA, x, period)
+
+    @staticmethod
+    def ema(x, period):
+        return FELib2D.__by_column(talib.EMA, x, period)
+
+    @staticmethod
+    def macd(x, fast_period, slow_period, signal_period):
+        """
+        Returns (macd, signal, hist) same as talib.MACD
+        """
+        return FELib2D.__by_column(talib.MACD, x, fast_period, slow_period, signal_period, output_num=3)
+
+    @staticmethod
+    def rsi(x, period):
+        return FELib2D.__by_column(talib.RSI, x, period)
+
+    @staticmethod
+    def stddev(x, period):
+        return FELib2D.__by_column(talib.STDDEV, x, period)
+
+    @staticmethod
+    def hhv(x, period):
+        return np.nan_to_num(pd.DataFrame(x).rolling(period, min_periods=1).max().to_numpy())
+
+    @staticmethod
+    def llv(x, period):
+        return np.nan_to_num(pd.DataFrame(x).fillna(0).rolling(period, min_periods=1).min().to_numpy())
+
+    # =======================================================================================
+    # END: Public methods
+    # =======================================================================================
+
+    @staticmethod
+    def __by_column(func, x, *args, output_num=1):
+        """
+        Apply talib function to each column of column-major matrix. Recursive indicators (EMA, RSI) can not be
+        vectorized across columns with numpy, talib on a contiguous column has no per-symbol DataFrame overhead
+        """
+        x = np.asfortranarray(x, dtype=float)
+        results = [np.full(x.shape, np.nan, order='F') for _ in range(output_num)]
+        for j in range(x.shape[1]):
+            if np.isnan(x[:, j]).all():
+                continue
+            output = func(x[:, j], *args)
+            for result, values in zip(results, output if output_num > 1 else [output]):
+                result[:, j] = values
+        return tuple(results) if output_num > 1 else results[0]
+
+
+class DQIndi2D():
+    """
+    DQIndi code ของหลาย symbol พร้อมกัน input ราคาเป็น matrix (bars x symbols) หรือ DataFrame
+    ผลลัพธ์เป็น matrix เดียวกัน (หรือ DataFrame ที่มี index และ column เหมือน input) และ NaN ใน bar ที่ไม่มีข้อมูล
+    """
+
+    # ==============================================================================================================================
+    @staticmethod
+    def __run(p_valid, func, *arrays):
+        """
+        Compact arrays by valid bars, run func on compacted arrays and expand result, keeps DataFrame index/columns
+        """
+        template = p_valid if isinstance(p_valid, pd.DataFrame) else None
+        valid = ~np.isnan(np.asarray(p_valid, dtype=float))
+        order, packed = FELib2D.compact(valid, *arrays)
+        result = precision.cast(FELib2D.expand(valid, order, np.asarray(func(*packed), dtype=float)))
+        if template is not None:
+            return pd.DataFrame(result, index=template.index, columns=template.columns)
+        return result
+
+    # ==============================================================================================================================
+    @staticmethod
+    def __select(channel_code, values1, values2, values3):
+        return np.where(channel_code == 1, values1, np.where(channel_code == 2, values2, values3))
+
+    # ==============================================================================================================================
+    @staticmethod
+    def __macd_large(channel_code, p_close, macd_params):
+        m1 = FELib2D.macd(p_close, *macd_params[0:3])
+        if macd_params[3] > 0 and macd_params[6] > 0:
+            m2 = FELib2D.macd(p_close, *macd_params[3:6])
+            m3 = FELib2D.macd(p_close, *macd_params[6:9])
+            return DQIndi2D.__select(channel_code, m1[0], m2[0], m3[0]), DQIndi2D.__select(channel_code, m1[1], m2[1], m3[1])
+        return m1[0], m1[1]
+
+    # ==============================================================================================================================
+    @staticmethod
+    def price_channel_code(digits_num, p_high, p_low, period, channel1_val, channel2_val):
+        def func(high, low):
+            high_low_range = (FELib2D.hhv(high, period) - FELib2D.llv(low, period)) * digits_num
+            return Binner([channel1_val, channel2_val], nan_label=3).apply(high_low_range)
+        return DQIndi2D.__run(p_high, func, p_high, p_low)
+
+    # ==============================================================================================================================
+    @staticmethod
+    def sideway_code(digits_num, channel_code, p_close, channel_range1, channel_range2, channel_range3 \
+                    , ma, stddev_ma_period, ma_stddev_const, ma_hl_period, ma_close_period1, ma_close_period2):
+        def func(channel_code, p_close, ma):
+            diff_level = DQIndi2D.__select(channel_code, channel_range1, channel_range2, channel_range3)
+            ma_stdev = FELib2D.stddev(ma, stddev_ma_period) * digits_num
+            ma_stdev_level = DQIndi2D.__select(channel_code, ma_stddev_const, ma_stddev_const * 2, ma_stddev_const * 3)
+            with np.errstate(invalid='ignore'):
+                code = np.where((((ma - FELib2D.llv(ma, ma_hl_period)) * digits_num < diff_level / 2.5)
+                                 | ((FELib2D.hhv(ma, ma_hl_period) - ma) * digits_num < diff_level / 2.5))
+                                & (ma_stdev < ma_stdev_level)
+                                & (np.abs(ma - FELib2D.sma(p_close, ma_close_period1)) * digits_num < diff_level), 2, 1)
+                return np.where(np.abs(FELib2D.ema(p_close, ma_close_period2) - ma) * digits_num < diff_level / 2
+                                , 2, code)
+        return DQIndi2D.__run(p_close, func, channel_code, p_close, ma)
+
+    # ==============================================================================================================================
+    @staticmethod
+    def trend_code(channel_code, p_close, macd1_short_period, macd1_long_period, macd1_signal_period \
+                    , macd2_short_period, macd2_long_period, macd2_signal_period \
+                    , macd3_short_period, macd3_long_period, macd3_signal_period \
+                    , rolling_period1, rolling_period2, rolling_period3, ma):
+        macd_params = [macd1_short_period, macd1_long_period, macd1_signal_period
+                       , macd2_short_period, macd2_long_period, macd2_signal_period
+                       , macd3_short_period, macd3_long_period, macd3_signal_period]
+
+        def func(channel_code, p_close, ma):
+            macd_large, macd_signal_large = DQIndi2D.__macd_large(channel_code, p_close, macd_params)
+            # Same as DQIndi: rolling period of each symbol is selected by channel code of its first bar
+            rolling = DQIndi2D.__select(channel_code[0], np.ravel(rolling_period1)[0], np.ravel(rolling_period2)[0]
+                                        , np.ravel(rolling_period3)[0])
+            ma_avg = np.full(ma.shape, np.nan)
+            for period in np.unique(rolling):
+                cols = rolling == period
+                ma_avg[:, cols] = FELib2D.sma(ma[:, cols], int(period))
+            with np.errstate(invalid='ignore'):
+                return np.where((ma <= ma_avg) & (macd_large < macd_signal_large), 2
+                                , np.where((ma <= ma_avg) & (macd_large >= macd_signal_large), 1
+                                           , np.where((ma >= ma_avg) & (macd_large > macd_signal_large), 4, 3)))
+        return DQIndi2D.__run(p_close, func, channel_code, p_close, ma)
+
+    # ==============================================================================================================================
+    @staticmethod
+    def rsi_macd_code(channel_code, p_close, rsi_period, ma_rsi_period \
+                    , macd1_short_period, macd1_long_period, macd1_signal_period \
+                    , macd2_short_period, macd2_long_period, macd2_signal_period \
+                    , macd3_short_period, macd3_long_period, macd3_signal_period):
+        macd_params = [macd1_short_period, macd1_long_period, macd1_signal_period
+                       , macd2_short_period, macd2_long_period, macd2_signal_period
+                       , macd3_short_period, macd3_long_period, macd3_signal_period]
+
+        def func(channel_code, p_close):
+            ma_rsi = FELib2D.sma(FELib2D.rsi(p_close, rsi_period), ma_rsi_period)
+            ma_ma_rsi = FELib2D.sma(ma_rsi, 10)
+            with np.errstate(invalid='ignore'):
+                rsi_code = np.where(ma_rsi <= 50, np.where(ma_rsi >= ma_ma_rsi, 1, 2), np.where(ma_rsi <= ma_ma_rsi, 3, 4))
+                macd_large, macd_signal_large = DQIndi2D.__macd_large(channel_code, p_close, macd_params)
+                macd_code = np.where(macd_large <= macd_signal_large, np.where(macd_signal_large >= 0, 1, 2)
+                                     , np.where(macd_signal_large < 0, 3, 4))
+            return RSI_MACD_CODE_TABLE.apply(rsi_code, macd_code)
+        return DQIndi2D.__run(p_close, func, channel_code, p_close)
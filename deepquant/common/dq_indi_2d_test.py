@@ -0,0 +1,79 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+import talib
+
+from deepquant.common.dq_indi import DQIndi
+from deepquant.common.dq_indi_2d import DQIndi2D, FELib2D
+
+MACD_PARAMS = [12, 26, 9, 24, 52, 18, 48, 104, 36]
+
+
+class TestDQIndi2D(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        bar_num, symbol_num = 1500, 5
+        self.close = 1500.0 + np.cumsum(rng.normal(0.0, 1.0, (bar_num, symbol_num)), axis=0)
+        self.high = self.close + rng.uniform(0.0, 2.0, (bar_num, symbol_num))
+        self.low = self.close - rng.uniform(0.0, 2.0, (bar_num, symbol_num))
+        # Random missing bars, symbol 2 starts late, symbol 4 ends early, symbol 0 has all bars
+        self.missing = rng.random((bar_num, symbol_num)) < 0.05
+        self.missing[:, 0] = False
+        self.missing[:50, 2] = True
+        self.missing[1400:, 4] = True
+        for arr in [self.close, self.high, self.low]:
+            arr[self.missing] = np.nan
+        self.ma = np.full(self.close.shape, np.nan)
+        for j in range(symbol_num):
+            valid = ~self.missing[:, j]
+            self.ma[valid, j] = talib.EMA(self.close[valid, j], 5)
+
+    def assert_same(self, actual, expected, msg=None):
+        np.testing.assert_allclose(actual, expected, rtol=0, atol=1e-8, equal_nan=True, err_msg=msg)
+
+    def test_primitives_same_as_talib(self):
+        close = self.close[:, 0]
+        x = np.column_stack([close, talib.RSI(close, 14)])
+        self.assert_same(FELib2D.sma(x, 10)[:, 1], talib.SMA(x[:, 1], 10))
+        self.assert_same(FELib2D.ema(x, 10)[:, 0], talib.EMA(close, 10))
+        self.assert_same(FELib2D.rsi(x, 14)[:, 0], talib.RSI(close, 14))
+        for actual, expected in zip(FELib2D.macd(x, 12, 26, 9), talib.MACD(close, 12, 26, 9)):
+            self.assert_same(actual[:, 0], expected)
+
+    def test_codes_same_as_dq_indi_per_symbol(self):
+        channel_code = DQIndi2D.price_channel_code(10.0, self.high, self.low, 20, 50, 100)
+        sideway_code = DQIndi2D.sideway_code(10.0, channel_code, self.close, 50, 100, 150, self.ma, 3, 5, 10, 20, 10)
+        trend_code = DQIndi2D.trend_code(channel_code, self.close, *MACD_PARAMS, [10], [20], [30], self.ma)
+        rsi_macd_code = DQIndi2D.rsi_macd_code(channel_code, self.close, 14, 5, *MACD_PARAMS)
+
+        for j in range(self.close.shape[1]):
+            valid = ~self.missing[:, j]
+            high, low, close, ma = self.high[valid, j], self.low[valid, j], self.close[valid, j], self.ma[valid, j]
+            expected_channel = DQIndi.price_channel_code(10.0, high, low, 20, 50, 100)
+            self.assert_same(channel_code[valid, j], expected_channel, msg=j)
+            self.assert_same(sideway_code[valid, j]
+                             , DQIndi.sideway_code(10.0, expected_channel, close, 50, 100, 150, ma, 3, 5, 10, 20, 10)
+                             , msg=j)
+            self.assert_same(trend_code[valid, j]
+                             , DQIndi.trend_code(expected_channel, close, *MACD_PARAMS, [10], [20], [30], ma), msg=j)
+            self.assert_same(rsi_macd_code[valid, j]
+                             , DQIndi.rsi_macd_code(expected_channel, close, 14, 5, *MACD_PARAMS), msg=j)
+            self.assertTrue(np.isnan(channel_code[~valid, j]).all())
+            self.assertTrue(np.isnan(rsi_macd_code[~valid, j]).all())
+
+    def test_dataframe_input(self):
+        index = pd.date_range('2020-01-01', periods=len(self.close), freq='15min')
+        columns = ['GOLD', 'EURUSD', 'USDJPY', 'GBPUSD', 'AUDUSD']
+        high = pd.DataFrame(self.high, index=index, columns=columns)
+        low = pd.DataFrame(self.low, index=index, columns=columns)
+        channel_code = DQIndi2D.price_channel_code(10.0, high, low, 20, 50, 100)
+        self.assertIsInstance(channel_code, pd.DataFrame)
+        self.assertTrue(channel_code.index.equals(index))
+        self.assertEqual(list(channel_code.columns), columns)
+        self.assert_same(channel_code.to_numpy(), DQIndi2D.price_channel_code(10.0, self.high, self.low, 20, 50, 100))
+
+
+if __name__ == '__main__':
+    unittest.main()
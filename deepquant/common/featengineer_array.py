@@ -0,0 +1,171 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+import deepquant.common.precision as precision
+from deepquant.common.binning import Binner, CodeTable
+
+
+# ======================================================================================================================
+# FeatEngineerArray: คือเวอร์ชัน array ของ FeatEngineer ที่คำนวณ feature ของทุก bar พร้อมกันในครั้งเดียว
+# * input เป็น series ที่เรียงตามเวลา (index 0 = bar เก่าสุด) ไม่ต้อง reverse เหมือน FeatEngineer
+# * ผลลัพธ์ที่ index t มีค่าเท่ากับการเรียกฟังก์ชันชื่อเดียวกันใน FeatEngineer ด้วย array ที่ reverse จาก bar t
+#   เช่น FeatEngineerArray.featMaxInRange(x, s, n)[t] == FeatEngineer.featMaxInRange(FeatEngineer.reverse(t, s + n, x), s, n)
+# * bar ที่มีข้อมูลย้อนหลังไม่พอ (t < startIndex + maxRange - 1) มีค่าเป็น NaN
+# * ฟังก์ชันแบบ window ใช้ sliding window view (max/min/stdev) หรือ cumulative sum (นับจำนวน) แทนการวนลูปต่อ bar
+# ======================================================================================================================
+class FeatEngineerArray:
+
+    # Number of rows of window matrix computed at once, limits memory of sliding window operations
+    __chunk_rows = 65536
+
+    # =================================================================================================================
+    # ตารางระดับของ *_scaling (deepquant/common/binning.py) ระดับของแต่ละช่วงตรงกับสูตร math.log ของ FeatEngineer ทุกค่า
+    # แถวคือเครื่องหมายของ diff (diff < 0, diff == 0, diff > 0) column คือช่วงของ |diff|
+    # =================================================================================================================
+    __diff_sign_bins = Binner([0, 0], closed=['left', 'right'])
+
+    # |diff|: 0, (0, 1], (1, 2], (2, 4], (4, 8], (8, 16], > 16
+    __diff_level_table = CodeTable([[6, 6, 5, 4, 3, 2, 1]
+                                    , [6, 6, 6, 6, 6, 6, 6]
+                                    , [6, 7, 8, 9, 10, 11, 12]]
+                                   , __diff_sign_bins, Binner([0, 1, 2, 4, 8, 16]))
+
+    # |diff|: 0, (0, 0.0125 / 128], (0.0125 / 128, 0.0125 / 64], ..., (0.4, 0.8], > 0.8
+    # ระดับต่อเนื่องตาม log scale ของ FeatEngineer ทั้งสองฝั่ง รวมถึง |diff| < 0.00625 (เช่น diff = -0.0001 ได้ระดับ 14)
+    __pricediff_level_table = CodeTable([[8] + list(range(15, 0, -1))
+                                         , [8] * 16
+                                         , [8] + list(range(2, 17))]
+                                        , __diff_sign_bins, Binner([0] + [0.0125 * 2 ** i for i in range(-7, 7)]))
+
+    # size: <= 0.0125, (0.0125, 0.025], (0.025, 0.05], (0.05, 0.1], (0.1, 0.2], > 0.2
+    __cdssize_bins = Binner([0.0125, 0.025, 0.05, 0.1, 0.2])
+
+    # =================================================================================================================
+    # Return ผลรวมใน window ขนาด maxRange ที่จบที่แต่ละ bar ของ arr (bool หรือตัวเลข) ด้วย cumulative sum
+    # =================================================================================================================
+    @staticmethod
+    def windowSum(arr, maxRange):
+        arr = np.asarray(arr, dtype=float)
+        result = np.full(arr.shape[0], np.nan)
+        if 0 < maxRange <= arr.shape[0]:
+            csum = np.concatenate(([0.0], np.cumsum(arr)))
+            result[maxRange - 1:] = csum[maxRange:] - csum[:-maxRange]
+        return precision.cast(result)
+
+    # =================================================================================================================
+    # Return ค่าของ func บน window ขนาด maxRange ที่จบก่อนแต่ละ bar ไป startIndex bar (sliding window view)
+    # =================================================================================================================
+    @staticmethod
+    def windowApply(arr, startIndex, maxRange, func):
+        arr = np.asarray(arr, dtype=float)
+        result = np.full(arr.shape[0], np.nan)
+        first = startIndex + maxRange - 1
+        if maxRange > 0 and first < arr.shape[0]:
+            windows = sliding_window_view(arr[:arr.shape[0] - startIndex], maxRange)
+            chunk_rows = FeatEngineerArray.__chunk_rows
+            for i in range(0, windows.shape[0], chunk_rows):
+                result[first + i:first + i + chunk_rows] = func(windows[i:i + chunk_rows])
+        return precision.cast(result)
+
+    # =================================================================================================================
+    # Return ค่าสูงสุดใน arr ตั้งแต่ startIndex bar ก่อนหน้าย้อนหลังกลับไปเท่ากับ maxRange ของทุก bar
+    # =================================================================================================================
+    @staticmethod
+    def featMaxInRange(arr, startIndex, maxRange):
+        return FeatEngineerArray.windowApply(arr, startIndex, max(maxRange, 1), lambda w: w.max(axis=1))
+
+    # =================================================================================================================
+    # Return ค่าต่ำสุดใน arr ตั้งแต่ startIndex bar ก่อนหน้าย้อนหลังกลับไปเท่ากับ maxRange ของทุก bar
+    # =================================================================================================================
+    @staticmethod
+    def featMinInRange(arr, startIndex, maxRange):
+        return FeatEngineerArray.windowApply(arr, startIndex, max(maxRange, 1), lambda w: w.min(axis=1))
+
+    # =================================================================================================================
+    # Return ค่าส่วนเบี่ยงเบนมาตรฐาน (population) ใน arr ตั้งแต่ startIndex bar ก่อนหน้าย้อนหลังกลับไปเท่ากับ maxRange
+    # ใช้สูตรสองรอบ (หาค่าเฉลี่ยก่อน) เหมือน FeatEngineer จึงไม่เสียความแม่นยำเมื่อราคาสูงแต่ผันผวนน้อย
+    # =================================================================================================================
+    @staticmethod
+    def featStDevInRange(arr, startIndex, maxRange):
+        def stdev(windows):
+            avg = windows.sum(axis=1) / maxRange
+            return np.sqrt(((windows - avg[:, None]) ** 2).sum(axis=1) / maxRange)
+        return FeatEngineerArray.windowApply(arr, startIndex, maxRange, stdev)
+
+    # =================================================================================================================
+    # Return 1 เมื่อพบค่าใน arr ย้อนหลังกลับไปเท่ากับ maxRange มีค่าสูงกว่า value, ถ้าไม่พบ return 0 ของทุก bar
+    # =================================================================================================================
+    @staticmethod
+    def foundHigherThan(arr, value, maxRange):
+        total = FeatEngineerArray.windowSum(np.asarray(arr, dtype=float) > value, maxRange)
+        return np.where(np.isnan(total), np.nan, total > 0)
+
+    # =================================================================================================================
+    # Return จำนวนแท่งเทียนสีเขียว (bullish) ย้อนหลังกลับไปเท่ากับ maxRange ของทุก bar
+    # =================================================================================================================
+    @staticmethod
+    def countBullishCds(priceOpens, priceCloses, maxRange):
+        return FeatEngineerArray.windowSum(np.asarray(priceCloses, dtype=float) > np.asarray(priceOpens, dtype=float)
+                                           , maxRange)
+
+    # =================================================================================================================
+    # Return จำนวนแท่งเทียน/เซสชั่น ของอิลิเม้นต์ใน arr1 ที่มีค่าสูงกว่าอิลิเม้นต์ใน arr2 ย้อนหลังกลับไปเท่ากับ maxRange
+    # =================================================================================================================
+    @staticmethod
+    def totalHigherThan(arr1, arr2, maxRange):
+        return FeatEngineerArray.windowSum(np.asarray(arr1, dtype=float) > np.asarray(arr2, dtype=float), maxRange)
+
+    # =================================================================================================================
+    # Return 1 เมื่อพบไส้เทียนบนยาวมากกว่าหรือเท่ากับ shadowSize ย้อนหลังกลับไปเท่ากับ maxRange ของทุก bar
+    # =================================================================================================================
+    @staticmethod
+    def foundLongUpperShadow(priceHighs, priceOpens, priceCloses, maxRange, shadowSize):
+        lowerBound = np.maximum(np.asarray(priceOpens, dtype=float), np.asarray(priceCloses, dtype=float))
+        total = FeatEngineerArray.windowSum(np.asarray(priceHighs, dtype=float) - lowerBound >= shadowSize, maxRange)
+        return np.where(np.isnan(total), np.nan, total > 0)
+
+    # =================================================================================================================
+    # Return level (ระดับ) ของ MACD ของทุก bar, ค่า NaN มี level เป็น 0 เหมือน FeatEngineer
+    # =================================================================================================================
+    @staticmethod
+    def macdLevelEqually(val, minVal, maxVal, maxLevel):
+        val = np.asarray(val, dtype=float)
+        highest = maxVal + abs(minVal) - 0.00001
+        with np.errstate(invalid='ignore'):
+            inner = (np.abs(minVal - val) / (highest / (maxLevel - 2)) + 2).astype(np.int64)
+        return np.select([val < minVal, val > maxVal, val == minVal, val == maxVal, (val > minVal) & (val < maxVal)]
+                         , [1, maxLevel, maxLevel - (maxLevel - 2), maxLevel - 1, inner], default=0)
+
+    # =================================================================================================================
+    # Return ค่าระดับความห่าง 1 ถึง 12 ระหว่าง stochastic %K กับ %D ของทุก bar (ดู FeatEngineer.stochdiff_scaling)
+    # =================================================================================================================
+    @staticmethod
+    def stochdiff_scaling(k, d):
+        diff = np.asarray(k, dtype=float) - np.asarray(d, dtype=float)
+        return FeatEngineerArray.__diff_level_table.apply(diff, np.abs(diff))
+
+    # =================================================================================================================
+    # Return ค่าระดับความห่าง 1 ถึง 12 ระหว่าง rsi กับ ma ของ rsi ของทุก bar (ดู FeatEngineer.rsidiff_scaling)
+    # =================================================================================================================
+    @staticmethod
+    def rsidiff_scaling(rsi, rsima):
+        diff = np.asarray(rsi, dtype=float) - np.asarray(rsima, dtype=float)
+        return FeatEngineerArray.__diff_level_table.apply(diff, np.abs(diff))
+
+    # =================================================================================================================
+    # Return ค่าระดับความห่าง 1 ถึง 16 ระหว่าง price1 กับ price2 ของทุก bar (ดู FeatEngineer.pricediff_scaling)
+    # =================================================================================================================
+    @staticmethod
+    def pricediff_scaling(price1, price2):
+        diff = np.round(np.asarray(price1, dtype=float) - np.asarray(price2, dtype=float), 4)
+        return FeatEngineerArray.__pricediff_level_table.apply(diff, np.abs(diff))
+
+    # =================================================================================================================
+    # Return ค่าขนาดแท่งเทียน 1 ถึง 6 ของทุก bar (ดู FeatEngineer.cdssize_scaling)
+    # =================================================================================================================
+    @staticmethod
+    def cdssize_scaling(price_open, price_close):
+        diff = np.round(np.abs(np.asarray(price_open, dtype=float) - np.asarray(price_close, dtype=float)), 4)
+        return FeatEngineerArray.__cdssize_bins.apply(diff)
+
+# END OF CLASS DEFINITION
@@ -0,0 +1,71 @@
+import unittest
+
+import numpy as np
+
+from deepquant.common.featengineer import FeatEngineer as fe
+from deepquant.common.featengineer_array import FeatEngineerArray as fea
+
+
+class TestFeatEngineerArray(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        total_bar = 300
+        self.closes = np.round(1500.0 + np.cumsum(rng.normal(0.0, 1.0, total_bar)), 1)
+        self.opens = np.round(np.append(self.closes[0], self.closes[:-1]) + rng.normal(0.0, 0.5, total_bar), 1)
+        self.highs = np.maximum(self.opens, self.closes) + np.round(rng.exponential(1.0, total_bar), 1)
+        self.macd = np.round(rng.normal(0.0, 4.0, total_bar), 1)
+        self.macd[[5, 6, 7]] = [-5.0, 5.0, np.nan]
+        self.stoch_k = np.round(rng.uniform(0.0, 100.0, total_bar), 1)
+        self.stoch_d = np.round(self.stoch_k + rng.normal(0.0, 12.0, total_bar), 1)
+        self.stoch_d[:10] = self.stoch_k[:10] + np.array([0.0, 1.0, -1.0, 2.0, -2.0, 16.0, -16.0, 32.0, -64.0, 0.5])
+
+    def assert_window_parity(self, result, scalar_func, window, *arrs):
+        self.assertTrue(np.all(np.isnan(result[:window - 1])))
+        for t in range(window - 1, len(result)):
+            expected = scalar_func(*[fe.reverse(t, window, arr) for arr in arrs])
+            self.assertAlmostEqual(result[t], expected, places=9, msg='bar {}'.format(t))
+
+    def test_window_parity(self):
+        for start_index, max_range in [(0, 1), (0, 5), (2, 10), (7, 3)]:
+            window = start_index + max_range
+            self.assert_window_parity(fea.featMaxInRange(self.closes, start_index, max_range)
+                                      , lambda x: fe.featMaxInRange(x, start_index, max_range), window, self.closes)
+            self.assert_window_parity(fea.featMinInRange(self.closes, start_index, max_range)
+                                      , lambda x: fe.featMinInRange(x, start_index, max_range), window, self.closes)
+            self.assert_window_parity(fea.featStDevInRange(self.closes, start_index, max_range)
+                                      , lambda x: fe.featStDevInRange(x, start_index, max_range), window, self.closes)
+
+        for max_range in [1, 4, 20]:
+            self.assert_window_parity(fea.foundHigherThan(self.closes, 1500.0, max_range)
+                                      , lambda x: fe.foundHigherThan(x, 1500.0, max_range), max_range, self.closes)
+            self.assert_window_parity(fea.countBullishCds(self.opens, self.closes, max_range)
+                                      , lambda o, c: fe.countBullishCds(o, c, max_range), max_range
+                                      , self.opens, self.closes)
+            self.assert_window_parity(fea.totalHigherThan(self.opens, self.closes, max_range)
+                                      , lambda x, y: fe.totalHigherThan(x, y, max_range), max_range
+                                      , self.opens, self.closes)
+            self.assert_window_parity(fea.foundLongUpperShadow(self.highs, self.opens, self.closes, max_range, 2.0)
+                                      , lambda h, o, c: fe.foundLongUpperShadow(h, o, c, max_range, 2.0), max_range
+                                      , self.highs, self.opens, self.closes)
+
+    def test_elementwise_parity(self):
+        levels = fea.macdLevelEqually(self.macd, -5, 5, 10)
+        self.assertEqual(levels.tolist(), [fe.macdLevelEqually(val, -5, 5, 10) for val in self.macd])
+
+        levels = fea.stochdiff_scaling(self.stoch_k, self.stoch_d)
+        self.assertEqual(levels.tolist(), [fe.stochdiff_scaling(k, d) for k, d in zip(self.stoch_k, self.stoch_d)])
+
+        levels = fea.rsidiff_scaling(self.stoch_k, self.stoch_d)
+        self.assertEqual(levels.tolist(), [fe.rsidiff_scaling(k, d) for k, d in zip(self.stoch_k, self.stoch_d)])
+
+    def test_scaling_parity_on_price_ticks(self):
+        # Every 4 decimal places diff from -1.2 to 1.2, including all bin edges
+        diffs = np.arange(-12000, 12001) / 10000.0
+        zeros = np.zeros(len(diffs))
+        self.assertEqual(fea.pricediff_scaling(diffs, zeros).tolist(), [fe.pricediff_scaling(x, 0.0) for x in diffs])
+        self.assertEqual(fea.cdssize_scaling(diffs, zeros).tolist(), [fe.cdssize_scaling(x, 0.0) for x in diffs])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,6 +3,8 @@ import pandas as pd
 import talib
 from talib import MA_Type
 
+import deepquant.common.precision as precision
+
 
 class FELib:
     """
@@ -20,7 +22,7 @@ class FELib:
                 series = pd.Series(series)
             series = series.fillna(0)
             result = series.rolling(period, min_periods=1).min()
-            result = np.nan_to_num(result)
+            result = precision.cast(np.nan_to_num(result))
         except Exception as e:
             raise e
         return result
@@ -32,7 +34,7 @@ class FELib:
                 series = pd.Series(series)
             # series = series.fillna(0)
             result = series.rolling(period, min_periods=1).max()
-            result = np.nan_to_num(result)
+            result = precision.cast(np.nan_to_num(result))
         except Exception as e:
             raise e
         return result
@@ -44,7 +46,7 @@ class FELib:
                 series = pd.Series(series)
             series = series.fillna(0)
             result = series.rolling(period, min_periods=1).mean()
-            result = np.nan_to_num(result)
+            result = precision.cast(np.nan_to_num(result))
         except Exception as e:
             raise e
         return result
@@ -56,7 +58,7 @@ class FELib:
                 series = pd.Series(series)
             series = series.fillna(0)
             result = series.rolling(period, min_periods=1).std(skipna=True)
-            result = np.nan_to_num(result)
+            result = precision.cast(np.nan_to_num(result))
         except Exception as e:
             raise e
         return result
@@ -94,26 +96,153 @@ class FELib:
         return result
 
     @staticmethod
-    def llvbars(series, period):
-        if type(series) == np.ndarray:
+    def window_argmin(values, period):
+        """
+        Returns position of lowest value (first one on ties, same as np.argmin) in window of period bars ending at
+        every bar, -1 for first period - 1 bars. Runs in O(n) for any period (van Herk/Gil-Werman algorithm):
+        window is suffix of one block of period bars plus prefix of next block, prefix/suffix minimums of every block
+        are computed once with numpy accumulate.
+        """
+        values = np.asarray(values, dtype=float)
+        n = values.shape[0]
+        result = np.full(n, -1, dtype=np.int64)
+        if period < 1 or n < period:
+            return result
+
+        # Pad to whole blocks, padding is never the minimum of any window
+        block_num = -(-n // period)
+        padded = np.full(block_num * period, np.inf)
+        padded[:n] = values
+        blocks = padded.reshape(block_num, period)
+        pos = np.arange(block_num * period)
+        in_block = pos % period
+
+        # Prefix minimum (left to right), position is last position that set a new (strictly lower) minimum
+        prefix_min = np.minimum.accumulate(blocks, axis=1).ravel()
+        prev_min = np.concatenate(([np.inf], prefix_min[:-1]))
+        new_min = (in_block == 0) | (padded < prev_min)
+        prefix_pos = np.maximum.accumulate(np.where(new_min, pos, -1))
+
+        # Suffix minimum (right to left), position is first position that set a new (lower or equal) minimum
+        suffix_min = np.minimum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+        next_min = np.concatenate((suffix_min[1:], [np.inf]))
+        new_min = (in_block == period - 1) | (padded <= next_min)
+        suffix_pos = np.minimum.accumulate(np.where(new_min, pos, pos.shape[0])[::-1])[::-1]
+
+        # Window [t - period + 1, t], earlier part (suffix) wins on ties
+        t = np.arange(period - 1, n)
+        start = t - period + 1
+        result[period - 1:] = np.where(suffix_min[start] <= prefix_min[t], suffix_pos[start], prefix_pos[t])
+        return result
+
+    @staticmethod
+    def __bars_index(series, period_list, sign):
+        if type(series) != pd.Series:
             series = pd.Series(series)
-        series = series.fillna(0)
-        min_idx = series.index[series.rolling(period).apply(np.argmin, raw=True)[(period - 1):].astype(int) + np.arange(len(series) - (period - 1))]
-        out = [0] * len(series)
-        out[len(out) - len(min_idx):len(out) + len(min_idx) - 1] = min_idx
-        out = np.nan_to_num(out)
-        return pd.Series(out)
+        values = series.fillna(0).to_numpy(dtype=float) * sign
+        labels = series.index.to_numpy()
+        results = {}
+        for period in period_list:
+            min_pos = FELib.window_argmin(values, period)
+            # Integer index keeps its dtype, other labels (e.g. string, Timestamp) are kept in object array
+            out = np.zeros(len(series), dtype=labels.dtype if labels.dtype.kind in 'iu' else object)
+            out[period - 1:] = labels[min_pos[period - 1:]]
+            results[period] = out
+        return results
+
+    @staticmethod
+    def llvbars_multi(series, period_list):
+        """
+        Returns dictionary of period and index (of series) of lowest bar in last period bars of every bar,
+        all periods are computed from one converted array
+        """
+        return FELib.__bars_index(series, period_list, 1.0)
+
+    @staticmethod
+    def hhvbars_multi(series, period_list):
+        """
+        Returns dictionary of period and index (of series) of highest bar in last period bars of every bar,
+        all periods are computed from one converted array
+        """
+        return FELib.__bars_index(series, period_list, -1.0)
+
+    @staticmethod
+    def llvbars(series, period):
+        return FELib.llvbars_multi(series, [period])[period]
 
     @staticmethod
     def hhvbars(series, period):
-        if type(series) == np.ndarray:
-            series = pd.Series(series)
-        series = series.fillna(0)
-        max_idx = series.index[series.rolling(period).apply(np.argmax, raw=True)[(period - 1):].astype(int) + np.arange(len(series) - (period - 1))]
-        out = [0] * len(series)
-        out[len(out) - len(max_idx):len(out) + len(max_idx) - 1] = max_idx
-        out = np.nan_to_num(out)
-        return pd.Series(out)
+        return FELib.hhvbars_multi(series, [period])[period]
+
+    @staticmethod
+    def __to_values(series, fill_na=None):
+        values = pd.Series(series).to_numpy(dtype=float, copy=True) if type(series) != np.ndarray \
+            else np.array(series, dtype=float)
+        if fill_na is not None:
+            values[np.isnan(values)] = fill_na
+        return values
+
+    @staticmethod
+    def ma_multi(series, period_list):
+        """
+        Returns 2D array (bars x periods) of FELib.ma of every period in period_list.
+        All periods share one prefix sum of values relative to their mean (keeps prefix sum small on long series),
+        window sums are differences of prefix sums
+        """
+        values = FELib.__to_values(series, fill_na=0.0)
+        n = values.shape[0]
+        result = np.empty((n, len(period_list)))
+        center = values.mean() if n > 0 else 0.0
+        csum = np.concatenate(([0.0], np.cumsum(values - center)))
+        for j, period in enumerate(period_list):
+            head = min(period, n)
+            result[:head, j] = csum[1:head + 1] / np.arange(1, head + 1)
+            result[head:, j] = (csum[head + 1:] - csum[1:n - head + 1]) / period
+        result += center
+        return precision.cast(result)
+
+    @staticmethod
+    def __rolling_multi(series, period_list, func, fill_na=None):
+        values = pd.Series(FELib.__to_values(series, fill_na=fill_na))
+        result = np.empty((len(values), len(period_list)))
+        for j, period in enumerate(period_list):
+            result[:, j] = getattr(values.rolling(period, min_periods=1), func)()
+        return precision.cast(np.nan_to_num(result, copy=False))
+
+    @staticmethod
+    def stdev_multi(series, period_list):
+        """
+        Returns 2D array (bars x periods) of FELib.stdev of every period in period_list.
+        Variance from prefix sums of squares loses precision at high price level, so rolling kernel is used
+        """
+        return FELib.__rolling_multi(series, period_list, 'std', fill_na=0.0)
+
+    @staticmethod
+    def hhv_multi(series, period_list):
+        """
+        Returns 2D array (bars x periods) of FELib.hhv of every period in period_list
+        """
+        return FELib.__rolling_multi(series, period_list, 'max')
+
+    @staticmethod
+    def llv_multi(series, period_list):
+        """
+        Returns 2D array (bars x periods) of FELib.llv of every period in period_list
+        """
+        return FELib.__rolling_multi(series, period_list, 'min', fill_na=0.0)
+
+    @staticmethod
+    def roc_multi(series, period_list):
+        """
+        Returns 2D array (bars x periods) of talib.ROC of every period in period_list
+        """
+        values = pd.Series(series).to_numpy(dtype=float) if type(series) != np.ndarray else series.astype(float)
+        result = np.full((values.shape[0], len(period_list)), np.nan)
+        for j, period in enumerate(period_list):
+            prev = values[:-period] if period > 0 else values
+            with np.errstate(divide='ignore', invalid='ignore'):
+                result[period:, j] = np.where(prev != 0, (values[period:] / prev - 1.0) * 100.0, 0.0)
+        return precision.cast(result)
 
     @staticmethod
     def round_num(series, num):
@@ -137,55 +266,41 @@ class FELib:
 
     @staticmethod
     def gen_feat_hhv_cur_diff(df, col_name1, col_name2, period_list, price_range_model):
-        for period in period_list:
-            hhv = FELib.hhv(df[col_name1], period)
-            diff_arr = abs(np.array(hhv) - np.array(df[col_name2]))
-            diff_arr = diff_arr.reshape(-1, 1)
-            level_arr = price_range_model.predict(diff_arr)
-            level_arr = level_arr + 1
-            df['MAX{}_{}_DIFF_{}'.format(period, col_name1, col_name2)] = FELib.iif(hhv > df[col_name2]
-                                                                                    , level_arr
-                                                                                    , 0)
+        block = FELib.block_hhv_cur_diff(df, col_name1, col_name2, period_list, price_range_model)
+        for c_name in block.columns:
+            df[c_name] = block[c_name]
 
     @staticmethod
     def gen_feat_cur_llv_diff(df, col_name1, col_name2, period_list, price_range_model):
-        for period in period_list:
-            llv = FELib.llv(df[col_name2], period)
-            diff_arr = abs(np.array(col_name1) - np.array(df[llv]))
-            diff_arr = diff_arr.reshape(-1, 1)
-            level_arr = price_range_model.predict(diff_arr)
-            level_arr = level_arr + 1
-            df['{}_DIFF_MIN{}_{}'.format(col_name1, period, col_name2)] = FELib.iif(llv < df[col_name2]
-                                                                                    , level_arr
-                                                                                    , 0)
+        block = FELib.block_cur_llv_diff(df, col_name1, col_name2, period_list, price_range_model)
+        for c_name in block.columns:
+            df[c_name] = block[c_name]
 
     @staticmethod
     def gen_feat_llv(df, col_name, period_list):
-        feat_name = '_MIN_'
-        for period in period_list:
-            c_name = '{}{}{}'.format(col_name, feat_name, period)
-            df[c_name] = FELib.llv(df[col_name], period)
+        block = FELib.block_llv(df, col_name, period_list)
+        for c_name in block.columns:
+            df[c_name] = block[c_name]
 
     @staticmethod
     def gen_feat_hhv(df, col_name, period_list):
-        feat_name = '_MAX_'
-        for period in period_list:
-            c_name = '{}{}{}'.format(col_name, feat_name, period)
-            df[c_name] = FELib.hhv(df[col_name], period)
+        block = FELib.block_hhv(df, col_name, period_list)
+        for c_name in block.columns:
+            df[c_name] = block[c_name]
 
     @staticmethod
     def gen_feat_llvbars(df, col_name, period_list):
         feat_name = '_MINBARS_'
-        for period in period_list:
+        for period, llvbars in FELib.llvbars_multi(df[col_name], period_list).items():
             c_name = '{}{}{}'.format(col_name, feat_name, period)
-            df[c_name] = FELib.llvbars(df[col_name], period)
+            df[c_name] = llvbars
 
     @staticmethod
     def gen_feat_hhvbars(df, col_name, period_list):
         feat_name = '_MAXBARS_'
-        for period in period_list:
+        for period, hhvbars in FELib.hhvbars_multi(df[col_name], period_list).items():
             c_name = '{}{}{}'.format(col_name, feat_name, period)
-            df[c_name] = FELib.hhvbars(df[col_name], period)
+            df[c_name] = hhvbars
 
     @staticmethod
     def gen_feat_sma(df, col_name, period_list):
@@ -232,3 +347,72 @@ class FELib:
             c_name = feat_name.format(col_name, period)
             df[c_name] = FELib.hhv(df[col_name] == FELib.llv(df[col_name]), 1, 0)
 
+    # ==========================================================================================================================
+    # Block generators: คำนวณทุก period ของ feature เดียวกันลง 2D array ที่จองไว้ครั้งเดียว แล้ว return เป็น DataFrame
+    # ก้อนเดียว (block) ใช้ join_blocks ต่อ block ทั้งหมดเข้ากับ df ครั้งเดียว แทนการเพิ่ม column ทีละ column
+    # ซึ่งทำให้ DataFrame แตกเป็นหลาย block (PerformanceWarning)
+    # ==========================================================================================================================
+    @staticmethod
+    def __to_block(df, values, names):
+        return pd.DataFrame(values, index=df.index, columns=names)
+
+    @staticmethod
+    def join_blocks(df, blocks):
+        """
+        Returns new DataFrame of df and feature blocks joined in one operation
+        """
+        return pd.concat([df] + list(blocks), axis=1)
+
+    @staticmethod
+    def block_ma(df, col_name, period_list):
+        return FELib.__to_block(df, FELib.ma_multi(df[col_name], period_list)
+                                , ['{}_MA_{}'.format(col_name, period) for period in period_list])
+
+    @staticmethod
+    def block_stdev(df, col_name, period_list):
+        return FELib.__to_block(df, FELib.stdev_multi(df[col_name], period_list)
+                                , ['{}_STDEV_{}'.format(col_name, period) for period in period_list])
+
+    @staticmethod
+    def block_hhv(df, col_name, period_list):
+        return FELib.__to_block(df, FELib.hhv_multi(df[col_name], period_list)
+                                , ['{}_MAX_{}'.format(col_name, period) for period in period_list])
+
+    @staticmethod
+    def block_llv(df, col_name, period_list):
+        return FELib.__to_block(df, FELib.llv_multi(df[col_name], period_list)
+                                , ['{}_MIN_{}'.format(col_name, period) for period in period_list])
+
+    @staticmethod
+    def block_roc(df, col_name, period_list):
+        return FELib.__to_block(df, FELib.roc_multi(df[col_name], period_list)
+                                , ['{}_ROC_{}'.format(col_name, period) for period in period_list])
+
+    @staticmethod
+    def __diff_level(diff, price_range_model):
+        # One predict call for all periods
+        level = np.asarray(price_range_model.predict(diff.reshape(-1, 1))).reshape(diff.shape)
+        return level + 1
+
+    @staticmethod
+    def block_hhv_cur_diff(df, col_name1, col_name2, period_list, price_range_model):
+        """
+        Level (price_range_model + 1) of distance from highest col_name1 of each period to current col_name2,
+        0 when highest value is not above current value
+        """
+        hhv = FELib.hhv_multi(df[col_name1], period_list)
+        cur = df[col_name2].to_numpy(dtype=float)[:, None]
+        level = FELib.__diff_level(np.abs(hhv - cur), price_range_model)
+        return FELib.__to_block(df, FELib.iif(hhv > cur, level, 0)
+                                , ['MAX{}_{}_DIFF_{}'.format(period, col_name1, col_name2) for period in period_list])
+
+    @staticmethod
+    def block_cur_llv_diff(df, col_name1, col_name2, period_list, price_range_model):
+        """
+        Level (price_range_model + 1) of distance from current col_name1 to lowest col_name2 of each period,
+        0 when lowest value is not below current col_name2
+        """
+        llv = FELib.llv_multi(df[col_name2], period_list)
+        level = FELib.__diff_level(np.abs(df[col_name1].to_numpy(dtype=float)[:, None] - llv), price_range_model)
+        return FELib.__to_block(df, FELib.iif(llv < df[col_name2].to_numpy(dtype=float)[:, None], level, 0)
+                                , ['{}_DIFF_MIN{}_{}'.format(col_name1, period, col_name2) for period in period_list])
@@ -0,0 +1,109 @@
+import unittest
+import warnings
+
+import numpy as np
+import pandas as pd
+import talib
+
+from deepquant.common.felib import FELib
+
+
+def rolling_bars(series, period, func):
+    """
+    Reference implementation with rolling apply (previous FELib.llvbars/hhvbars)
+    """
+    series = series.fillna(0)
+    idx = series.index[series.rolling(period).apply(func, raw=True)[(period - 1):].astype(int)
+                       + np.arange(len(series) - (period - 1))]
+    out = np.zeros(len(series), dtype=np.int64)
+    out[period - 1:] = idx
+    return out
+
+
+class PriceRangeModel():
+    """
+    Stand-in of price range model (e.g. KMeans), level is every 2 points of distance
+    """
+    def predict(self, diff_arr):
+        return (diff_arr[:, 0] // 2).astype(int)
+
+
+class TestFELib(unittest.TestCase):
+
+    def test_bars_same_as_rolling(self):
+        rng = np.random.default_rng(0)
+        # Rounded prices have many ties, ties must return first bar like np.argmin/np.argmax
+        series = pd.Series(np.round(1500.0 + np.cumsum(rng.normal(0.0, 1.0, 3000))))
+        series[[10, 500, 501]] = np.nan
+        period_list = [1, 2, 5, 10, 20, 50, 100, 200]
+
+        llvbars = FELib.llvbars_multi(series, period_list)
+        hhvbars = FELib.hhvbars_multi(series.to_numpy(), period_list)
+        for period in period_list:
+            np.testing.assert_array_equal(llvbars[period], rolling_bars(series, period, np.argmin), err_msg=period)
+            np.testing.assert_array_equal(hhvbars[period], rolling_bars(series, period, np.argmax), err_msg=period)
+        np.testing.assert_array_equal(FELib.llvbars(series, 7), rolling_bars(series, 7, np.argmin))
+
+        # Index labels are returned, same as rolling implementation
+        shifted = pd.Series(series.to_numpy(), index=np.arange(100, 3100))
+        np.testing.assert_array_equal(FELib.hhvbars(shifted, 20), rolling_bars(shifted, 20, np.argmax))
+
+    def test_multi_same_as_single_period(self):
+        rng = np.random.default_rng(1)
+        series = pd.Series(np.round(1500.0 + np.cumsum(rng.normal(0.0, 1.0, 5000)), 2))
+        series[[0, 10, 2000]] = np.nan
+        period_list = [1, 2, 5, 20, 200, 6000]
+
+        ma = FELib.ma_multi(series, period_list)
+        stdev = FELib.stdev_multi(series, period_list)
+        hhv = FELib.hhv_multi(series, period_list)
+        llv = FELib.llv_multi(series, period_list)
+        roc = FELib.roc_multi(series, period_list[:-1])
+        filled = series.fillna(0)
+        for j, period in enumerate(period_list):
+            np.testing.assert_allclose(ma[:, j], FELib.ma(series, period), rtol=0, atol=1e-9)
+            np.testing.assert_allclose(stdev[:, j], np.nan_to_num(filled.rolling(period, min_periods=1).std()))
+            np.testing.assert_array_equal(hhv[:, j], FELib.hhv(series, period))
+            np.testing.assert_array_equal(llv[:, j], FELib.llv(series, period))
+            if period < 6000:
+                np.testing.assert_allclose(roc[:, j], talib.ROC(series.to_numpy(), period), equal_nan=True)
+
+    def test_blocks_join_at_once(self):
+        rng = np.random.default_rng(2)
+        close = 1500.0 + np.cumsum(rng.normal(0.0, 1.0, 1000))
+        df = pd.DataFrame({'HIGH': close + 1.0, 'LOW': close - 1.0, 'CLOSE': close})
+        period_list = list(range(2, 42))
+        model = PriceRangeModel()
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', pd.errors.PerformanceWarning)
+            result = FELib.join_blocks(df, [FELib.block_ma(df, 'CLOSE', period_list)
+                                            , FELib.block_stdev(df, 'CLOSE', period_list)
+                                            , FELib.block_hhv(df, 'HIGH', period_list)
+                                            , FELib.block_llv(df, 'LOW', period_list)
+                                            , FELib.block_roc(df, 'CLOSE', period_list)
+                                            , FELib.block_hhv_cur_diff(df, 'HIGH', 'CLOSE', period_list, model)
+                                            , FELib.block_cur_llv_diff(df, 'CLOSE', 'LOW', period_list, model)])
+        self.assertEqual(result.shape, (1000, 3 + 7 * len(period_list)))
+
+        # Same as previous per period implementation
+        hhv = FELib.hhv(df['HIGH'], 20)
+        level = model.predict(abs(hhv - df['CLOSE'].to_numpy()).reshape(-1, 1)) + 1
+        np.testing.assert_array_equal(result['MAX20_HIGH_DIFF_CLOSE'], np.where(hhv > df['CLOSE'], level, 0))
+        np.testing.assert_array_equal(result['LOW_MIN_20'], FELib.llv(df['LOW'], 20))
+
+    def test_short_series(self):
+        np.testing.assert_array_equal(FELib.llvbars(pd.Series([3.0, 1.0]), 5), [0, 0])
+
+    def test_bars_non_integer_index(self):
+        series = pd.Series([3.0, 1.0, 2.0, 5.0, 4.0], index=['a', 'b', 'c', 'd', 'e'])
+        self.assertEqual(FELib.llvbars(series, 2).tolist(), [0, 'b', 'b', 'c', 'e'])
+        self.assertEqual(FELib.hhvbars(series, 3).tolist(), [0, 0, 'a', 'd', 'd'])
+
+        dates = pd.date_range('2020-01-01', periods=5, freq='D')
+        result = FELib.llvbars(pd.Series(series.to_numpy(), index=dates), 2)
+        self.assertEqual(result.tolist(), [0, dates[1], dates[1], dates[2], dates[4]])
+
+
+if __name__ == '__main__':
+    unittest.main()
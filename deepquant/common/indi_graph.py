@@ -0,0 +1,118 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+"""
+## Indicator Graph
+
+cache ของการคำนวณ indicator ภายในหนึ่งรอบการคำนวณ (เช่น ทุก bar ใน live trading หรือหนึ่งครั้งของการ build features)
+node แต่ละ node คือ (function, input series, parameters) ซึ่งจะถูกคำนวณเพียงครั้งเดียว
+แล้วใช้ร่วมกันทุก composite code ของ DQIndi และทุก feature builder ที่ได้รับ graph เดียวกัน
+
+### การระบุ node
+* input ที่เป็น series (numpy array, pandas Series) ระบุด้วย object identity: graph เก็บ reference ของ input ไว้
+identity จึงไม่ซ้ำกับ object อื่นตลอดอายุของ graph
+* ผลลัพธ์ของ node คือ object เดิมทุกครั้ง node ที่ใช้ผลลัพธ์ของ node อื่นเป็น input (เช่น talib.SMA ของ talib.RSI)
+จึงถูก cache ด้วยเช่นกัน
+* parameter อื่นๆ (ตัวเลข, string, tuple) ระบุด้วยค่า
+
+### การใช้งาน
+    graph = IndiGraph(close=p_close, high=p_high, low=p_low)
+    channel_code = DQIndi.price_channel_code(..., graph=graph)
+    trend_code = DQIndi.trend_code(..., graph=graph)
+    rsi_macd_code = DQIndi.rsi_macd_code(..., graph=graph)  # talib.MACD ไม่ถูกคำนวณซ้ำ
+    graph.stats()  # จำนวน hit และเวลาที่ใช้คำนวณของแต่ละ node
+    graph.clear()  # เริ่มรอบการคำนวณใหม่
+"""
+
+
+class IndiGraph():
+
+    def __init__(self, **series):
+        """
+        param: series, named input series (name is used in node labels of stats), e.g. close=p_close
+        """
+        self.__names = {}
+        self.__refs = []
+        self.__nodes = {}
+        for name, s in series.items():
+            self.add_series(name, s)
+
+    # =======================================================================================
+    # BEGIN: Public methods
+    # =======================================================================================
+    def add_series(self, name, series):
+        """
+        Register name of input series, used in node labels of stats
+        """
+        self.__names[id(series)] = name
+        self.__refs.append(series)
+        return series
+
+    def get(self, func, *args, **kwargs):
+        """
+        Returns func(*args, **kwargs), computed once per graph for same func, input series and parameters
+        """
+        key = (func, tuple(self.__arg_key(arg) for arg in args)
+               , tuple((k, self.__arg_key(v)) for k, v in sorted(kwargs.items())))
+        node = self.__nodes.get(key)
+        if node is not None:
+            node['hits'] += 1
+            return node['result']
+
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        compute_sec = time.perf_counter() - start
+
+        # Keep references of inputs so identity keys are not reused by other objects
+        self.__nodes[key] = {'label': self.__label(func, args, kwargs), 'result': result, 'inputs': (args, kwargs)
+                             , 'hits': 0, 'compute_sec': compute_sec}
+        return result
+
+    def stats(self):
+        """
+        Returns DataFrame of node label, number of cache hits and compute time (seconds) of each node
+        """
+        return pd.DataFrame([{'node': node['label'], 'hits': node['hits'], 'compute_sec': node['compute_sec']}
+                             for node in self.__nodes.values()], columns=['node', 'hits', 'compute_sec'])
+
+    def total_hits(self):
+        return sum(node['hits'] for node in self.__nodes.values())
+
+    def clear(self):
+        """
+        Remove all computed nodes, named input series are kept
+        """
+        self.__nodes = {}
+
+    def __len__(self):
+        return len(self.__nodes)
+
+    # =======================================================================================
+    # END: Public methods
+    # =======================================================================================
+
+    def __arg_key(self, arg):
+        if isinstance(arg, (np.ndarray, pd.Series, pd.DataFrame, list)):
+            return ('series', id(arg))
+        return ('value', arg)
+
+    def __arg_label(self, arg):
+        if isinstance(arg, (np.ndarray, pd.Series, pd.DataFrame, list)):
+            if id(arg) in self.__names:
+                return self.__names[id(arg)]
+            for node in self.__nodes.values():
+                if node['result'] is arg:
+                    return node['label']
+                if isinstance(node['result'], tuple):
+                    for i, result in enumerate(node['result']):
+                        if result is arg:
+                            return '{}[{}]'.format(node['label'], i)
+            return 'series@{:x}'.format(id(arg))
+        return repr(arg)
+
+    def __label(self, func, args, kwargs):
+        labels = [self.__arg_label(arg) for arg in args] + ['{}={}'.format(k, self.__arg_label(v))
+                                                             for k, v in sorted(kwargs.items())]
+        return '{}({})'.format(getattr(func, '__qualname__', getattr(func, '__name__', repr(func))), ', '.join(labels))
@@ -0,0 +1,51 @@
+import unittest
+
+import numpy as np
+import talib
+
+from deepquant.common.dq_indi import DQIndi
+from deepquant.common.indi_graph import IndiGraph
+
+
+class TestIndiGraph(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.close = 1500.0 + np.cumsum(rng.normal(0.0, 1.0, 1000))
+        self.high = self.close + rng.uniform(0.0, 2.0, 1000)
+        self.low = self.close - rng.uniform(0.0, 2.0, 1000)
+        self.ma = talib.EMA(self.close, 5)
+
+    def compute_codes(self, graph=None):
+        channel_code = DQIndi.price_channel_code(10.0, self.high, self.low, 20, 50, 100, graph=graph)
+        macd_params = [12, 26, 9, 24, 52, 18, 48, 104, 36]
+        return [channel_code
+                , DQIndi.sideway_code(10.0, channel_code, self.close, 50, 100, 150, self.ma, 3, 5, 10, 20, 10
+                                      , graph=graph)
+                , DQIndi.trend_code(channel_code, self.close, *macd_params, [10], [20], [30], self.ma, graph=graph)
+                , DQIndi.rsi_macd_code(channel_code, self.close, 14, 5, *macd_params, graph=graph)
+                , DQIndi.macd_code(self.close, 12, 26, 9, 10.0, graph=graph)]
+
+    def test_same_result_and_shared_nodes(self):
+        graph = IndiGraph(close=self.close, high=self.high, low=self.low, ma=self.ma)
+        for expected, actual in zip(self.compute_codes(), self.compute_codes(graph)):
+            np.testing.assert_array_equal(np.asarray(actual), np.asarray(expected))
+
+        stats = graph.stats().set_index('node')
+        # Three MACD of trend_code are reused by rsi_macd_code, MACD(12, 26, 9) also by macd_code
+        self.assertEqual(stats.loc['MACD(close, 12, 26, 9)', 'hits'], 2)
+        self.assertEqual(stats.loc['MACD(close, 48, 104, 36)', 'hits'], 1)
+        self.assertIn('SMA(SMA(RSI(close, 14), 5), 10)', stats.index)
+        # 4 MACD hits, SMA(ma) is used 3 times in trend_code and SMA(MA_RSI, 10) 2 times in rsi_macd_code
+        self.assertEqual(graph.total_hits(), 7)
+
+        # A second pass on the same graph computes nothing
+        node_num = len(graph)
+        self.compute_codes(graph)
+        self.assertEqual(len(graph), node_num)
+        graph.clear()
+        self.assertEqual(len(graph), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
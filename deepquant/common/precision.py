@@ -0,0 +1,164 @@
+import contextlib
+import functools
+import time
+
+import numpy as np
+import pandas as pd
+
+"""
+## Precision Mode
+
+กำหนดความละเอียดของตัวเลขทศนิยมของ indicator (FELib, FeatEngineerArray, DQIndi), feature และ input ของ ML model
+* FLOAT64 (ค่าเริ่มต้น): ผลลัพธ์เหมือนเดิมทุกประการ
+* FLOAT32: ผลลัพธ์ทุก indicator และ feature เป็น float32 ตั้งแต่ต้นจนถึง input ของ Keras model (ซึ่งใช้ float32 อยู่แล้ว)
+ทำให้หน่วยความจำของ feature ลดลงครึ่งหนึ่ง และไม่ต้องแปลง float64 เป็น float32 อีกครั้งตอน predict
+
+### การคำนวณภายใน
+* talib รับเฉพาะ float64 ฟังก์ชันที่ผ่าน wrap จะแปลง input float32 เป็น float64 ก่อนเรียก แล้วแปลงผลลัพธ์เป็น float32
+* prefix sum, rolling sum และ variance คำนวณด้วย float64 เสมอ (float32 สะสม error มากเกินไปบนข้อมูลยาว)
+แล้วจึงแปลงผลลัพธ์ ความคลาดเคลื่อนจึงมาจากการปัดเศษครั้งเดียวตอนแปลงเท่านั้น
+
+### ความคลาดเคลื่อนเทียบกับ FLOAT64 (TOLERANCES)
+* ค่าระดับราคา (ma, hhv, llv, ema): relative error ไม่เกิน 2^-24 (ประมาณ 6e-8) เช่น ราคา 1500 คลาดเคลื่อนไม่เกิน 1e-4
+* ค่าที่ได้จากผลต่างของราคา (stdev, macd, roc): absolute error ไม่เกิน 2^-24 ของระดับราคา
+* code ของ DQIndi (ค่าจำนวนเต็ม) อาจต่างกันได้เฉพาะ bar ที่ค่าเปรียบเทียบห่างกันน้อยกว่าความคลาดเคลื่อนข้างต้น
+
+benchmark() วัดหน่วยความจำและเวลาของการสร้าง feature block และการเตรียม input ของ model ทั้งสองโหมด
+"""
+
+FLOAT64 = 'float64'
+FLOAT32 = 'float32'
+
+TOLERANCES = {'price_rtol': 2.0 ** -24, 'diff_atol_per_price': 2.0 ** -24}
+
+__mode = {'dtype': np.dtype(FLOAT64)}
+
+
+def set_precision(mode):
+    """
+    param: mode, 'float64' or 'float32'
+    """
+    if mode not in [FLOAT64, FLOAT32]:
+        raise ValueError('Unknown precision mode: {}'.format(mode))
+    __mode['dtype'] = np.dtype(mode)
+
+
+def get_dtype():
+    return __mode['dtype']
+
+
+def is_float32():
+    return __mode['dtype'] == np.float32
+
+
+@contextlib.contextmanager
+def precision_mode(mode):
+    """
+    Context manager of precision mode, e.g. with precision_mode('float32'): ...
+    """
+    previous = __mode['dtype'].name
+    set_precision(mode)
+    try:
+        yield
+    finally:
+        set_precision(previous)
+
+
+def cast(values):
+    """
+    Returns float array or Series in dtype of precision mode (no copy when dtype is same), other types are unchanged
+    """
+    if isinstance(values, (np.ndarray, pd.Series)) and values.dtype.kind == 'f' and values.dtype != __mode['dtype']:
+        return values.astype(__mode['dtype'])
+    return values
+
+
+def cast_frame(df):
+    """
+    Returns DataFrame of which float columns are in dtype of precision mode, all columns converted at once
+    """
+    float_cols = [col for col, dtype in df.dtypes.items() if dtype.kind == 'f' and dtype != __mode['dtype']]
+    if len(float_cols) == 0:
+        return df
+    return df.astype({col: __mode['dtype'] for col in float_cols})
+
+
+def to_model_input(data, first_col=0, last_col=None):
+    """
+    Returns C-contiguous float32 array of feature columns [first_col, last_col) of DataFrame or 2D array,
+    input of Keras model (no float64 copy when features are float32 already)
+    """
+    values = data.iloc[:, first_col:last_col].to_numpy() if isinstance(data, pd.DataFrame) \
+        else np.asarray(data)[:, first_col:last_col]
+    return np.ascontiguousarray(values, dtype=np.float32)
+
+
+def __to_double(value):
+    if isinstance(value, (np.ndarray, pd.Series)) and value.dtype == np.float32:
+        return value.astype(np.float64)
+    return value
+
+
+def __cast_result(result):
+    if isinstance(result, tuple):
+        return tuple(cast(r) for r in result)
+    return cast(result)
+
+
+@functools.lru_cache(maxsize=None)
+def wrap(func):
+    """
+    Returns function which converts float32 array arguments to float64 (e.g. for talib) and casts results
+    to precision mode. Same wrapper object is returned for same func, so it can be a node of IndiGraph
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        result = func(*[__to_double(arg) for arg in args], **{k: __to_double(v) for k, v in kwargs.items()})
+        return __cast_result(result)
+    return wrapper
+
+
+def benchmark(bar_num=1000000, period_list=None, repeat=3):
+    """
+    Returns DataFrame of memory (MB) and time (seconds) of building FELib feature blocks and model input
+    in float64 and float32 modes, with maximum relative difference of features of float32 mode
+    """
+    from deepquant.common.felib import FELib
+
+    period_list = period_list or [5, 10, 20, 50, 100, 200]
+    rng = np.random.default_rng(0)
+    close = 1500.0 + np.cumsum(rng.normal(0.0, 1.0, bar_num))
+    df = pd.DataFrame({'HIGH': close + 1.0, 'LOW': close - 1.0, 'CLOSE': close})
+
+    def build():
+        return FELib.join_blocks(df[[]], [FELib.block_ma(df, 'CLOSE', period_list)
+                                          , FELib.block_stdev(df, 'CLOSE', period_list)
+                                          , FELib.block_hhv(df, 'HIGH', period_list)
+                                          , FELib.block_llv(df, 'LOW', period_list)])
+
+    rows = []
+    features = {}
+    for mode in [FLOAT64, FLOAT32]:
+        with precision_mode(mode):
+            build_sec, input_sec = [], []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                feature_df = build()
+                build_sec.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                to_model_input(feature_df)
+                input_sec.append(time.perf_counter() - start)
+        features[mode] = feature_df
+        rows.append({'mode': mode, 'feature_mb': feature_df.memory_usage(index=False).sum() / 1e6
+                     , 'build_sec': min(build_sec), 'model_input_sec': min(input_sec)})
+
+    result = pd.DataFrame(rows).set_index('mode')
+    diff = np.abs(features[FLOAT32].to_numpy(dtype=np.float64) - features[FLOAT64].to_numpy())
+    result['max_diff_per_price'] = [0.0, float(diff.max() / np.abs(close).max())]
+    return result
+
+
+if __name__ == '__main__':
+    # Use imported module, its precision mode is the one used by FELib
+    import deepquant.common.precision as precision_module
+    print(precision_module.benchmark())
@@ -0,0 +1,62 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+import talib
+
+import deepquant.common.precision as precision
+from deepquant.common.dq_indi import DQIndi
+from deepquant.common.featengineer_array import FeatEngineerArray
+from deepquant.common.felib import FELib
+
+
+class TestPrecision(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.close = 1500.0 + np.cumsum(rng.normal(0.0, 1.0, 5000))
+        self.df = pd.DataFrame({'HIGH': self.close + 1.0, 'LOW': self.close - 1.0, 'CLOSE': self.close})
+
+    def compute(self):
+        period_list = [5, 20, 100]
+        block = FELib.join_blocks(self.df[[]], [FELib.block_ma(self.df, 'CLOSE', period_list)
+                                                , FELib.block_stdev(self.df, 'CLOSE', period_list)
+                                                , FELib.block_hhv(self.df, 'HIGH', period_list)
+                                                , FELib.block_llv(self.df, 'LOW', period_list)])
+        # Input of talib is float32 in float32 mode
+        ma = FELib.ma(self.close, 5)
+        macd_params = [12, 26, 9, 24, 52, 18, 48, 104, 36]
+        return {'block': block.to_numpy()
+                , 'ma': ma
+                , 'max': FeatEngineerArray.featMaxInRange(self.close, 1, 20)
+                , 'trend_code': DQIndi.trend_code(np.ones(5000), self.close, *macd_params, [10], [20], [30], ma)}
+
+    def test_float32_within_tolerance(self):
+        expected = self.compute()
+        with precision.precision_mode(precision.FLOAT32):
+            actual = self.compute()
+        self.assertEqual(precision.get_dtype(), np.float64)
+
+        price_level = np.abs(self.close).max()
+        for name in ['block', 'ma', 'max']:
+            self.assertEqual(actual[name].dtype, np.float32, msg=name)
+            np.testing.assert_allclose(actual[name], expected[name], rtol=0, equal_nan=True
+                                       , atol=price_level * precision.TOLERANCES['diff_atol_per_price'], err_msg=name)
+        # Codes differ only on near ties
+        self.assertGreater(np.mean(actual['trend_code'] == expected['trend_code']), 0.99)
+
+    def test_model_input_and_wrap(self):
+        with precision.precision_mode(precision.FLOAT32):
+            features = precision.cast_frame(self.df)
+            self.assertTrue((features.dtypes == np.float32).all())
+            model_input = precision.to_model_input(features, 1)
+            self.assertEqual(model_input.shape, (5000, 2))
+            self.assertTrue(model_input.flags['C_CONTIGUOUS'] and model_input.dtype == np.float32)
+
+            macd = precision.wrap(talib.MACD)(features['CLOSE'].to_numpy(), 12, 26, 9)
+            self.assertTrue(all(arr.dtype == np.float32 for arr in macd))
+        self.assertIs(precision.wrap(talib.MACD), precision.wrap(talib.MACD))
+
+
+if __name__ == '__main__':
+    unittest.main()
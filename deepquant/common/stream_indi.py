@@ -0,0 +1,415 @@
+import collections
+import json
+import math
+import os
+import tempfile
+
+"""
+## Streaming Indicators
+
+indicator แบบ incremental สำหรับ live trading: เก็บ state ของแต่ละ indicator แล้วอัพเดททีละ bar ด้วยเวลา O(1)
+แทนการคำนวณ FELib / talib ใหม่บน window ขนาด bar_num_require ทุกครั้งที่มี bar ใหม่
+
+### Indicators (ผลลัพธ์ตรงกับเวอร์ชัน batch ทีละ bar)
+* StreamSMA: talib.SMA (min_periods=period) หรือ FELib.ma (min_periods=1, fill_na=0) ด้วย running sum
+* StreamEMA: talib.EMA, ค่าเริ่มต้นคือ SMA ของ period bar แรกเหมือน talib
+* StreamMACD: talib.MACD ให้ผลลัพธ์ (macd, signal, hist)
+* StreamRSI: talib.RSI (Wilder smoothing)
+* StreamStdDev: talib.STDDEV (ddof=0) หรือ FELib.stdev (ddof=1, min_periods=1, fill_na=0) ด้วย Welford variance
+แบบ sliding window
+* StreamExtremum: FELib.hhv / FELib.llv ด้วย monotonic deque
+
+### StreamIndicatorStore
+* เก็บ indicator ของแต่ละ symbol/timeframe (key เดียวกับ CommonDataPipeline เช่น 'GOLD_M15')
+* source ของ indicator คือชื่อ column ของราคา (เช่น 'CLOSE') หรือชื่อ indicator ที่ลงทะเบียนไว้ก่อนหน้า
+* append_frame อัพเดทเฉพาะ bar ที่ใหม่กว่า bar ล่าสุดที่เคยเห็น (ดูจาก column DATETIME)
+* to_state / from_state / save / load แปลง state ทั้งหมดเป็น JSON เพื่อให้รันต่อได้หลัง restart
+"""
+
+NAN = float('nan')
+
+
+def _is_nan(value):
+    return value is None or value != value
+
+
+class StreamIndicator():
+    """
+    Base class of streaming indicators, state is stored in instance attributes of JSON serializable values
+    """
+
+    # Attributes of deque type, converted to list in state
+    _deque_attrs = ()
+
+    # =======================================================================================
+    # BEGIN: Public methods
+    # =======================================================================================
+    def update(self, value):
+        """
+        Update state with value of new bar and return indicator value of the bar
+        """
+        raise NotImplementedError()
+
+    def to_state(self):
+        state = {}
+        for name, value in self.__dict__.items():
+            if isinstance(value, collections.deque):
+                value = list(value)
+            state[name] = None if isinstance(value, float) and _is_nan(value) else value
+        state['type'] = type(self).__name__
+        return state
+
+    @classmethod
+    def from_state(cls, state):
+        state = dict(state)
+        indicator_cls = _INDICATOR_TYPES[state.pop('type')]
+        indicator = indicator_cls.__new__(indicator_cls)
+        for name, value in state.items():
+            if name in indicator_cls._deque_attrs:
+                value = collections.deque(tuple(v) if isinstance(v, list) else v for v in value)
+            elif value is None:
+                value = NAN
+            setattr(indicator, name, value)
+        return indicator
+
+    # =======================================================================================
+    # END: Public methods
+    # =======================================================================================
+
+
+class StreamSMA(StreamIndicator):
+
+    _deque_attrs = ('window',)
+
+    def __init__(self, period, min_periods=None, fill_na=None):
+        """
+        param: period, window size
+        param: min_periods, minimum number of values to return average, None = period (talib.SMA), 1 = FELib.ma
+        param: fill_na, value replacing NaN input (FELib.ma uses 0), None = leading NaN is skipped like talib
+        """
+        self.period = period
+        self.min_periods = period if min_periods is None else min_periods
+        self.fill_na = fill_na
+        self.window = collections.deque()
+        self.total = 0.0
+        self.value = NAN
+
+    def update(self, value):
+        if _is_nan(value):
+            if self.fill_na is None:
+                return self.value if len(self.window) == 0 else self.__push(NAN)
+            value = self.fill_na
+        return self.__push(value)
+
+    def __push(self, value):
+        self.window.append(value)
+        self.total += value
+        if len(self.window) > self.period:
+            self.total -= self.window.popleft()
+        self.value = self.total / len(self.window) if len(self.window) >= self.min_periods else NAN
+        return self.value
+
+
+class StreamEMA(StreamIndicator):
+
+    def __init__(self, period):
+        self.period = period
+        self.k = 2.0 / (period + 1)
+        self.count = 0
+        self.seed_total = 0.0
+        self.value = NAN
+
+    def update(self, value):
+        if _is_nan(value) and self.count == 0:
+            return self.value
+        self.count += 1
+        if self.count < self.period:
+            self.seed_total += value
+        elif self.count == self.period:
+            self.value = (self.seed_total + value) / self.period
+        else:
+            self.value = (value - self.value) * self.k + self.value
+        return self.value
+
+
+class StreamMACD(StreamIndicator):
+    """
+    talib.MACD: EMA ทั้งสองเริ่มที่ bar ที่ slow_period - 1 (fast EMA เริ่มจาก SMA ของ fast_period bar ล่าสุด)
+    signal เป็น EMA ของ macd และทั้ง 3 ค่าเริ่มมีค่าที่ bar ที่ slow_period + signal_period - 2
+    """
+
+    _deque_attrs = ('closes',)
+
+    def __init__(self, fast_period, slow_period, signal_period):
+        if slow_period < fast_period:
+            fast_period, slow_period = slow_period, fast_period
+        self.fast_period = fast_period
+        self.slow_period = slow_period
+        self.fast_k = 2.0 / (fast_period + 1)
+        self.slow_k = 2.0 / (slow_period + 1)
+        self.count = 0
+        self.closes = collections.deque(maxlen=slow_period)
+        self.fast = NAN
+        self.slow = NAN
+        self.signal = StreamEMA(signal_period)
+        self.value = (NAN, NAN, NAN)
+
+    def update(self, value):
+        if _is_nan(value) and self.count == 0:
+            return self.value
+        self.count += 1
+        if self.count < self.slow_period:
+            self.closes.append(value)
+            return self.value
+        if self.count == self.slow_period:
+            self.closes.append(value)
+            closes = list(self.closes)
+            self.fast = sum(closes[-self.fast_period:]) / self.fast_period
+            self.slow = sum(closes) / self.slow_period
+            self.closes.clear()
+        else:
+            self.fast = (value - self.fast) * self.fast_k + self.fast
+            self.slow = (value - self.slow) * self.slow_k + self.slow
+        macd = self.fast - self.slow
+        signal = self.signal.update(macd)
+        self.value = (NAN, NAN, NAN) if _is_nan(signal) else (macd, signal, macd - signal)
+        return self.value
+
+    def to_state(self):
+        state = super().to_state()
+        state['signal'] = self.signal.to_state()
+        state['value'] = [None if _is_nan(v) else v for v in self.value]
+        return state
+
+    @classmethod
+    def from_state(cls, state):
+        state = dict(state)
+        signal = StreamIndicator.from_state(state.pop('signal'))
+        value = tuple(NAN if v is None else v for v in state.pop('value'))
+        indicator = super().from_state(state)
+        indicator.signal = signal
+        indicator.value = value
+        return indicator
+
+
+class StreamRSI(StreamIndicator):
+
+    def __init__(self, period):
+        self.period = period
+        self.count = 0
+        self.prev = NAN
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+        self.value = NAN
+
+    def update(self, value):
+        if _is_nan(value) and self.count == 0:
+            return self.value
+        self.count += 1
+        if self.count == 1:
+            self.prev = value
+            return self.value
+
+        diff = value - self.prev
+        self.prev = value
+        gain, loss = (diff, 0.0) if diff >= 0 else (0.0, -diff)
+        if self.count <= self.period + 1:
+            self.avg_gain += gain
+            self.avg_loss += loss
+            if self.count < self.period + 1:
+                return self.value
+            self.avg_gain /= self.period
+            self.avg_loss /= self.period
+        else:
+            self.avg_gain = (self.avg_gain * (self.period - 1) + gain) / self.period
+            self.avg_loss = (self.avg_loss * (self.period - 1) + loss) / self.period
+
+        total = self.avg_gain + self.avg_loss
+        self.value = 100.0 * (self.avg_gain / total) if not -0.00000001 < total < 0.00000001 else 0.0
+        return self.value
+
+
+class StreamStdDev(StreamIndicator):
+    """
+    Welford variance แบบ sliding window: เมื่อ window เต็มจะแทนค่าเก่าสุดด้วยค่าใหม่ในขั้นตอนเดียว
+    """
+
+    _deque_attrs = ('window',)
+
+    def __init__(self, period, ddof=0, min_periods=None, fill_na=None):
+        """
+        param: ddof, 0 = population (talib.STDDEV), 1 = sample (FELib.stdev)
+        param: min_periods, None = period (talib.STDDEV), 1 = FELib.stdev
+        param: fill_na, value replacing NaN input (FELib.stdev uses 0), None = leading NaN is skipped like talib
+        """
+        self.period = period
+        self.ddof = ddof
+        self.min_periods = period if min_periods is None else min_periods
+        self.fill_na = fill_na
+        self.window = collections.deque()
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.value = NAN
+
+    def update(self, value):
+        if _is_nan(value):
+            if self.fill_na is None and len(self.window) == 0:
+                return self.value
+            value = NAN if self.fill_na is None else self.fill_na
+
+        if len(self.window) < self.period:
+            self.window.append(value)
+            delta = value - self.mean
+            self.mean += delta / len(self.window)
+            self.m2 += delta * (value - self.mean)
+        else:
+            old = self.window.popleft()
+            self.window.append(value)
+            old_mean = self.mean
+            self.mean += (value - old) / self.period
+            self.m2 += (value - old) * (value - self.mean + old - old_mean)
+
+        count = len(self.window)
+        if count < self.min_periods:
+            self.value = NAN
+        elif count <= self.ddof:
+            self.value = 0.0
+        else:
+            self.value = math.sqrt(max(self.m2, 0.0) / (count - self.ddof))
+        return self.value
+
+
+class StreamExtremum(StreamIndicator):
+    """
+    FELib.hhv (is_max=True) / FELib.llv (is_max=False, fill_na=0): ค่าสูงสุด/ต่ำสุดใน period bar ล่าสุด
+    deque เก็บ (bar number, value) ที่ยังมีโอกาสเป็นค่าสูงสุด/ต่ำสุด ค่าใน deque เรียงจากมากไปน้อย (หรือน้อยไปมาก)
+    NaN ถูกข้ามเหมือน rolling ของ pandas และเมื่อ window ไม่มีค่าเลยจะได้ 0 เหมือน np.nan_to_num
+    """
+
+    _deque_attrs = ('candidates',)
+
+    def __init__(self, period, is_max=True, fill_na=None):
+        self.period = period
+        self.is_max = is_max
+        self.fill_na = fill_na
+        self.count = 0
+        self.candidates = collections.deque()
+        self.value = NAN
+
+    def update(self, value):
+        if _is_nan(value):
+            value = self.fill_na
+        self.count += 1
+        if value is not None:
+            while len(self.candidates) > 0 and (self.candidates[-1][1] <= value if self.is_max
+                                                else self.candidates[-1][1] >= value):
+                self.candidates.pop()
+            self.candidates.append((self.count, value))
+        while len(self.candidates) > 0 and self.candidates[0][0] <= self.count - self.period:
+            self.candidates.popleft()
+        self.value = self.candidates[0][1] if len(self.candidates) > 0 else 0.0
+        return self.value
+
+
+_INDICATOR_TYPES = {cls.__name__: cls for cls in [StreamSMA, StreamEMA, StreamMACD, StreamRSI, StreamStdDev
+                                                  , StreamExtremum]}
+
+
+class StreamIndicatorStore():
+
+    def __init__(self):
+        # symbol_tf -> {'last_datetime', 'indicators': [(name, source, indicator)], 'values': {name: value}}
+        self.symbols = {}
+
+    # =======================================================================================
+    # BEGIN: Public methods
+    # =======================================================================================
+    def register(self, symbol_tf, name, indicator, source='CLOSE'):
+        """
+        param: symbol_tf, symbol and timeframe key, e.g. 'GOLD_M15'
+        param: name, indicator name, must be unique in symbol_tf
+        param: indicator, StreamIndicator object
+        param: source, price column name (e.g. 'CLOSE') or name of indicator registered before this indicator
+        """
+        entry = self.symbols.setdefault(symbol_tf, {'last_datetime': None, 'indicators': [], 'values': {}})
+        if name in entry['values'] or any(name == ind_name for ind_name, _, _ in entry['indicators']):
+            raise ValueError('Indicator {} of {} is already registered'.format(name, symbol_tf))
+        entry['indicators'].append((name, source, indicator))
+
+    def update(self, symbol_tf, bar, datetime=None):
+        """
+        Update all indicators of symbol_tf with new bar (dictionary of price column and value)
+        Returns dictionary of indicator name and its value of the bar
+        """
+        entry = self.symbols[symbol_tf]
+        values = {}
+        for name, source, indicator in entry['indicators']:
+            values[name] = indicator.update(values[source] if source in values else bar[source])
+        entry['values'] = values
+        if datetime is not None:
+            entry['last_datetime'] = datetime
+        return values
+
+    def append_frame(self, symbol_tf, price_df, datetime_col='DATETIME'):
+        """
+        Update indicators of symbol_tf with bars in price_df which are newer than the last updated bar,
+        bars are fed in ascending datetime order (e.g. price from load_price_from_db is newest first)
+        Returns dictionary of indicator name and its value of the last (newest) bar
+        """
+        entry = self.symbols[symbol_tf]
+        price_df = price_df.sort_values(datetime_col, kind='stable')
+        if entry['last_datetime'] is not None:
+            price_df = price_df[price_df[datetime_col] > entry['last_datetime']]
+        sources = {source for _, source, _ in entry['indicators']
+                   if source in price_df.columns and source != datetime_col}
+        columns = {source: price_df[source].tolist() for source in sources}
+        datetimes = price_df[datetime_col].tolist()
+        for i in range(len(datetimes)):
+            self.update(symbol_tf, {source: columns[source][i] for source in sources}, datetime=datetimes[i])
+        return entry['values']
+
+    def get_values(self, symbol_tf):
+        return self.symbols[symbol_tf]['values']
+
+    def to_state(self):
+        return {symbol_tf: {'last_datetime': entry['last_datetime']
+                            , 'indicators': [{'name': name, 'source': source, 'state': indicator.to_state()}
+                                             for name, source, indicator in entry['indicators']]}
+                for symbol_tf, entry in self.symbols.items()}
+
+    @classmethod
+    def from_state(cls, state):
+        store = cls()
+        for symbol_tf, entry in state.items():
+            for ind in entry['indicators']:
+                indicator_cls = _INDICATOR_TYPES[ind['state']['type']]
+                store.register(symbol_tf, ind['name'], indicator_cls.from_state(ind['state']), source=ind['source'])
+            store.symbols[symbol_tf]['last_datetime'] = entry['last_datetime']
+            store.symbols[symbol_tf]['values'] = {name: indicator.value
+                                                  for name, _, indicator in store.symbols[symbol_tf]['indicators']}
+        return store
+
+    def save(self, file_path):
+        """
+        Write state to JSON file (write temp file then replace, so a partially written file is never read)
+        """
+        dir_path = os.path.dirname(os.path.abspath(file_path))
+        os.makedirs(dir_path, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=dir_path)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.to_state(), f)
+            os.replace(tmp_path, file_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, file_path):
+        with open(file_path, 'r') as f:
+            return cls.from_state(json.load(f))
+
+    # =======================================================================================
+    # END: Public methods
+    # =======================================================================================
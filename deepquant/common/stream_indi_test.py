@@ -0,0 +1,91 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+import talib
+
+from deepquant.common.felib import FELib
+from deepquant.common.stream_indi import StreamSMA, StreamEMA, StreamMACD, StreamRSI, StreamStdDev, StreamExtremum \
+    , StreamIndicatorStore
+
+
+def stream(indicator, series):
+    return np.array([indicator.update(value) for value in series], dtype=float)
+
+
+class TestStreamIndi(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.close = 1500.0 + np.cumsum(rng.normal(0.0, 1.0, 600))
+        # Series with leading NaN, e.g. input of talib.SMA(MA_RSI, 10) in DQIndi.rsi_macd_code
+        self.rsi = talib.RSI(self.close, 14)
+
+    def assert_same(self, actual, expected, msg=None):
+        np.testing.assert_allclose(actual, expected, rtol=0, atol=1e-8, equal_nan=True, err_msg=msg)
+
+    def test_same_as_batch(self):
+        for series in [self.close, self.rsi]:
+            self.assert_same(stream(StreamSMA(10), series), talib.SMA(series, 10))
+            self.assert_same(stream(StreamEMA(10), series), talib.EMA(series, 10))
+            self.assert_same(stream(StreamStdDev(5), series), talib.STDDEV(series, 5))
+            self.assert_same(stream(StreamExtremum(7), series), FELib.hhv(series, 7))
+            self.assert_same(stream(StreamExtremum(7, is_max=False, fill_na=0), series), FELib.llv(series, 7))
+
+        self.assert_same(stream(StreamSMA(10, min_periods=1, fill_na=0), self.rsi), FELib.ma(self.rsi, 10))
+        self.assert_same(stream(StreamStdDev(20, ddof=1, min_periods=1, fill_na=0), self.close)
+                         , np.nan_to_num(pd.Series(self.close).rolling(20, min_periods=1).std()))
+        self.assert_same(stream(StreamRSI(14), self.close), self.rsi)
+
+        for periods in [(12, 26, 9), (5, 35, 5), (26, 12, 9)]:
+            indicator = StreamMACD(*periods)
+            macd = np.array([indicator.update(value) for value in self.close], dtype=float)
+            for i, expected in enumerate(talib.MACD(self.close, *periods)):
+                self.assert_same(macd[:, i], expected, msg=periods)
+
+    def test_store_resume_from_state(self):
+        dt = pd.date_range('2020-01-01', periods=len(self.close), freq='15min').strftime('%Y-%m-%d %H:%M:%S')
+        price_df = pd.DataFrame({'DATETIME': dt, 'HIGH': self.close + 1.0, 'CLOSE': self.close})
+
+        def new_store():
+            store = StreamIndicatorStore()
+            store.register('GOLD_M15', 'hhv', StreamExtremum(20), source='HIGH')
+            store.register('GOLD_M15', 'rsi', StreamRSI(14))
+            store.register('GOLD_M15', 'ma_rsi', StreamSMA(10), source='rsi')
+            store.register('GOLD_M15', 'macd', StreamMACD(12, 26, 9))
+            return store
+
+        full = new_store().append_frame('GOLD_M15', price_df)
+
+        # Stop at bar 300, save state, load and append frame which overlaps bars already seen
+        store = new_store()
+        store.append_frame('GOLD_M15', price_df[:300])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, 'stream_state.json')
+            store.save(file_path)
+            store = StreamIndicatorStore.load(file_path)
+        resumed = store.append_frame('GOLD_M15', price_df[200:])
+
+        self.assertEqual(resumed, full)
+        self.assertAlmostEqual(full['ma_rsi'], talib.SMA(self.rsi, 10)[-1])
+        self.assertEqual(full['hhv'], FELib.hhv(self.close + 1.0, 20)[-1])
+
+    def test_store_newest_first_frame(self):
+        # load_price_from_db returns bars newest first (ORDER BY DESC), as passed by CommonDataPipeline
+        dt = pd.date_range('2020-01-01', periods=len(self.close), freq='15min').strftime('%Y-%m-%d %H:%M:%S')
+        price_df = pd.DataFrame({'DATETIME': dt, 'CLOSE': self.close})
+        store = StreamIndicatorStore()
+        store.register('GOLD_M15', 'ema', StreamEMA(10))
+        store.append_frame('GOLD_M15', price_df[:300].iloc[::-1])
+        self.assertEqual(store.symbols['GOLD_M15']['last_datetime'], dt[299])
+
+        # New bars with overlapping old bars, only bars after last datetime are fed
+        values = store.append_frame('GOLD_M15', price_df[250:].iloc[::-1])
+        self.assertEqual(store.symbols['GOLD_M15']['last_datetime'], dt[-1])
+        self.assertAlmostEqual(values['ema'], talib.EMA(self.close, 10)[-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,5 @@
+import os
+
 from structlog import wrap_logger, PrintLogger
 from structlog.processors import JSONRenderer
 
@@ -5,7 +7,10 @@ import deepquant.common.datetime_util as datetime_util
 import deepquant.common.mlmodel_util as mlmodel_util
 import deepquant.common.json_util as json_util
 import deepquant.common.error as error
+import deepquant.common.precision as precision
 
+from deepquant.common.stream_indi import StreamIndicatorStore
+from deepquant.data.feature_store import FeatureStore
 from deepquant.data.pipeline import DataPipeline
 
 logger = wrap_logger(PrintLogger(), processors=[JSONRenderer()])
@@ -16,7 +21,11 @@ log = logger.bind(time="{}".format(datetime_util.utcnow().isoformat())
 
 class CommonDataPipeline(DataPipeline):
 
-    def __init__(self, robot_config, symbol_prices, ml_models, correl_id=None):
+    def __init__(self, robot_config, symbol_prices, ml_models, correl_id=None, stream_indicators=None):
+        """
+        param: stream_indicators, StreamIndicatorStore updated with new bars of each symbol/timeframe in start_flow
+        if None and robot_config has 'stream_state_file' which exists, it is loaded from the file
+        """
         self.robot_config = robot_config
         self.symbol_prices = symbol_prices
         self.correl_id = correl_id
@@ -33,6 +42,20 @@ class CommonDataPipeline(DataPipeline):
         self.datasets = {}
         self.ml_models = ml_models
 
+        self.stream_state_file = robot_config.get('stream_state_file')
+        if stream_indicators is None and self.stream_state_file is not None and os.path.exists(self.stream_state_file):
+            stream_indicators = StreamIndicatorStore.load(self.stream_state_file)
+        self.stream_indicators = stream_indicators
+
+        # 'float32' keeps indicators and features in float32 up to input of ML models,
+        # precision mode is applied only while start_flow of this pipeline is running
+        self.precision = robot_config.get('precision', precision.FLOAT64)
+        if self.precision not in [precision.FLOAT64, precision.FLOAT32]:
+            raise ValueError('Unknown precision mode: {}'.format(self.precision))
+
+        feature_store_path = robot_config.get('feature_store_path')
+        self.feature_store = FeatureStore(feature_store_path) if feature_store_path is not None else None
+
         try:
             dataset_config = {}
             models_config = robot_config['models']
@@ -50,7 +73,8 @@ class CommonDataPipeline(DataPipeline):
                                                         , 'algorithm':algorithm \
                                                         , 'buildfeat_module':buildfeat_module \
                                                         , 'feature_file_path':feature_file_path \
-                                                        , 'bar_num_require':bar_num_require }
+                                                        , 'bar_num_require':bar_num_require \
+                                                        , 'feature_warmup_bars':model_conf.get('feature_warmup_bars') }
 
             trading_robots = robot_config['trading_robots']
             if trading_robots is not None and len(trading_robots) > 0:
@@ -137,6 +161,10 @@ class CommonDataPipeline(DataPipeline):
 
 
     def start_flow(self):
+        with precision.precision_mode(self.precision):
+            self.__start_flow()
+
+    def __start_flow(self):
         price_df_dict = {}
         try:
             if self.price_to_process is not None:
@@ -152,6 +180,13 @@ class CommonDataPipeline(DataPipeline):
                                                            , upper_col_name=True, limit_rows=conf['bar_num_require'])
                     price_df_dict[symbol_tf] = price_df
 
+                    # Update streaming indicators with new bars only (O(1) per bar)
+                    if self.stream_indicators is not None and symbol_tf in self.stream_indicators.symbols:
+                        self.stream_indicators.append_frame(symbol_tf, price_df)
+
+            if self.stream_indicators is not None and self.stream_state_file is not None:
+                self.stream_indicators.save(self.stream_state_file)
+
         except Exception as e:
             log.error(level="ERROR", events='Start flow of data pipeline', correl_id='{}'.format(self.correl_id)
                       , st_bot=self.robot_config['strategy_name']
@@ -181,8 +216,10 @@ class CommonDataPipeline(DataPipeline):
                 for conf in self.feature_to_process:
                     symbol_tf = '{}_{}'.format(conf['symbol'], conf['timeframe'])
                     price_df = price_df_dict[symbol_tf]
-                    feature_df = self.build_features(conf['buildfeat_module'], conf['feature_file_path'], price_df=price_df)
-                    self.datasets[conf['model_name']] = feature_df
+                    feature_df = self.build_features(conf['buildfeat_module'], conf['feature_file_path'], price_df=price_df \
+                                                     , feature_store=self.feature_store, symbol_name=conf['symbol'] \
+                                                     , timeframe=conf['timeframe'], warmup_bars=conf['feature_warmup_bars'])
+                    self.datasets[conf['model_name']] = precision.cast_frame(feature_df)
 
             self.load_ml_models()
         except Exception as e:
@@ -0,0 +1,272 @@
+import contextlib
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import tempfile
+import uuid
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, writers of same key are not serialized
+    fcntl = None
+
+import numpy as np
+import pandas as pd
+
+import deepquant.common.error as error
+import deepquant.data.price_store as price_store
+
+"""
+## Feature Store
+
+เก็บ feature ที่คำนวณแล้วลง disk เพื่อให้ backtest, training และ live ที่ใช้ feature ชุดเดียวกันโหลดมาใช้แทนการคำนวณใหม่
+
+### Key
+* hash ของ (symbol, timeframe, source code ของ feature function หรือ module, parameters)
+ถ้าแก้ไข source code หรือเปลี่ยน parameter จะได้ key ใหม่ (feature ชุดเดิมจะไม่ถูกใช้)
+
+### รูปแบบการเก็บ
+* root_path/<key>/header.json เก็บ symbol, timeframe, parameters, ชื่อ column และรายการ partition
+* partition แบ่งตามเดือนของ bar ภายในมีไฟล์ .npy หนึ่งไฟล์ต่อหนึ่ง column
+และ datetime_key.npy (int64 nanoseconds) เหมือน price_store
+* partition ไม่ถูกแก้ไขทับ การเพิ่ม bar จะเขียน partition ของเดือนนั้นเป็น directory ใหม่ (root_path/<key>/<YYYY-MM>.<id>/)
+ผ่าน temp directory แล้ว rename จากนั้นจึง replace header (temp แล้ว os.replace) ให้ชี้ไปที่ directory ใหม่
+และลบ directory เก่าหลังจาก header ถูก replace แล้ว
+* ผู้อ่านที่อ่าน header เก่าแล้วพบว่า partition ถูกลบไปแล้ว จะอ่าน header ใหม่อีกครั้ง จึงไม่มีทางอ่านเจอข้อมูลที่เขียนไม่เสร็จ
+* ผู้เขียน key เดียวกันหลาย process ถูก lock ด้วย root_path/<key>/header.lock (fcntl) ขณะ merge และ replace header
+โดยอ่าน header ล่าสุดภายใน lock ก่อน merge bar ใหม่ bar ของผู้เขียนอื่นจึงไม่หาย (ถ้ามี bar ซ้ำจะใช้ bar ที่อยู่ใน store แล้ว)
+
+### การคำนวณ
+* feature_func(price_df, **params) ต้อง return DataFrame ที่มีจำนวน row และลำดับเหมือน price_df
+* bar ของ price_df ที่ยังไม่มีใน store (missing) จะถูกคำนวณแล้วเขียนเพิ่มเฉพาะ partition ที่เกี่ยวข้อง
+* warmup_bars = None คำนวณ feature_func บน price_df ทั้งหมด (ผลลัพธ์ตรงกับการคำนวณปกติเสมอ)
+ถ้ากำหนด warmup_bars จะคำนวณเฉพาะช่วงตั้งแต่ bar ที่ missing แรกย้อนหลังไป warmup_bars bar
+ผลลัพธ์จะตรงกันเมื่อ feature ใช้ข้อมูลย้อนหลังไม่เกิน warmup_bars bar
+"""
+
+HEADER_FILE = 'header.json'
+DATETIME_KEY_FILE = 'datetime_key.npy'
+LOCK_FILE = 'header.lock'
+HEADER_VERSION = 2
+
+# Number of times header is read again when its partitions have been replaced by other writer while reading
+READ_RETRY = 5
+
+
+def get_source(feature_source):
+    """
+    Returns source code of function, class or module, or the string itself
+    """
+    if isinstance(feature_source, str):
+        return feature_source
+    try:
+        return inspect.getsource(feature_source)
+    except (OSError, TypeError):
+        return getattr(feature_source, '__qualname__', repr(feature_source))
+
+
+def make_feature_key(symbol, timeframe, feature_source, params=None):
+    """
+    Returns key (hex digest) of features from symbol, timeframe, source code of feature function (or module)
+    and JSON serializable parameters
+    """
+    h = hashlib.sha256()
+    h.update(json.dumps([symbol, timeframe, params or {}], sort_keys=True, default=str).encode())
+    h.update(get_source(feature_source).encode())
+    return h.hexdigest()
+
+
+def to_partition_names(datetime_key):
+    """
+    Returns partition name (YYYY-MM) of each datetime key
+    """
+    months = np.asarray(datetime_key, dtype='int64').astype('datetime64[ns]').astype('datetime64[M]')
+    return np.datetime_as_string(months, unit='M').astype('U7').astype(object).tolist() \
+        if len(months) > 0 else []
+
+
+class FeatureStore():
+
+    def __init__(self, root_path):
+        self.root_path = root_path
+
+    # =======================================================================================
+    # BEGIN: Public methods
+    # =======================================================================================
+    def get_features(self, symbol, timeframe, feature_func, price_df, params=None, feature_source=None
+                     , warmup_bars=None):
+        """
+        Returns feature DataFrame of price_df (same index as price_df), computes and stores only missing bars
+        param: feature_func, function(price_df, **params) returns features of each row of price_df
+        param: params, dictionary of parameters of feature_func (part of key)
+        param: feature_source, source code object of key (e.g. feature module), None = feature_func
+        param: warmup_bars, number of bars before first missing bar used to compute missing bars, None = all bars
+        """
+        params = params or {}
+        key = make_feature_key(symbol, timeframe, feature_func if feature_source is None else feature_source, params)
+        datetime_key = price_store.parse_datetime_key(price_df)
+        if datetime_key is None:
+            raise error.DataProcessingError('Feature store requires DATETIME or DATE/TIME columns in price')
+
+        header, stored = self.__read(key, datetime_key)
+        if stored is None:
+            missing = np.ones(len(datetime_key), dtype=bool)
+        else:
+            missing = ~np.isin(datetime_key, stored[DATETIME_KEY_FILE])
+
+        if missing.any():
+            new_df = self.__compute(feature_func, price_df, params, missing, warmup_bars)
+            self.__write_rows(key, datetime_key[missing], new_df
+                              , {'symbol': symbol, 'timeframe': timeframe, 'params': params})
+            header, stored = self.__read(key, datetime_key)
+
+        pos = np.searchsorted(stored[DATETIME_KEY_FILE], datetime_key)
+        columns = [col['name'] for col in header['columns']]
+        return pd.DataFrame({col: stored[col][pos] for col in columns}, index=price_df.index, columns=columns)
+
+    def has_features(self, key):
+        return self.__load_header(key) is not None
+
+    def remove(self, key):
+        shutil.rmtree(os.path.join(self.root_path, key), ignore_errors=True)
+
+    # =======================================================================================
+    # END: Public methods
+    # =======================================================================================
+
+    def __compute(self, feature_func, price_df, params, missing, warmup_bars):
+        start = 0 if warmup_bars is None else max(int(np.argmax(missing)) - warmup_bars, 0)
+        input_df = price_df.iloc[start:]
+        feature_df = feature_func(input_df, **params)
+        if len(feature_df) != len(input_df):
+            raise error.DataProcessingError('Feature function returns {} rows from {} rows of price, '
+                                            'rows must be same as price'.format(len(feature_df), len(input_df)))
+        return feature_df.iloc[missing[start:]].reset_index(drop=True)
+
+    def __load_header(self, key):
+        try:
+            with open(os.path.join(self.root_path, key, HEADER_FILE)) as f:
+                header = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        return header if header.get('version') == HEADER_VERSION else None
+
+    def __read(self, key, datetime_key):
+        """
+        Returns (header, dictionary of column arrays), (None, None) if key is not in store
+        """
+        for _ in range(READ_RETRY):
+            header = self.__load_header(key)
+            if header is None:
+                return None, None
+            try:
+                return header, self.__load_partitions(key, header, datetime_key)
+            except FileNotFoundError:
+                # Partition has been replaced by other writer after header was read, read new header
+                continue
+        raise error.DataProcessingError('Could not read features of key {}, partitions are being replaced'.format(key))
+
+    def __load_partitions(self, key, header, datetime_key):
+        """
+        Returns dictionary of column arrays of partitions overlapping datetime range of datetime_key
+        """
+        parts = []
+        if len(datetime_key) > 0:
+            first, last = to_partition_names([datetime_key.min(), datetime_key.max()])
+            parts = [p for p in header['partitions'] if first <= p['name'] <= last]
+
+        columns = [(col['name'], col['file']) for col in header['columns']] + [(DATETIME_KEY_FILE, DATETIME_KEY_FILE)]
+        parts = [self.__read_partition(key, part['dir'], columns) for part in parts]
+        result = {}
+        for col, _ in columns:
+            arrs = [part[col] for part in parts]
+            result[col] = np.concatenate(arrs) if len(arrs) > 0 else np.array([], dtype='int64')
+            if result[col].dtype.kind == 'U':
+                result[col] = result[col].astype(object)
+        return result
+
+    def __read_partition(self, key, dir_name, columns):
+        part_path = os.path.join(self.root_path, key, dir_name)
+        return {col: np.load(os.path.join(part_path, file_name)) for col, file_name in columns}
+
+    @contextlib.contextmanager
+    def __lock(self, entry_path):
+        with open(os.path.join(entry_path, LOCK_FILE), 'a') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def __write_rows(self, key, datetime_key, feature_df, info):
+        """
+        Merge new rows into monthly partitions and replace header, rows already stored by other writer are kept
+        """
+        entry_path = os.path.join(self.root_path, key)
+        os.makedirs(entry_path, exist_ok=True)
+        with self.__lock(entry_path):
+            # Latest header, other writers may have added partitions after this process read it
+            header = self.__load_header(key)
+            if header is None:
+                header = dict(info, version=HEADER_VERSION, partitions=[]
+                              , columns=[{'name': str(col), 'file': 'col_{}.npy'.format(i)}
+                                         for i, col in enumerate(feature_df.columns)])
+            columns = [(col['name'], col['file']) for col in header['columns']]
+            if [str(col) for col in feature_df.columns] != [col for col, _ in columns]:
+                raise error.DataProcessingError('Feature columns are different from stored features of key {}'
+                                                .format(key))
+
+            partitions = {p['name']: p for p in header['partitions']}
+            replaced_dirs = []
+            part_names = np.array(to_partition_names(datetime_key), dtype=object)
+            for name in sorted(set(part_names)):
+                rows = part_names == name
+                data = {col: self.__to_array(feature_df.iloc[:, i].to_numpy()[rows])
+                        for i, (col, _) in enumerate(columns)}
+                data[DATETIME_KEY_FILE] = datetime_key[rows]
+                if name in partitions:
+                    old = self.__read_partition(key, partitions[name]['dir']
+                                                , columns + [(DATETIME_KEY_FILE, DATETIME_KEY_FILE)])
+                    data = {col: np.concatenate([old[col], data[col]]) for col in data}
+                    replaced_dirs.append(partitions[name]['dir'])
+                # Sorted unique bars, first occurrence (stored bar) is kept
+                _, order = np.unique(data[DATETIME_KEY_FILE], return_index=True)
+                data = {col: arr[order] for col, arr in data.items()}
+                dir_name = self.__write_partition(entry_path, name, columns, data)
+                partitions[name] = {'name': name, 'dir': dir_name, 'row_num': len(order)}
+
+            header['partitions'] = [partitions[name] for name in sorted(partitions)]
+            fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=entry_path)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(header, f)
+            os.replace(tmp_path, os.path.join(entry_path, HEADER_FILE))
+
+            # Readers of old header read new header when these directories are not found
+            for dir_name in replaced_dirs:
+                shutil.rmtree(os.path.join(entry_path, dir_name), ignore_errors=True)
+        return header
+
+    def __write_partition(self, entry_path, name, columns, data):
+        """
+        Write partition into new directory, returns directory name
+        """
+        tmp_path = tempfile.mkdtemp(prefix='.tmp_', dir=entry_path)
+        try:
+            for col, file_name in columns + [(DATETIME_KEY_FILE, DATETIME_KEY_FILE)]:
+                np.save(os.path.join(tmp_path, file_name), data[col])
+            dir_name = '{}.{}'.format(name, uuid.uuid4().hex[:12])
+            os.rename(tmp_path, os.path.join(entry_path, dir_name))
+        except Exception:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+        return dir_name
+
+    def __to_array(self, arr):
+        if arr.dtype.kind not in 'biuf':
+            arr = pd.Series(arr).astype(str).to_numpy().astype(str)
+        return arr
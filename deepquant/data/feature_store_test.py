@@ -0,0 +1,79 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+import talib
+
+from deepquant.data.feature_store import FeatureStore, make_feature_key
+
+
+def build_ma_features(price_df, period=10):
+    close = price_df['CLOSE'].to_numpy()
+    return pd.DataFrame({'MA': talib.SMA(close, period), 'TREND': np.where(close > talib.SMA(close, period), 'UP', 'DOWN')})
+
+
+class TestFeatureStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_path = tempfile.mkdtemp()
+        rng = np.random.default_rng(0)
+        bar_num = 3000
+        self.price_df = pd.DataFrame({'DATETIME': pd.date_range('2020-01-01', periods=bar_num, freq='h')
+                                     .strftime('%Y-%m-%d %H:%M:%S')
+                                      , 'CLOSE': 1500.0 + np.cumsum(rng.normal(0.0, 1.0, bar_num))})
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_path)
+
+    def test_compute_missing_bars_only(self):
+        computed_rows = []
+
+        def feature_func(price_df, period):
+            computed_rows.append(len(price_df))
+            return build_ma_features(price_df, period)
+
+        store = FeatureStore(self.tmp_path)
+        expected = build_ma_features(self.price_df, 10)
+        params = {'period': 10}
+
+        store.get_features('GOLD', 'H1', feature_func, self.price_df.iloc[:2000], params=params)
+        # Stored range is loaded, nothing is computed
+        loaded = store.get_features('GOLD', 'H1', feature_func, self.price_df.iloc[500:1500], params=params)
+        self.assertEqual(computed_rows, [2000])
+        self.assertEqual(list(loaded.index), list(range(500, 1500)))
+        pd.testing.assert_frame_equal(loaded, expected.iloc[500:1500])
+
+        # Appended bars are computed from warm-up bars and merged into monthly partitions
+        result = store.get_features('GOLD', 'H1', feature_func, self.price_df, params=params, warmup_bars=20)
+        self.assertEqual(computed_rows, [2000, 1020])
+        pd.testing.assert_frame_equal(result, expected)
+        key = make_feature_key('GOLD', 'H1', feature_func, params)
+        self.assertEqual(len(os.listdir(os.path.join(self.tmp_path, key))), 7)  # header, lock + 5 months
+
+        # Different parameters use different key
+        store.get_features('GOLD', 'H1', feature_func, self.price_df.iloc[:100], params={'period': 5})
+        self.assertEqual(computed_rows, [2000, 1020, 100])
+
+    def test_writers_merge_into_latest_header(self):
+        params = {'period': 10}
+        expected = build_ma_features(self.price_df, 10)
+        store1 = FeatureStore(self.tmp_path)
+        store2 = FeatureStore(self.tmp_path)
+        store1.get_features('GOLD', 'H1', build_ma_features, self.price_df.iloc[:1500], params=params)
+        # Other writer appends bars which overlap bars of the same month already stored
+        store2.get_features('GOLD', 'H1', build_ma_features, self.price_df, params=params, warmup_bars=20)
+
+        result = store1.get_features('GOLD', 'H1', lambda df, period: self.fail('all bars are stored')
+                                     , self.price_df, params=params, feature_source=build_ma_features)
+        pd.testing.assert_frame_equal(result, expected)
+        # Replaced partitions are removed, one directory per month
+        key = make_feature_key('GOLD', 'H1', build_ma_features, params)
+        self.assertEqual(len([name for name in os.listdir(os.path.join(self.tmp_path, key))
+                              if not name.startswith('header')]), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
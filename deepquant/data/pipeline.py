@@ -34,10 +34,24 @@ class DataPipeline():
             raise Exception('Append new price error: {}'.format(e))
         return existing_price_df
 
-    def build_features(self, build_feat_module, feature_file_path, price_file_path=None, price_df=None):
+    def build_features(self, build_feat_module, feature_file_path, price_file_path=None, price_df=None
+                       , feature_store=None, symbol_name=None, timeframe=None, warmup_bars=None):
+        """
+        If feature_store (FeatureStore) is given, features of price_df are loaded from the store,
+        only bars which are not in the store are built (builder must return one row per bar of price_df).
+        feature_file_path is part of the store key, so each model has its own stored features.
+        Builder is not called when all bars are in the store (no side effects of builder in this case)
+        """
         try:
             builder = import_module(build_feat_module)
-            feature_df = builder.build_features(feature_file_path, price_file_path=price_file_path, price_df=price_df)
+            if feature_store is not None and price_df is not None:
+                feature_df = feature_store.get_features(symbol_name, timeframe
+                                                        , lambda df, feature_file_path: builder.build_features(
+                                                            feature_file_path, price_df=df)
+                                                        , price_df, params={'feature_file_path': feature_file_path}
+                                                        , feature_source=builder, warmup_bars=warmup_bars)
+            else:
+                feature_df = builder.build_features(feature_file_path, price_file_path=price_file_path, price_df=price_df)
         except Exception as e:
             raise Exception('Build features error: {}'.format(e))
         return feature_df
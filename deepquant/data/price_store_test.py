@@ -0,0 +1,70 @@
+import datetime
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import deepquant.data.price_store as price_store
+
+
+class TestPriceStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_path = tempfile.mkdtemp()
+        self.csv_path = os.path.join(self.tmp_path, 'XAUUSD_M1.csv')
+        rng = np.random.default_rng(0)
+        total_bar = 500
+        dt = pd.date_range('2020-01-01', periods=total_bar, freq='min')
+        close = 1500.0 + np.cumsum(rng.normal(0.0, 1.0, total_bar))
+        self.df = pd.DataFrame({'DATE': dt.strftime('%Y.%m.%d'), 'TIME': dt.strftime('%H:%M')
+                                , 'OPEN': close, 'HIGH': close + 1.0, 'LOW': close - 1.0, 'CLOSE': close
+                                , 'VOLUME': rng.integers(1, 100, total_bar)})
+        self.df.to_csv(self.csv_path, index=False)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_path)
+
+    def test_same_as_csv(self):
+        df = price_store.load_price(self.csv_path)
+        pd.testing.assert_frame_equal(df, pd.read_csv(self.csv_path), check_dtype=False)
+        self.assertFalse(price_store.is_stale(self.csv_path))
+
+    def test_date_range(self):
+        df = price_store.load_price(self.csv_path, start_date='2020-01-01 01:00', end_date='2020-01-01 02:00')
+        self.assertEqual(len(df), 61)
+        self.assertEqual(df['TIME'].iloc[0], '01:00')
+        self.assertEqual(df['TIME'].iloc[-1], '02:00')
+
+        store = price_store.PriceStore(price_store.get_store_path(self.csv_path))
+        df = store.load(start_date='2020-01-01 01:00', end_date='2020-01-01 02:00', warmup_bars=10)
+        self.assertEqual(len(df), 71)
+
+    def test_date_only_range(self):
+        # End date without time includes every bar of that day
+        csv_path = os.path.join(self.tmp_path, 'XAUUSD_M1_3D.csv')
+        dt = pd.date_range('2020-01-01', periods=3 * 1440, freq='min')
+        pd.DataFrame({'DATETIME': dt.strftime('%Y-%m-%d %H:%M'), 'CLOSE': np.arange(len(dt), dtype=float)}) \
+            .to_csv(csv_path, index=False)
+
+        df = price_store.load_price(csv_path, start_date='2020-01-02', end_date='2020-01-02')
+        self.assertEqual(len(df), 1440)
+        self.assertEqual(df['DATETIME'].iloc[0], '2020-01-02 00:00')
+        self.assertEqual(df['DATETIME'].iloc[-1], '2020-01-02 23:59')
+        self.assertEqual(len(price_store.load_price(csv_path, end_date=datetime.date(2020, 1, 1))), 1440)
+        self.assertEqual(len(price_store.load_price(csv_path, end_date='2020-01-02 00:00')), 1441)
+
+    def test_reconvert_when_csv_modified(self):
+        price_store.load_price(self.csv_path)
+        self.df.iloc[:100].to_csv(self.csv_path, index=False)
+        future = time.time() + 10
+        os.utime(self.csv_path, (future, future))
+        self.assertTrue(price_store.is_stale(self.csv_path))
+        self.assertEqual(len(price_store.load_price(self.csv_path)), 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+import numpy as np
+
+from deepquant.common.base_class import BaseCommission
+
+"""
+## Transaction Cost Models
+
+model ของค่า commission, spread และ slippage ที่คำนวณกับ array ของ position size ได้ทั้งก้อน
+ใช้ code เดียวกันทั้งตอน backtest (fill เป็นล้านรายการในครั้งเดียว) และตอนเทรดจริง (ทีละ order)
+เพราะ scalar ก็คือ array ขนาด 0 มิติ
+
+### Commission
+* TieredCommission ใช้ตารางอัตราแบบขั้นบันได (from, to, rate) ที่ compile เป็น numpy array ครั้งเดียวตอนสร้าง
+การหาอัตราของ position size ใดๆ ใช้ np.searchsorted บน column 'from' จึงเป็น O(log จำนวนขั้น) ต่อ size
+* position size ที่ไม่อยู่ในช่วงใดของตาราง (เช่น 0 หรือเกิน to ของขั้นสุดท้าย) อัตราเป็น 0.0
+เหมือนกับ CommissionTable เดิมที่ไล่หาทีละแถว
+
+### Spread / Slippage
+* ราคาต่อ fill ที่เสียไป (price unit) = spread / 2 + slippage
+* slippage = fixed + size_factor * |position size| + volatility_factor * volatility
+โดย volatility คือช่วงราคา (high - low) ของ bar ที่ fill หรือค่าอื่นที่ผู้เรียกส่งมา
+
+### ใช้กับ trade
+* CostModel.get_trade_costs คำนวณราคา entry/exit หลังหักต้นทุนและค่า commission ของทั้ง entry และ exit
+ของ trade ทั้งหมดในครั้งเดียว bar kernel, portfolio backtest และ BaseTransCostModel ใช้ model เดียวกันนี้
+"""
+
+
+class TieredCommission(BaseCommission):
+
+    def __init__(self, tiers):
+        """
+        param: tiers, list of [from size, to size, rate per 1.0 position size], e.g. [[1, 25, 85], [26, 100, 65]]
+        """
+        tiers = np.asarray(sorted(tiers, key=lambda tier: tier[0]), dtype=float).reshape(-1, 3)
+        self.from_sizes = tiers[:, 0]
+        self.to_sizes = tiers[:, 1]
+        self.rates = tiers[:, 2]
+
+    # =======================================================================================
+    # BEGIN: Public methods
+    # =======================================================================================
+    def get_comm_rate(self, pos_size):
+        """
+        Returns commission rate of position size (scalar or array)
+        """
+        pos_size = np.abs(np.asarray(pos_size, dtype=float))
+        tier = np.searchsorted(self.from_sizes, pos_size, side='right') - 1
+        valid = (tier >= 0) & (pos_size <= self.to_sizes[np.maximum(tier, 0)])
+        comm_rate = np.where(valid, self.rates[np.maximum(tier, 0)], 0.0)
+        return comm_rate if comm_rate.ndim > 0 else float(comm_rate)
+
+    def cal_commission(self, pos_size):
+        """
+        Returns commission of position size (scalar or array)
+        """
+        return self.get_comm_rate(pos_size) * np.abs(pos_size)
+
+    # =======================================================================================
+    # END: Public methods
+    # =======================================================================================
+
+
+class SlippageModel():
+
+    def __init__(self, fixed=0.0, size_factor=0.0, volatility_factor=0.0):
+        """
+        param: fixed, slippage in price unit of every fill
+        param: size_factor, additional slippage in price unit per 1.0 position size
+        param: volatility_factor, additional slippage per 1.0 volatility (e.g. high - low of fill bar)
+        """
+        self.fixed = fixed
+        self.size_factor = size_factor
+        self.volatility_factor = volatility_factor
+
+    def cal_slippage(self, pos_size, volatility=0.0):
+        """
+        Returns slippage in price unit of position size and volatility (scalar or array)
+        """
+        return self.fixed + self.size_factor * np.abs(pos_size) + self.volatility_factor * np.asarray(volatility)
+
+
+class CostModel():
+
+    def __init__(self, commission=None, spread=0.0, slippage=None):
+        """
+        param: commission, TieredCommission (or any BaseCommission), None = no commission
+        param: spread, bid/ask spread in price unit
+        param: slippage, SlippageModel, None = no slippage
+        """
+        self.commission = commission
+        self.spread = spread
+        self.slippage = slippage
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Create from config keys 'commission_tiers', 'spread', 'slippage', 'slippage_size_factor'
+        and 'slippage_volatility_factor', returns None if no cost is defined
+        """
+        keys = ['commission_tiers', 'spread', 'slippage', 'slippage_size_factor', 'slippage_volatility_factor']
+        if not any(config.get(key) for key in keys):
+            return None
+        commission = TieredCommission(config['commission_tiers']) if config.get('commission_tiers') else None
+        slippage = SlippageModel(fixed=config.get('slippage') or 0.0
+                                 , size_factor=config.get('slippage_size_factor') or 0.0
+                                 , volatility_factor=config.get('slippage_volatility_factor') or 0.0)
+        return cls(commission=commission, spread=config.get('spread') or 0.0, slippage=slippage)
+
+    # =======================================================================================
+    # BEGIN: Public methods
+    # =======================================================================================
+    def cal_commission(self, pos_size):
+        if self.commission is None:
+            return np.zeros(np.shape(pos_size)) if np.ndim(pos_size) > 0 else 0.0
+        comm_rate = self.commission.get_comm_rate(pos_size)
+        return comm_rate * np.abs(pos_size)
+
+    def get_price_cost(self, pos_size, volatility=0.0):
+        """
+        Returns price (price unit) lost on one fill, half spread + slippage
+        """
+        cost = self.spread / 2.0
+        if self.slippage is not None:
+            cost = cost + self.slippage.cal_slippage(pos_size, volatility)
+        return cost + np.zeros(np.shape(pos_size))
+
+    def get_trade_costs(self, direction, entry_price, exit_price, pos_size, exited
+                        , entry_volatility=0.0, exit_volatility=0.0):
+        """
+        Returns entry prices, exit prices after spread/slippage and commission of trades (scalar or array)
+        param: direction, 1.0 = buy, -1.0 = sell
+        param: exited, False = position is still active, exit price and exit commission are not applied
+        """
+        entry_fill = entry_price + direction * self.get_price_cost(pos_size, entry_volatility)
+        exit_fill = np.where(exited, exit_price - direction * self.get_price_cost(pos_size, exit_volatility)
+                             , exit_price)
+        commission = self.cal_commission(pos_size) * np.where(exited, 2.0, 1.0)
+        return entry_fill, exit_fill, commission
+
+    # =======================================================================================
+    # END: Public methods
+    # =======================================================================================
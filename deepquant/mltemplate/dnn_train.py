@@ -36,6 +36,8 @@ from keras.backend.tensorflow_backend import set_session
 import matplotlib.pyplot as plt
 import matplotlib
 
+import deepquant.common.precision as precision
+
 
 class DNN_Train():
 
@@ -77,7 +79,9 @@ class DNN_Train():
         self.input_size = (self.feat_end_col_idx - self.feat_start_col_idx) + 1
 
         # split to features and label datasets
-        self.feat_dataset = self.dataset[self.start_row:self.last_row, self.feat_start_col_idx:self.feat_end_col_idx + 1].astype(float)
+        # Contiguous float32 features, input dtype of Keras model (see deepquant/common/precision.py)
+        self.feat_dataset = precision.to_model_input(self.dataset[self.start_row:self.last_row]
+                                                     , self.feat_start_col_idx, self.feat_end_col_idx + 1)
         self.label_col = self.dataset[self.start_row:self.last_row, self.label_col_idx]
         print('shape of dataset is {}'.format(self.feat_dataset.shape))
         print('shape of label is {}'.format(self.label_col.shape))
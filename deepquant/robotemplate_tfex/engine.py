@@ -1,6 +1,8 @@
 import datetime
 import logging
 
+import numpy as np
+
 import deepquant.common.error as err
 import deepquant.common.json_util as json_util
 import deepquant.common.datetime_util as datetime_util
@@ -228,9 +230,13 @@ class BaseTransCostModel :
     |===========|=======|===========================|
     |   1       |   25  |   85                      |
     |   26      |   100 |   63                      |
+    comm_table can be any BaseCommission, e.g. cost_model.TieredCommission (accepts array of position sizes)
+    cost_model - cost_model.CostModel used for spread, slippage and commission (when comm_table is None),
+    same model as backtest, None = use default_spread and default_slippage of config
     """
-    def __init__(self, comm_table=None):
+    def __init__(self, comm_table=None, cost_model=None):
         self.__comm_table = comm_table
+        self.__cost_model = cost_model
         self.__robot_context = None
         self.__config = None
 
@@ -267,17 +273,25 @@ class BaseTransCostModel :
     # Return อัตราค่า commission โดยดูจาก position size
     # pos_size - position size
     def _get_comm_rate(self, pos_size):
-        comm_rate = self.__comm_table.get_comm_rate(pos_size)
+        # Without comm_table, use commission of cost_model (same as backtest), no commission if neither is given
+        comm_table = self.__comm_table
+        if comm_table is None and self.__cost_model is not None:
+            comm_table = self.__cost_model.commission
+        if comm_table is None:
+            return np.zeros(np.shape(pos_size)) if np.ndim(pos_size) > 0 else 0.0
+        comm_rate = comm_table.get_comm_rate(pos_size)
         # NOTE: template นี้ใช้ค่าคอมมิสชั่นอัตราปกติ หากคุณได้อัตราค่าคอมฯ อื่น ให้สร้างคลาส TransCostModel ใน /tradingrobot/xxx/engine
         # แล้ว inherit คลาส BaseTransCostModel นี้ แล้ว override เมธอด __get_comm_rate() นี้ใหม่
         return comm_rate
 
     def get_spread(self, trade_action):
+        if self.__cost_model is not None:
+            return self.__cost_model.spread
         spread = self.__config['default_spread']
         return spread
 
     # คำนวณค่า commission
-    # pos_size - position size
+    # pos_size - position size หรือ numpy array ของ position size
     def cal_commission(self, pos_size):
         comm_rate = self._get_comm_rate(pos_size)
         comm = comm_rate * pos_size
@@ -285,7 +299,10 @@ class BaseTransCostModel :
         return comm
 
     # คำนวณค่า slippage
-    def cal_slippage(self):
+    # pos_size - position size, volatility - ความผันผวนของราคา (เช่น high - low ของ bar ล่าสุด)
+    def cal_slippage(self, pos_size=0.0, volatility=0.0):
+        if self.__cost_model is not None and self.__cost_model.slippage is not None:
+            return self.__cost_model.slippage.cal_slippage(pos_size, volatility)
         slippage = self.__config['default_slippage']
         return slippage
 
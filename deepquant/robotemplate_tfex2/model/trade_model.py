@@ -202,6 +202,9 @@ class BaseTradeModel:
             barracuda = copy.deepcopy(self.models['barracuda'])  # Copy ML model object
             feature_first_col = 7
             feature_last_col = len(self.model_datasets['barracuda'].columns)  # dataset type is DataFrame
+            # Model taking feature matrix: precision.to_model_input(self.model_datasets['barracuda']
+            #                                                       , feature_first_col, feature_last_col)
+            # returns contiguous float32 features without float64 copy (deepquant/common/precision.py)
             sig = barracuda.predict(self.model_datasets['barracuda'] \
                                                          , feature_first_col, feature_last_col, 'all')
             """